@@ -1,7 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 import sys
 import os
+import json
+import csv
+import io
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path to import src.backend
 # Current: ERP_Moderno_Web/backend/main.py -> ERP_Moderno_Web/backend -> src
@@ -10,6 +17,9 @@ import os
 
 # Import existing backend logic
 from src import backend as db
+from src.cache import CacheResultados
+from src.api import servicio_tc
+from src import asincrono, eventos, filas, metricas, versiones
 from fastapi.security import OAuth2PasswordRequestForm
 from src.auth import create_access_token, get_current_user, Token, ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta
@@ -19,6 +29,10 @@ from typing import List, Optional
 
 # Initialize Users DB
 db.init_users_db()
+# Apply pending schema migrations (indexes, derived tables)
+db.migrar_esquema()
+# Close pending monthly stock balances (kardex opening balance, stock at date)
+db.generar_saldos_mensuales()
 
 app = FastAPI(title="ERP Lite API", version="2.0.0")
 
@@ -31,10 +45,136 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request counts, latency histograms and in-flight gauges (exported on /metrics)
+metricas_http = metricas.RegistroHTTP()
+app.add_middleware(metricas.MiddlewareMetricas, registro=metricas_http, router=app.router)
+
+class FilasJSONResponse(Response):
+    """JSON for row lists from src.filas: serialized directly, skipping jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return filas.a_json(content)
+
 @app.get("/")
 def read_root():
     return {"status": "ok", "message": "ERP Lite API v2 Running"}
 
+@app.get("/api/system/db-pool")
+def get_db_pool_stats():
+    """Estadísticas del pool de conexiones SQLite (checkouts, esperas, conexiones abiertas)"""
+    return db.obtener_estadisticas_pool()
+
+@app.on_event("startup")
+def iniciar_refresco_tc():
+    # Exchange rate is refreshed in the background; requests only read it from memory
+    servicio_tc.iniciar()
+
+@app.on_event("shutdown")
+def detener_refresco_tc():
+    servicio_tc.detener()
+
+@app.on_event("startup")
+def iniciar_cierre_mensual():
+    # Months that end while the server runs are closed in the background (startup closed the rest)
+    db.cierre_mensual.iniciar()
+
+@app.on_event("shutdown")
+def detener_cierre_mensual():
+    # Before the writer is closed: a closing in progress finishes first
+    db.cierre_mensual.detener()
+
+@app.on_event("shutdown")
+def cerrar_ejecutores_async():
+    asincrono.cerrar()
+    # After the executors: pending writes queued by them are committed first
+    db.cerrar_escritor()
+
+@app.get("/api/system/tipo-cambio")
+def get_tipo_cambio_estado():
+    """Estado del servicio de tipo de cambio (valor en memoria, origen, consultas y errores)"""
+    return servicio_tc.estado()
+
+@app.post("/api/system/alertas/recalcular")
+def recalcular_alertas():
+    """Regenera la tabla de alertas desde cero (conciliación)"""
+    ok, msg = db.recalcular_alertas()
+    if not ok:
+        raise HTTPException(status_code=500, detail=msg)
+    return {"status": "success", "msg": msg}
+
+@app.get("/api/system/eventos")
+def get_eventos_stats():
+    """Estadísticas del canal de eventos en vivo (suscriptores, publicados, resyncs)"""
+    return eventos.broker.estadisticas()
+
+@app.get("/api/system/report-pool")
+def get_report_pool_stats():
+    """Estadísticas del pool de reportes (conexiones de solo lectura)"""
+    return db.obtener_estadisticas_pool_reportes()
+
+@app.get("/api/system/writer")
+def get_writer_stats():
+    """Estadísticas del escritor único (lotes, reintentos, espera en cola y commit por operación)"""
+    return db.obtener_estadisticas_escritor()
+
+@app.get("/api/system/executors")
+def get_executors_stats():
+    """Estadísticas de los ejecutores de los endpoints async (hilos, en curso, en cola, esperas)"""
+    return asincrono.estadisticas()
+
+@app.get("/api/system/dashboard-cache")
+def get_dashboard_cache_stats():
+    """Estadísticas de la caché del dashboard (hits, misses, invalidaciones, entradas)"""
+    return cache_dashboard.estadisticas()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: HTTP per route, SQLite pools, dashboard cache, writer and executors"""
+    expo = metricas.Exposicion()
+    metricas_http.exportar(expo)
+    metricas.exportar_pool(expo, "operaciones", db.obtener_estadisticas_pool())
+    metricas.exportar_pool(expo, "reportes", db.obtener_estadisticas_pool_reportes())
+    metricas.exportar_cache(expo, "dashboard", cache_dashboard.estadisticas())
+    metricas.exportar_escritor(expo, db.obtener_estadisticas_escritor())
+    metricas.exportar_ejecutores(expo, asincrono.estadisticas())
+    return Response(expo.texto(), media_type=metricas.TIPO_CONTENIDO)
+
+# --- LIVE EVENTS (SSE) ---
+
+# Seconds without events before sending a keep-alive comment (also detects closed clients)
+SSE_KEEPALIVE = 15
+
+@app.get("/api/events")
+async def stream_events(request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events: deltas de stock por (producto, almacén), documentos nuevos,
+    altas/bajas de alertas y productos eliminados, publicados tras cada commit.
+    Un 'resync' indica que el cliente debe recargar sus datos.
+    """
+    try:
+        ultimo_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        ultimo_id = None
+    suscripcion = eventos.broker.suscribir(asyncio.get_running_loop(), ultimo_id)
+
+    async def generar():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                evento = await suscripcion.siguiente(SSE_KEEPALIVE)
+                if evento is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield eventos.formatear_sse(evento)
+        finally:
+            eventos.broker.cancelar(suscripcion)
+
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # --- AUTHENTICATION ---
 
 @app.post("/api/token", response_model=Token)
@@ -42,16 +182,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     # Authentication Strategy:
     # 1. Try finding by Hash (Secure Users)
     # 2. Try finding by Plain (Legacy Users)
+    # DB lookups and bcrypt run on the async executors, never on the event loop
     from src.auth import get_username_hash, verify_password
     
     input_hash = get_username_hash(form_data.username)
     
     # Try Hash
-    user = db.obtener_usuario_por_username(input_hash)
+    user = await asincrono.en_db(db.obtener_usuario_por_username, input_hash)
     
     # Fallback to Plain if not found (Legacy compatibility)
     if not user:
-        user = db.obtener_usuario_por_username(form_data.username)
+        user = await asincrono.en_db(db.obtener_usuario_por_username, form_data.username)
 
     if not user:
         raise HTTPException(
@@ -61,7 +202,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     
     # Check password
-    if not verify_password(form_data.password, user['password_hash']):
+    if not await asincrono.en_cpu(verify_password, form_data.password, user['password_hash']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -190,23 +331,103 @@ def delete_user(uid: int, current_user: dict = Depends(get_current_user)):
 
 
 
+# --- REQUEST-SCOPED CONNECTIONS ---
+
+def conexion_reportes():
+    """
+    Dependency: one read-only connection for the whole request, i.e. one WAL snapshot
+    shared by every backend call that receives it as `conn` (and its prepared statements).
+    """
+    with db.conexion_peticion(reportes=True) as conn:
+        yield conn
+
+def unidad_de_trabajo():
+    """
+    Dependency: one transactional connection for the whole request (BEGIN on checkout).
+    Committed when the endpoint returns normally and wrote something; rolled back on error.
+    Only for endpoints that write: reads use conexion_reportes and keep the operations pool free.
+    """
+    with db.conexion_peticion(transaccion=True) as conn:
+        yield conn
+
+# --- LIST ENDPOINTS: server-side pagination ---
+
+def _pide_pagina(limit, cursor, sort, filtros):
+    """Pagination is opt-in: without limit/cursor/sort/filters the full list is returned as before"""
+    return limit is not None or bool(cursor) or bool(sort) or any(v is not None for v in filtros.values())
+
+def _listado_paginado(nombre, limit, cursor, sort, filtros, conn=None):
+    """Page of a backend listing -> {"items": [...], "total": int, "next_cursor": str | null}"""
+    try:
+        items, total, next_cursor = db.obtener_listado_pagina(nombre, filtros, sort, limit, cursor, conn=conn)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FilasJSONResponse({"items": items, "total": total, "next_cursor": next_cursor})
+
+# --- MASTER DATA: conditional GET ---
+
+# Tables whose versions make up each master-data ETag
+TABLAS_PRODUCTOS = (versiones.PRODUCTOS, versiones.CATEGORIAS, versiones.STOCK)
+TABLAS_CATEGORIAS = (versiones.CATEGORIAS,)
+TABLAS_PROVEEDORES = (versiones.PROVEEDORES,)
+TABLAS_ALMACENES = (versiones.ALMACENES,)
+
+def _etag_coincide(if_none_match, etag):
+    """If-None-Match uses weak comparison: W/ prefixes are ignored"""
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+def _con_etag(tablas, if_none_match, generar, conn=None):
+    """
+    Strong ETag from the table versions; 304 without running the query when the client has it.
+    With the request's read connection (`conn`), versions and body come from the same snapshot, so
+    the ETag always matches the body. Without it, versions are read first: a concurrent write can only
+    leave the ETag older than the body (the client refetches next time), never newer.
+    """
+    etag = versiones.etag(tablas, db.obtener_versiones_tabla(tablas, conn=conn))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and _etag_coincide(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    respuesta = generar()
+    respuesta.headers.update(headers)
+    return respuesta
+
 # --- MAESTROS ---
 
 @app.get("/api/products")
-def get_products():
-    """Retorna lista extendida de productos con stock global"""
+def get_products(limit: int = None, cursor: str = None, sort: str = None,
+                 categoria_id: int = None, almacen_id: int = None,
+                 if_none_match: Optional[str] = Header(None), conn=Depends(conexion_reportes)):
+    """
+    Retorna lista extendida de productos con stock global.
+    Paginated with limit/cursor/sort (id, codigo_sku, nombre, categoria_nombre; '-' for DESC) or filters.
+    """
     try:
-        df = db.obtener_productos_extendido()
-        # Convert DataFrame to JSON friendly format (records)
-        return df.fillna("").to_dict(orient="records")
+        filtros = {"categoria_id": categoria_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _con_etag(TABLAS_PRODUCTOS, if_none_match,
+                             lambda: _listado_paginado("productos", limit, cursor, sort, filtros, conn), conn)
+        return _con_etag(TABLAS_PRODUCTOS, if_none_match,
+                         lambda: FilasJSONResponse(db.obtener_productos_extendido_filas(conn)), conn)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/purchases/summary")
-def get_purchases_summary():
+def get_purchases_summary(limit: int = None, cursor: str = None, sort: str = None,
+                          start_date: str = None, end_date: str = None, provider_id: int = None,
+                          product_id: int = None, almacen_id: int = None):
+    """Purchase history summary; paginated with limit/cursor/sort (default -fecha) or filters"""
     try:
-        data = db.obtener_compras_historial()
-        return data.fillna("").to_dict(orient='records')
+        filtros = {"start_date": start_date, "end_date": end_date, "provider_id": provider_id,
+                   "product_id": product_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("compras", limit, cursor, sort, filtros)
+        return FilasJSONResponse(db.obtener_compras_historial_filas())
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching purchase history: {e}")
         import traceback
@@ -214,10 +435,18 @@ def get_purchases_summary():
         return []
 
 @app.get("/api/purchases/detailed")
-def get_purchases_detailed():
+def get_purchases_detailed(limit: int = None, cursor: str = None, sort: str = None,
+                           start_date: str = None, end_date: str = None, provider_id: int = None,
+                           product_id: int = None, almacen_id: int = None):
+    """Purchase lines; paginated with limit/cursor/sort (default -fecha) or filters"""
     try:
-        data = db.obtener_detalle_compras()
-        return data.fillna("").to_dict(orient='records')
+        filtros = {"start_date": start_date, "end_date": end_date, "provider_id": provider_id,
+                   "product_id": product_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("compras_detalle", limit, cursor, sort, filtros)
+        return FilasJSONResponse(db.obtener_compras_detalle_historial_filas())
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching detailed history: {e}")
         import traceback
@@ -227,9 +456,18 @@ def get_purchases_detailed():
 # --- DELIVERY GUIDES ENDPOINTS ---
 
 @app.get("/api/guides")
-def get_guides():
+def get_guides(limit: int = None, cursor: str = None, sort: str = None,
+               start_date: str = None, end_date: str = None, provider_id: int = None,
+               product_id: int = None, almacen_id: int = None):
+    """Delivery guides; paginated with limit/cursor/sort (default -fecha) or filters"""
     try:
+        filtros = {"start_date": start_date, "end_date": end_date, "provider_id": provider_id,
+                   "product_id": product_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("guias", limit, cursor, sort, filtros)
         return db.obtener_guias()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -252,10 +490,9 @@ def create_guide(data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/warehouses")
-def get_warehouses():
+def get_warehouses(if_none_match: Optional[str] = Header(None), conn=Depends(conexion_reportes)):
     try:
-        df = db.obtener_almacenes()
-        return df.fillna("").to_dict(orient="records")
+        return _con_etag(TABLAS_ALMACENES, if_none_match, lambda: FilasJSONResponse(db.obtener_almacenes_filas(conn)), conn)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -273,10 +510,10 @@ def create_warehouse(warehouse: WarehouseCreate):
             raise HTTPException(status_code=400, detail=msg)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-def get_categories():
+@app.get("/api/categories")
+def get_categories(if_none_match: Optional[str] = Header(None), conn=Depends(conexion_reportes)):
     try:
-        df = db.obtener_categorias()
-        return df.fillna("").to_dict(orient="records")
+        return _con_etag(TABLAS_CATEGORIAS, if_none_match, lambda: FilasJSONResponse(db.obtener_categorias_filas(conn)), conn)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -296,10 +533,9 @@ def create_category(category: CategoryCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/providers")
-def get_providers():
+def get_providers(if_none_match: Optional[str] = Header(None), conn=Depends(conexion_reportes)):
     try:
-        df = db.obtener_proveedores()
-        return df.fillna("").to_dict(orient="records")
+        return _con_etag(TABLAS_PROVEEDORES, if_none_match, lambda: FilasJSONResponse(db.obtener_proveedores_filas(conn)), conn)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -332,38 +568,38 @@ def get_warehouses():
 # --- INVENTARIO ---
 
 @app.get("/api/inventory/detailed")
-def get_inventory_detailed():
+def get_inventory_detailed(conn=Depends(conexion_reportes)):
     """Retorna inventario desglosado por almacén"""
     try:
-        df = db.obtener_inventario_detallado()
-        return df.fillna(0).to_dict(orient="records")
+        return FilasJSONResponse(db.obtener_inventario_detallado_filas(conn))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/inventory/fifo")
-def get_inventory_fifo(include_igv: bool = True):
+def get_inventory_fifo(include_igv: bool = True, conn=Depends(conexion_reportes)):
     try:
-        total, map_fifo = db.calcular_valorizado_fifo(incluir_igv=include_igv)
+        # Same snapshot for the FIFO layers and the product stock
+        total, map_fifo = db.calcular_valorizado_fifo(incluir_igv=include_igv, conn=conn)
         # We need to merge this with products to make it useful
-        df = db.obtener_productos_extendido()
+        df = db.obtener_productos_extendido(conn)
         
         result = []
         if not df.empty:
-            for _, row in df.iterrows():
-                pid = row['id']
-                val_data = map_fifo.get(pid, {'valor': 0.0})
-                result.append({
-                    "id": pid,
-                    "sku": row['codigo_sku'],
-                    "producto": row['nombre'],
-                    "categoria": row['categoria_nombre'],
-                    "unidad": row['unidad_medida'],
-                    "stock": row['stock_actual'],
-                    "fifo_valuated": val_data['valor'],
-                    "costo_unitario": val_data['valor'] / row['stock_actual'] if row['stock_actual'] > 0 else row['costo_promedio'],
-                    "valor_total": val_data['valor'],
-                    "estado": "Normal" if row['stock_actual'] > 0 else "Sin Stock" # Simple status for now
-                })
+            valor = df['id'].map({pid: v['valor'] for pid, v in map_fifo.items()}).fillna(0.0)
+            con_stock = df['stock_actual'] > 0
+            items = df.rename(columns={
+                'codigo_sku': 'sku', 'nombre': 'producto', 'categoria_nombre': 'categoria',
+                'unidad_medida': 'unidad', 'stock_actual': 'stock'
+            }).assign(
+                fifo_valuated=valor,
+                costo_unitario=(valor / df['stock_actual'].where(con_stock)).where(con_stock, df['costo_promedio']),
+                valor_total=valor,
+                estado=con_stock.map({True: "Normal", False: "Sin Stock"})  # Simple status for now
+            )
+            result = items[[
+                'id', 'sku', 'producto', 'categoria', 'unidad', 'stock',
+                'fifo_valuated', 'costo_unitario', 'valor_total', 'estado'
+            ]].to_dict('records')
         return {"total_valuation": total, "items": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -435,10 +671,18 @@ def register_purchase(req: CompraRequest):
 # --- ORDENES DE COMPRA ---
 
 @app.get("/api/orders")
-def get_orders():
+def get_orders(limit: int = None, cursor: str = None, sort: str = None,
+               start_date: str = None, end_date: str = None, provider_id: int = None,
+               product_id: int = None, estado: str = None):
+    """Purchase orders; paginated with limit/cursor/sort (default -id) or filters"""
     try:
-        df = db.obtener_ordenes_compra()
-        return df.fillna("").to_dict(orient="records")
+        filtros = {"start_date": start_date, "end_date": end_date, "provider_id": provider_id,
+                   "product_id": product_id, "estado": estado}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("ordenes_compra", limit, cursor, sort, filtros)
+        return FilasJSONResponse(db.obtener_ordenes_compra_filas())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -688,30 +932,136 @@ def get_purchases_detailed():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/exits/history")
-def get_exits_history():
-    """Exit/output history"""
+def get_exits_history(limit: int = None, cursor: str = None, sort: str = None,
+                      start_date: str = None, end_date: str = None,
+                      product_id: int = None, almacen_id: int = None):
+    """Exit/output history; paginated with limit/cursor/sort (default -fecha) or filters"""
     try:
-        # Need to create this function in backend.py
+        filtros = {"start_date": start_date, "end_date": end_date,
+                   "product_id": product_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("salidas", limit, cursor, sort, filtros)
         df = db.obtener_salidas_historial()
         return df.fillna("").to_dict(orient="records")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/transfers/history")
-def get_transfers_history():
-    """Transfer history between warehouses"""
+def get_transfers_history(limit: int = None, cursor: str = None, sort: str = None,
+                          start_date: str = None, end_date: str = None,
+                          product_id: int = None, almacen_id: int = None):
+    """Transfer history between warehouses; paginated with limit/cursor/sort (default -fecha) or filters"""
     try:
-        df = db.obtener_historial_traslados()
-        return df.fillna("").to_dict(orient="records")
+        filtros = {"start_date": start_date, "end_date": end_date,
+                   "product_id": product_id, "almacen_id": almacen_id}
+        if _pide_pagina(limit, cursor, sort, filtros):
+            return _listado_paginado("traslados", limit, cursor, sort, filtros)
+        return FilasJSONResponse(db.obtener_historial_traslados_filas())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _kardex_general_ndjson(start_date, end_date, cursor, limit):
+    """NDJSON rows straight from the DB cursor; with `limit`, a last {"next_cursor"} line if more rows remain"""
+    filas = db.iterar_kardex_general(start_date, end_date, cursor, None if limit is None else limit + 1)
+    enviados = 0
+    ultimo = None
+    try:
+        for mov_id, fila in filas:
+            if limit is not None and enviados == limit:
+                yield (json.dumps({"next_cursor": db.codificar_cursor_kardex(*ultimo)}) + "\n").encode("utf-8")
+                break
+            yield (json.dumps(fila, ensure_ascii=False) + "\n").encode("utf-8")
+            ultimo = (fila['Fecha'], mov_id)
+            enviados += 1
+    finally:
+        filas.close()
+
 @app.get("/api/inventory/kardex/general")
-def get_kardex_general(start_date: str, end_date: str):
-    """General Kardex (all products)"""
+def get_kardex_general(start_date: str, end_date: str, limit: int = None, cursor: str = None, format: str = "json"):
+    """
+    General Kardex (all products).
+    - limit/cursor: keyset pagination -> {"items": [...], "next_cursor": str | null}
+    - format=ndjson: streamed one row per line (constant memory for any range)
+    Without these parameters the full list is returned as before.
+    """
     try:
+        if limit is not None and limit <= 0:
+            raise HTTPException(status_code=400, detail="limit debe ser mayor a 0")
+        if cursor:
+            db.decodificar_cursor_kardex(cursor)  # validate before streaming
+        if format == "ndjson":
+            return StreamingResponse(
+                _kardex_general_ndjson(start_date, end_date, cursor, limit),
+                media_type="application/x-ndjson"
+            )
+        if limit is not None or cursor:
+            items, next_cursor = db.obtener_kardex_general_pagina(start_date, end_date, cursor, limit or 100)
+            return {"items": items, "next_cursor": next_cursor}
         df = db.obtener_kardex_general(start_date, end_date)
         return df.fillna("").to_dict(orient="records")
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _kardex_valorizado_csv(filas, lote=500):
+    """CSV (';' and BOM, same as the templates) written in chunks as rows come out of the generator"""
+    stream = io.StringIO()
+    writer = csv.writer(stream, delimiter=';')
+    writer.writerow(db.KARDEX_VALORIZADO_COLUMNAS)
+    encoding = 'utf-8-sig'
+    try:
+        for i, fila in enumerate(filas, 1):
+            writer.writerow(fila.values())
+            if i % lote == 0:
+                yield stream.getvalue().encode(encoding)
+                encoding = 'utf-8'
+                stream.seek(0)
+                stream.truncate(0)
+        yield stream.getvalue().encode(encoding)
+    finally:
+        filas.close()
+
+def _kardex_valorizado_ndjson(filas):
+    try:
+        for fila in filas:
+            yield (json.dumps(fila, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        filas.close()
+
+@app.get("/api/inventory/kardex/valorizado")
+def get_kardex_valorizado(start_date: str, end_date: str, metodo: str = "fifo", product_id: int = None,
+                          include_igv: bool = True, format: str = "json"):
+    """
+    Valued Kardex (SUNAT format 13.1): quantity, unit cost and total for entries, exits and balance.
+    - metodo: fifo | promedio (weighted average)
+    - format=csv / ndjson: streamed export, suitable for a full fiscal year of all products
+    """
+    try:
+        metodo = metodo.lower()
+        if metodo not in ("fifo", "promedio"):
+            raise HTTPException(status_code=400, detail="metodo debe ser 'fifo' o 'promedio'")
+        if format == "csv":
+            response = StreamingResponse(
+                _kardex_valorizado_csv(db.iterar_kardex_valorizado(start_date, end_date, metodo, product_id, include_igv)),
+                media_type="text/csv"
+            )
+            response.headers["Content-Disposition"] = f"attachment; filename=kardex_valorizado_{start_date}_{end_date}.csv"
+            return response
+        if format == "ndjson":
+            return StreamingResponse(
+                _kardex_valorizado_ndjson(db.iterar_kardex_valorizado(start_date, end_date, metodo, product_id, include_igv)),
+                media_type="application/x-ndjson"
+            )
+        return list(db.iterar_kardex_valorizado(start_date, end_date, metodo, product_id, include_igv))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -719,28 +1069,65 @@ def get_kardex_general(start_date: str, end_date: str):
 def get_kardex(product_id: int, start_date: str = None, end_date: str = None):
     """Kardex (movement history) for a specific product"""
     try:
-        df = db.obtener_kardex_producto(product_id, start_date, end_date)
+        return FilasJSONResponse(db.obtener_kardex_producto_filas(product_id, start_date, end_date))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/inventory/stock-at-date")
+def get_stock_at_date(fecha: str, product_id: int = None, almacen_id: int = None):
+    """Stock per product and warehouse at the end of the given date"""
+    try:
+        df = db.obtener_stock_a_fecha(fecha, product_id, almacen_id)
         return df.fillna("").to_dict(orient="records")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Dashboard results by (start_date, end_date, section); invalidated by any write commit
+cache_dashboard = CacheResultados(version=db.version_datos)
+
+# Sections run concurrently; each backend call borrows its own pooled read connection.
+# Shared and bounded so concurrent dashboards cannot take more than this many connections.
+# Sections do not get the request connection (conexion_reportes): the cache reads the data
+# version before computing, so each section's snapshot must start after that read, and one
+# shared connection would run the sections one statement at a time.
+HILOS_DASHBOARD = 7  # one per section
+executor_dashboard = ThreadPoolExecutor(max_workers=HILOS_DASHBOARD, thread_name_prefix="dashboard")
+
+def _seccion_dashboard(start, end, seccion, funcion):
+    """Returns (result, elapsed ms) for one section, through the cache"""
+    inicio = time.perf_counter()
+    valor = cache_dashboard.obtener_o_calcular((start, end, seccion), funcion)
+    return valor, round((time.perf_counter() - inicio) * 1000, 2)
+
 @app.get("/api/dashboard/complete")
 def get_dashboard_complete(start_date: str, end_date: str):
-    """Complete dashboard data with all charts"""
+    """Complete dashboard data with all charts (plus per-section timings in ms)"""
     try:
         from datetime import datetime
         start = datetime.strptime(start_date, "%Y-%m-%d").date()
         end = datetime.strptime(end_date, "%Y-%m-%d").date()
         
-        return {
-            "kpis": db.obtener_kpis_dashboard(start, end),
-            "top_providers": db.obtener_top_proveedores(start, end).fillna("").to_dict(orient="records"),
-            "categories": db.obtener_gastos_por_categoria(start, end).fillna("").to_dict(orient="records"),
-            "evolution": db.obtener_evolucion_compras(start, end).fillna("").to_dict(orient="records"),
-            "stock_critico": db.obtener_stock_critico().fillna("").to_dict(orient="records"),
-            "rotacion": db.obtener_rotacion_inventario().fillna("").to_dict(orient="records"),
-            "alertas": db.obtener_alertas_criticas()
+        # Sections that do not depend on the date range share one entry (None, None, section);
+        # their windows relative to today are kept fresh by the cache TTL
+        secciones = {
+            "kpis": (start, end, lambda: db.obtener_kpis_dashboard(start, end)),
+            "top_providers": (start, end, lambda: db.obtener_top_proveedores(start, end).fillna("").to_dict(orient="records")),
+            "categories": (start, end, lambda: db.obtener_gastos_por_categoria(start, end).fillna("").to_dict(orient="records")),
+            "evolution": (start, end, lambda: db.obtener_evolucion_compras(start, end).fillna("").to_dict(orient="records")),
+            "stock_critico": (None, None, lambda: db.obtener_stock_critico().fillna("").to_dict(orient="records")),
+            "rotacion": (None, None, lambda: db.obtener_rotacion_inventario().fillna("").to_dict(orient="records")),
+            "alertas": (None, None, db.obtener_alertas_criticas),
+        }
+        futuros = {
+            nombre: executor_dashboard.submit(_seccion_dashboard, inicio, fin, nombre, funcion)
+            for nombre, (inicio, fin, funcion) in secciones.items()
         }
+        respuesta = {}
+        tiempos = {}
+        for nombre, futuro in futuros.items():
+            respuesta[nombre], tiempos[nombre] = futuro.result()
+        respuesta["timings_ms"] = tiempos
+        return respuesta
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -778,27 +1165,27 @@ def get_template(type: str):
 
 @app.post("/api/upload/{type}")
 async def upload_data(type: str, file: UploadFile = File(...), almacen_id: int = 1):
-    """Process uploaded CSV/Excel file"""
+    """Process uploaded CSV/Excel file (parsing and writes run off the event loop)"""
     try:
         contents = await file.read()
         import pandas as pd
         
         if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
+            df = await asincrono.en_cpu(pd.read_csv, io.BytesIO(contents))
         elif file.filename.endswith('.xlsx'):
-            df = pd.read_excel(io.BytesIO(contents))
+            df = await asincrono.en_cpu(pd.read_excel, io.BytesIO(contents))
         else:
             raise HTTPException(status_code=400, detail="Invalid file format. Use CSV or Excel.")
             
         # Logic delegate to backend.py
         if type == 'products':
-            msg = db.carga_masiva_productos(df)
+            msg = await asincrono.en_db(db.carga_masiva_productos, df)
         elif type == 'providers':
-            msg = db.carga_masiva_proveedores(df)
+            msg = await asincrono.en_db(db.carga_masiva_proveedores, df)
         elif type == 'purchases':
-            msg = db.carga_masiva_compras(df)
+            msg = await asincrono.en_db(db.carga_masiva_compras, df)
         elif type == 'initial_stock':
-            msg = db.carga_masiva_stock_inicial(df, almacen_id)
+            msg = await asincrono.en_db(db.carga_masiva_stock_inicial, df, almacen_id)
         else:
             raise HTTPException(status_code=400, detail="Invalid upload type")
             
@@ -809,4 +1196,5 @@ async def upload_data(type: str, file: UploadFile = File(...), almacen_id: int =
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Open SSE streams never finish on their own; cap the graceful shutdown wait
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=5)
@@ -0,0 +1,76 @@
+"""
+Completa en bloque la tabla tipo_cambio con tasas históricas de SUNAT.
+  - Desde la API (ERP_TC_API_URL): por defecto solo las fechas con compras en USD
+    sin T.C. propio; con --todas, cada día del rango que falte.
+  - Desde un CSV (--csv archivo) con columnas fecha, compra, venta (',' o ';').
+Las fechas ya registradas no se modifican. Los días sin tasa (fines de semana,
+feriados) toman la última anterior en la vista compras_cabecera_pen; al agregar
+tasas se vuelven a estampar los montos PEN/USD de las compras y se regeneran
+los hechos diarios de gasto y las alertas de compras.
+
+Uso: python backend/scripts/backfill_tipo_cambio.py [desde] [hasta] [--todas] [--csv archivo]
+"""
+import csv
+import os
+import sys
+import sqlite3
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import alertas, api, gasto_diario, tipo_cambio
+from src.migrations import aplicar_migraciones
+from src.backend import DB_PATH
+
+
+def cargar_csv(ruta):
+    with open(ruta, newline='', encoding='utf-8-sig') as f:
+        muestra = f.readline()
+        f.seek(0)
+        lector = csv.DictReader(f, delimiter=';' if muestra.count(';') > muestra.count(',') else ',')
+        tasas = []
+        for fila in lector:
+            fila = {k.strip().lower(): (v or '').strip() for k, v in fila.items() if k}
+            try:
+                tasas.append((fila['fecha'], float(fila['venta']), float(fila['compra']) if fila.get('compra') else None))
+            except (KeyError, ValueError):
+                print(f"⚠️ Fila ignorada: {fila}")
+    return tasas
+
+
+def main():
+    args = sys.argv[1:]
+    todas = '--todas' in args
+    ruta_csv = None
+    if '--csv' in args:
+        i = args.index('--csv')
+        ruta_csv = args[i + 1]
+        del args[i:i + 2]
+    args = [a for a in args if a != '--todas']
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        aplicar_migraciones(conn)
+        cursor = conn.cursor()
+        if ruta_csv:
+            n = tipo_cambio.guardar_historico(cursor, cargar_csv(ruta_csv), origen='CSV')
+            if n:
+                tipo_cambio.normalizar_compras(cursor)
+                gasto_diario.recalcular(cursor)
+                alertas.evaluar_proveedores(cursor)
+            conn.commit()
+            print(f"✅ {n} tasas nuevas cargadas desde {ruta_csv}")
+            return
+        cursor.execute("SELECT MIN(substr(fecha_emision, 1, 10)) FROM compras_cabecera WHERE moneda = 'USD'")
+        primera = cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+    desde = args[0] if len(args) > 0 else (primera or date.today().isoformat())
+    hasta = args[1] if len(args) > 1 else date.today().isoformat()
+    api.DB_PATH = DB_PATH
+    consultadas, guardadas, errores = api.completar_historico_tc(desde, hasta, todas=todas)
+    print(f"✅ {desde} a {hasta}: {consultadas} fechas consultadas, {guardadas} guardadas, {errores} sin respuesta")
+
+
+if __name__ == "__main__":
+    main()
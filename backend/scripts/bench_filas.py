@@ -0,0 +1,110 @@
+"""
+Benchmark de los listados de la API: ruta pandas vs ruta de filas (src/filas.py).
+Genera una base sintética (la misma de bench_indices.py), aplica todas las
+migraciones y mide, por endpoint, la latencia (mediana) y el pico de memoria
+(tracemalloc) de armar el cuerpo JSON de la respuesta:
+
+- pandas: DataFrame -> fillna -> to_dict -> jsonable_encoder -> json.dumps
+  (lo que hacían los endpoints con JSONResponse)
+- filas:  cursor -> dicts (row_factory) -> filas.a_json
+
+También verifica que ambas rutas devuelvan los mismos datos.
+
+Uso: python backend/scripts/bench_filas.py [num_compras] [num_salidas] [repeticiones]
+"""
+import os
+import sys
+import json
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fastapi.encoders import jsonable_encoder
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos
+from src.migrations import aplicar_migraciones
+from src import backend as db
+from src import filas
+
+PRODUCTO_KARDEX = 1
+
+# (endpoint, función DataFrame, relleno de nulos, función filas)
+ENDPOINTS = [
+    ("/api/products", db.obtener_productos_extendido, "", db.obtener_productos_extendido_filas),
+    ("/api/providers", db.obtener_proveedores, "", db.obtener_proveedores_filas),
+    ("/api/warehouses", db.obtener_almacenes, "", db.obtener_almacenes_filas),
+    ("/api/orders", db.obtener_ordenes_compra, "", db.obtener_ordenes_compra_filas),
+    ("/api/purchases/summary", db.obtener_compras_historial, "", db.obtener_compras_historial_filas),
+    ("/api/purchases/detailed", db.obtener_detalle_compras, "", db.obtener_compras_detalle_historial_filas),
+    ("/api/transfers/history", db.obtener_historial_traslados, "", db.obtener_historial_traslados_filas),
+    ("/api/inventory/detailed", db.obtener_inventario_detallado, 0, db.obtener_inventario_detallado_filas),
+    (f"/api/inventory/kardex/{PRODUCTO_KARDEX}",
+     lambda: db.obtener_kardex_producto(PRODUCTO_KARDEX), "",
+     lambda: db.obtener_kardex_producto_filas(PRODUCTO_KARDEX)),
+]
+
+
+def cuerpo_pandas(funcion, relleno):
+    datos = funcion().fillna(relleno).to_dict(orient="records")
+    # Igual que starlette.responses.JSONResponse.render
+    return json.dumps(jsonable_encoder(datos), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def cuerpo_filas(funcion):
+    return filas.a_json(funcion())
+
+
+def medir(generar, repeticiones):
+    """(mediana ms, pico de memoria MB, cuerpo)"""
+    cuerpo = generar()  # calentar caché
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        generar()
+        tiempos.append((time.perf_counter() - inicio) * 1000.0)
+    tracemalloc.start()
+    generar()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(tiempos), pico / (1024 * 1024), cuerpo
+
+
+def main():
+    num_compras = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    num_salidas = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    repeticiones = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_bench_")
+    db_path = os.path.join(tmp_dir, "bench.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    print(f"Generando datos sintéticos: {num_compras} compras, {num_salidas} salidas...")
+    generar_datos(conn, num_compras, num_salidas)
+    aplicar_migraciones(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    db.DB_PATH = db_path
+
+    print(f"Codificador JSON: {'orjson' if filas.orjson is not None else 'json (stdlib)'}\n")
+    print("| Endpoint | Filas | pandas (ms) | filas (ms) | Mejora | pandas pico (MB) | filas pico (MB) | Iguales |")
+    print("|---|---:|---:|---:|---:|---:|---:|:---:|")
+    for endpoint, funcion_df, relleno, funcion_filas in ENDPOINTS:
+        t_pd, m_pd, c_pd = medir(lambda: cuerpo_pandas(funcion_df, relleno), repeticiones)
+        t_fi, m_fi, c_fi = medir(lambda: cuerpo_filas(funcion_filas), repeticiones)
+        datos = json.loads(c_fi)
+        iguales = "sí" if json.loads(c_pd) == datos else "NO"
+        print(f"| {endpoint} | {len(datos)} | {t_pd:.1f} | {t_fi:.1f} | {t_pd / t_fi if t_fi else float('inf'):.1f}x "
+              f"| {m_pd:.1f} | {m_fi:.1f} | {iguales} |")
+
+    db.get_pool(db_path).cerrar()
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
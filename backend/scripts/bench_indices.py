@@ -0,0 +1,162 @@
+"""
+Benchmark antes/después de la migración de índices (v1).
+Genera una base sintética grande en un archivo temporal, mide las consultas
+típicas de kardex, FIFO, saldos y dashboard sin índices, aplica la migración
+y vuelve a medir.
+
+Uso: python backend/scripts/bench_indices.py [num_compras] [num_salidas]
+"""
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from init_db_schema import crear_tablas
+from src.migrations import aplicar_migraciones
+
+NUM_PRODUCTOS = 2000
+NUM_PROVEEDORES = 200
+NUM_ALMACENES = 5
+LINEAS_POR_DOC = 4
+
+
+def generar_datos(conn, num_compras, num_salidas):
+    rnd = random.Random(42)
+    cur = conn.cursor()
+    inicio = date(2020, 1, 1)
+    fechas = [(inicio + timedelta(days=d)).isoformat() for d in range(365 * 5)]
+
+    cur.executemany("INSERT INTO almacenes (id, nombre) VALUES (?, ?)",
+                    [(i, f"Almacen {i}") for i in range(1, NUM_ALMACENES + 1)])
+    cur.execute("INSERT INTO categorias (id, nombre) VALUES (1, 'General')")
+    cur.executemany("INSERT INTO proveedores (id, ruc_dni, razon_social) VALUES (?, ?, ?)",
+                    [(i, f"20{i:09d}", f"PROVEEDOR {i}") for i in range(1, NUM_PROVEEDORES + 1)])
+    cur.executemany(
+        "INSERT INTO productos (id, codigo_sku, nombre, unidad_medida, categoria_id, stock_actual, stock_minimo) VALUES (?, ?, ?, 'UND', 1, ?, 10)",
+        [(i, f"SKU-{i}", f"PRODUCTO {i}", rnd.randint(0, 500)) for i in range(1, NUM_PRODUCTOS + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO stock_almacen (producto_id, almacen_id, stock_actual) VALUES (?, ?, ?)",
+        [(p, a, rnd.randint(0, 100)) for p in range(1, NUM_PRODUCTOS + 1) for a in range(1, NUM_ALMACENES + 1)]
+    )
+
+    cur.executemany(
+        "INSERT INTO compras_cabecera (id, proveedor_id, fecha_emision, tipo_documento, serie, numero, moneda, total_compra, tipo_cambio) VALUES (?, ?, ?, 'FACTURA', 'F001', ?, ?, ?, 3.75)",
+        [(i, rnd.randint(1, NUM_PROVEEDORES), rnd.choice(fechas), str(i), rnd.choice(['PEN', 'USD']), rnd.uniform(10, 20000))
+         for i in range(1, num_compras + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO compras_detalle (compra_id, producto_id, cantidad, precio_unitario, subtotal, almacen_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(c, rnd.randint(1, NUM_PRODUCTOS), q, pu, q * pu, rnd.randint(1, NUM_ALMACENES))
+         for c in range(1, num_compras + 1) for _ in range(LINEAS_POR_DOC)
+         for q, pu in [(rnd.randint(1, 50), rnd.uniform(1, 100))]]
+    )
+
+    cur.executemany("INSERT INTO salidas_cabecera (id, fecha, destino) VALUES (?, ?, 'Obra')",
+                    [(i, rnd.choice(fechas)) for i in range(1, num_salidas + 1)])
+    cur.executemany(
+        "INSERT INTO salidas_detalle (salida_id, producto_id, cantidad, almacen_id) VALUES (?, ?, ?, ?)",
+        [(s, rnd.randint(1, NUM_PRODUCTOS), rnd.randint(1, 10), rnd.randint(1, NUM_ALMACENES))
+         for s in range(1, num_salidas + 1) for _ in range(LINEAS_POR_DOC)]
+    )
+
+    num_traslados = num_salidas // 4
+    cur.executemany("INSERT INTO traslados_cabecera (id, fecha, origen_id, destino_id) VALUES (?, ?, 1, 2)",
+                    [(i, rnd.choice(fechas)) for i in range(1, num_traslados + 1)])
+    cur.executemany("INSERT INTO traslados_detalle (traslado_id, producto_id, cantidad) VALUES (?, ?, ?)",
+                    [(t, rnd.randint(1, NUM_PRODUCTOS), rnd.randint(1, 5)) for t in range(1, num_traslados + 1) for _ in range(2)])
+
+    num_oc = num_compras // 4
+    cur.executemany("INSERT INTO ordenes_compra (id, proveedor_id, fecha_emision, estado) VALUES (?, ?, ?, 'APROBADA')",
+                    [(i, rnd.randint(1, NUM_PROVEEDORES), rnd.choice(fechas)) for i in range(1, num_oc + 1)])
+    cur.executemany("INSERT INTO ordenes_compra_det (oc_id, producto_id, cantidad_solicitada, precio_unitario_pactado) VALUES (?, ?, ?, 10)",
+                    [(o, rnd.randint(1, NUM_PRODUCTOS), rnd.randint(10, 100)) for o in range(1, num_oc + 1) for _ in range(3)])
+    cur.executemany("INSERT INTO guias_remision (id, proveedor_id, oc_id, numero_guia, fecha_recepcion) VALUES (?, ?, ?, ?, ?)",
+                    [(i, rnd.randint(1, NUM_PROVEEDORES), i, f"G-{i}", rnd.choice(fechas)) for i in range(1, num_oc + 1)])
+    cur.executemany("INSERT INTO guias_remision_det (guia_id, producto_id, cantidad_recibida, almacen_destino_id) VALUES (?, ?, ?, 1)",
+                    [(g, rnd.randint(1, NUM_PRODUCTOS), rnd.randint(1, 50)) for g in range(1, num_oc + 1) for _ in range(2)])
+    conn.commit()
+
+
+# (nombre, sql, params, repeticiones)
+CONSULTAS = [
+    ("Kardex producto (UNION 4 vías)", """
+        SELECT cc.fecha_emision, cd.cantidad, 0 FROM compras_detalle cd JOIN compras_cabecera cc ON cd.compra_id = cc.id WHERE cd.producto_id = ?
+        UNION ALL SELECT sc.fecha, 0, sd.cantidad FROM salidas_detalle sd JOIN salidas_cabecera sc ON sd.salida_id = sc.id WHERE sd.producto_id = ?
+        UNION ALL SELECT tc.fecha, 0, td.cantidad FROM traslados_detalle td JOIN traslados_cabecera tc ON td.traslado_id = tc.id WHERE td.producto_id = ?
+        UNION ALL SELECT tc.fecha, td.cantidad, 0 FROM traslados_detalle td JOIN traslados_cabecera tc ON td.traslado_id = tc.id WHERE td.producto_id = ?
+        ORDER BY 1 DESC
+    """, (777, 777, 777, 777), 20),
+    ("Lotes FIFO de un producto", """
+        SELECT cd.cantidad, cd.precio_unitario, cc.fecha_emision, cc.moneda, cc.tipo_cambio
+        FROM compras_detalle cd JOIN compras_cabecera cc ON cd.compra_id = cc.id
+        WHERE cd.producto_id = ? ORDER BY cc.fecha_emision ASC, cc.id ASC
+    """, (777,), 50),
+    ("Productos con salidas en un mes", """
+        SELECT DISTINCT producto_id FROM salidas_detalle sd JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+        WHERE sc.fecha BETWEEN ? AND ?
+    """, ("2023-03-01", "2023-03-31"), 20),
+    ("Top proveedores de un mes", """
+        SELECT p.razon_social, TOTAL(c.total_compra) AS Monto FROM compras_cabecera c JOIN proveedores p ON c.proveedor_id = p.id
+        WHERE c.fecha_emision BETWEEN ? AND ? GROUP BY p.id ORDER BY Monto DESC LIMIT 10
+    """, ("2023-03-01", "2023-03-31"), 20),
+    ("Saldo recibido de una OC", """
+        SELECT d.producto_id, SUM(d.cantidad_recibida) FROM guias_remision_det d JOIN guias_remision g ON d.guia_id = g.id
+        WHERE g.oc_id = ? GROUP BY d.producto_id
+    """, (1234,), 50),
+    ("Stock de producto en almacén", """
+        SELECT id, stock_actual FROM stock_almacen WHERE producto_id = ? AND almacen_id = ?
+    """, (777, 3), 200),
+    ("Detalle de una compra", """
+        SELECT * FROM compras_detalle WHERE compra_id = ?
+    """, (4321,), 200),
+]
+
+
+def medir(conn, sql, params, repeticiones):
+    cur = conn.cursor()
+    cur.execute(sql, params).fetchall()  # calentar caché
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cur.execute(sql, params).fetchall()
+    return (time.perf_counter() - inicio) / repeticiones * 1000.0
+
+
+def main():
+    num_compras = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    num_salidas = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_bench_")
+    db_path = os.path.join(tmp_dir, "bench.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    print(f"Generando datos sintéticos: {num_compras} compras, {num_salidas} salidas ({LINEAS_POR_DOC} líneas c/u)...")
+    generar_datos(conn, num_compras, num_salidas)
+
+    antes = {nombre: medir(conn, sql, params, rep) for nombre, sql, params, rep in CONSULTAS}
+
+    inicio = time.perf_counter()
+    aplicar_migraciones(conn, hasta=1)
+    t_migracion = time.perf_counter() - inicio
+    conn.execute("ANALYZE")
+
+    despues = {nombre: medir(conn, sql, params, rep) for nombre, sql, params, rep in CONSULTAS}
+    conn.close()
+
+    print(f"\nMigración v1 aplicada en {t_migracion:.2f} s\n")
+    print("| Consulta | Sin índices (ms) | Con índices (ms) | Mejora |")
+    print("|---|---:|---:|---:|")
+    for nombre, _, _, _ in CONSULTAS:
+        a, d = antes[nombre], despues[nombre]
+        print(f"| {nombre} | {a:.2f} | {d:.3f} | {a / d if d else float('inf'):.0f}x |")
+
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
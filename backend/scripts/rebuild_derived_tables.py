@@ -0,0 +1,35 @@
+"""
+Regenera desde el historial las tablas derivadas (capas_fifo, movimientos_inventario,
+saldos_mensuales, ...). Al indicar una tabla se regeneran también las que dependen de ella.
+Útil tras restaurar la base o cargar datos con SQL directo.
+
+Uso: python backend/scripts/rebuild_derived_tables.py [tabla ...]
+"""
+import os
+import sys
+import sqlite3
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.migrations import DERIVADAS, aplicar_migraciones, reconstruir_derivadas
+from src.backend import DB_PATH
+
+
+def main():
+    nombres = sys.argv[1:]
+    disponibles = [n for n, _ in DERIVADAS]
+    desconocidas = [n for n in nombres if n not in disponibles]
+    if desconocidas:
+        print(f"❌ Tablas desconocidas: {', '.join(desconocidas)}. Disponibles: {', '.join(disponibles)}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        aplicar_migraciones(conn)
+        for nombre, filas in reconstruir_derivadas(conn, nombres or None).items():
+            print(f"✅ {nombre}: {filas} filas regeneradas")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
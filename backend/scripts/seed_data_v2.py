@@ -34,7 +34,8 @@ def clear_database():
         "factura_guia_rel", "guias_remision_det", "guias_remision", "compras_detalle",
         "compras_cabecera", "ordenes_compra_det", "ordenes_compra_detalle", "ordenes_compra",
         "stock_almacen", "productos", "proveedores", "categorias", "almacenes",
-        "users", "configuracion", "tipo_cambio"
+        "users", "configuracion", "tipo_cambio", "capas_fifo",
+        "movimientos_inventario", "saldos_mensuales", "saldos_periodos"
     ]
     for table in tables:
         try:
@@ -202,6 +203,17 @@ def generate_full_transactions():
     conn.commit()
     conn.close()
 
+def rebuild_derived_tables():
+    # Seeds insert raw SQL, so derived tables (FIFO layers, ...) are regenerated from history
+    print("🔁 Rebuilding derived tables...")
+    from src.migrations import reconstruir_derivadas
+    conn = get_connection()
+    try:
+        for nombre, filas in reconstruir_derivadas(conn).items():
+            print(f"  - {nombre}: {filas}")
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
     try:
         clear_database()
@@ -209,5 +221,6 @@ if __name__ == "__main__":
         seed_config_and_tc()
         seed_master_data()
         generate_full_transactions()
+        rebuild_derived_tables()
         print("🚀 Base de Datos completamente poblada (TODAS las tablas)!")
     except Exception as e: print(f"❌ Error: {e}")
@@ -0,0 +1,158 @@
+"""
+Verificación de los endpoints async (src/asincrono.py): la latencia de las
+demás peticiones debe mantenerse plana mientras corre una carga masiva grande
+(POST /api/upload/initial_stock) o una ráfaga de logins (POST /api/token, bcrypt).
+
+Genera una base sintética (la de bench_indices.py), importa la app y, con un
+cliente ASGI en el mismo event loop (como un worker de uvicorn), sondea
+GET /api/warehouses cada pocos ms durante cada escenario. Compara dos modos:
+
+- bloqueante: en_db()/en_cpu() reemplazados por llamadas directas (lo que
+  hacían los endpoints antes: el trabajo corre en el event loop)
+- asincrono:  la fachada real, con los ejecutores acotados
+
+Uso: python backend/scripts/verify_async.py [filas_csv] [logins]
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import httpx
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos, NUM_PRODUCTOS
+from src.migrations import aplicar_migraciones
+from src import backend as db
+from src import asincrono
+
+SONDA = "/api/warehouses"
+INTERVALO_SONDA = 0.005
+
+
+async def _en_linea(funcion, *args, **kwargs):
+    return funcion(*args, **kwargs)
+
+
+def csv_stock_inicial(filas):
+    lineas = ["CodigoSKU,Cantidad,CostoUnitario"]
+    lineas += [f"SKU-{i % NUM_PRODUCTOS + 1},{i % 7 + 1},{1 + i % 50}.5" for i in range(filas)]
+    return ("\n".join(lineas) + "\n").encode()
+
+
+async def sondear(cliente, latencias, fin):
+    """
+    Latencia medida desde el momento en que la sonda debía salir: si el event
+    loop está bloqueado, la espera antes de enviarla también cuenta. La última
+    sonda sale después de terminar la carga, para no perder una espera en curso.
+    """
+    programada = time.perf_counter()
+    while True:
+        r = await cliente.get(SONDA)
+        assert r.status_code == 200, r.text
+        latencias.append((time.perf_counter() - programada) * 1000.0)
+        if fin.is_set():
+            break
+        programada = time.perf_counter() + INTERVALO_SONDA
+        await asyncio.sleep(INTERVALO_SONDA)
+
+
+async def escenario(cliente, carga):
+    """(latencias de la sonda en ms, duración de la carga en s) mientras corre `carga`"""
+    latencias, fin = [], asyncio.Event()
+    sonda = asyncio.create_task(sondear(cliente, latencias, fin))
+    await asyncio.sleep(0.05)
+    inicio = time.perf_counter()
+    await carga(cliente)
+    duracion = time.perf_counter() - inicio
+    fin.set()
+    await sonda
+    return latencias, duracion
+
+
+async def reposo(cliente):
+    await asyncio.sleep(0.5)
+
+
+def upload(contenido):
+    async def carga(cliente):
+        r = await cliente.post("/api/upload/initial_stock", files={"file": ("stock.csv", contenido, "text/csv")})
+        assert r.status_code == 200, r.text
+        assert "Error" not in r.json()["msg"][:20], r.json()
+    return carga
+
+
+def logins(cantidad):
+    async def carga(cliente):
+        respuestas = await asyncio.gather(*[
+            cliente.post("/api/token", data={"username": "admin", "password": "admin"}) for _ in range(cantidad)
+        ])
+        assert all(r.status_code == 200 for r in respuestas), [r.text for r in respuestas]
+    return carga
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def medir(app, escenarios):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://erp") as cliente:
+        await cliente.get(SONDA)  # calentar
+        resultados = []
+        for nombre, carga in escenarios:
+            latencias, duracion = await escenario(cliente, carga)
+            resultados.append((nombre, latencias, duracion))
+        return resultados
+
+
+def main():
+    filas_csv = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cantidad_logins = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_async_")
+    db_path = os.path.join(tmp_dir, "async.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    generar_datos(conn, 2000, 2000)
+    aplicar_migraciones(conn)
+    conn.commit()
+    conn.close()
+    db.DB_PATH = db_path
+
+    from main import app  # crea el usuario admin/admin en la base temporal
+    contenido = csv_stock_inicial(filas_csv)
+    escenarios = [
+        ("reposo", reposo),
+        (f"upload {filas_csv} filas", upload(contenido)),
+        (f"{cantidad_logins} logins", logins(cantidad_logins)),
+    ]
+
+    en_db, en_cpu = asincrono.en_db, asincrono.en_cpu
+    modos = []
+    asincrono.en_db = asincrono.en_cpu = _en_linea
+    modos.append(("bloqueante", asyncio.run(medir(app, escenarios))))
+    asincrono.en_db, asincrono.en_cpu = en_db, en_cpu
+    modos.append(("asincrono", asyncio.run(medir(app, escenarios))))
+
+    print(f"\nSonda: GET {SONDA} cada {INTERVALO_SONDA * 1000:.0f} ms\n")
+    print("| Modo | Escenario | Duración carga (s) | Sondas | p50 (ms) | p95 (ms) | máx (ms) |")
+    print("|---|---|---:|---:|---:|---:|---:|")
+    for modo, resultados in modos:
+        for nombre, latencias, duracion in resultados:
+            print(f"| {modo} | {nombre} | {duracion:.2f} | {len(latencias)} | {statistics.median(latencias):.1f} "
+                  f"| {percentil(latencias, 0.95):.1f} | {max(latencias):.1f} |")
+
+    print("\nEjecutores:", asincrono.estadisticas())
+    asincrono.cerrar()
+    db.get_pool(db_path).cerrar()
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
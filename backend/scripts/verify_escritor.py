@@ -0,0 +1,220 @@
+"""
+Verificación del escritor único (src/escritor.py) con escrituras concurrentes.
+Genera una base sintética (la de bench_indices.py) y, mientras corre una carga
+masiva de stock inicial (transacción larga, en otro almacén), lanza varios
+hilos que registran salidas de un mismo producto/almacén con stock limitado,
+compras de un mismo producto (costo promedio ponderado) y traslados de otros
+productos. Compara:
+
+- directo:  cada operación en su conexión del pool con transacción diferida
+            (lo que hacían registrar_salida, registrar_compra, etc.)
+- escritor: el escritor único (BEGIN IMMEDIATE, commits por lotes)
+
+y reporta errores "database is locked", sobreventa (stock negativo o salidas
+aceptadas por encima del stock), el costo promedio final contra el de aplicar
+las compras en serie y la coherencia de stock_almacen con productos.stock_actual.
+
+Uso: python backend/scripts/verify_escritor.py [hilos] [operaciones_por_hilo] [stock_inicial] [filas_carga]
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos, NUM_PRODUCTOS
+from src.migrations import aplicar_migraciones
+from src import backend as db
+
+PRODUCTO = 1          # salidas
+PRODUCTO_COMPRAS = 2  # compras
+ALMACEN = 1
+ALMACEN_DESTINO = 2
+ALMACEN_CARGA = 3
+CANTIDAD_COMPRA = 5
+PRECIO_COMPRA = 10.0
+
+
+def _directo(nombre, operacion, agrupable=True):
+    """Comportamiento anterior: conexión del pool, transacción diferida, commit por operación"""
+    conn = db.get_connection()
+    try:
+        resultado = operacion(conn)
+        conn.commit()
+        return resultado
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def preparar_base(origen, destino, stock_inicial):
+    shutil.copy(origen, destino)
+    conn = sqlite3.connect(destino)
+    conn.execute("UPDATE stock_almacen SET stock_actual = ? WHERE producto_id = ? AND almacen_id = ?",
+                 (stock_inicial, PRODUCTO, ALMACEN))
+    conn.execute("""
+        UPDATE productos SET stock_actual = (SELECT SUM(stock_actual) FROM stock_almacen WHERE producto_id = ?)
+        WHERE id = ?
+    """, (PRODUCTO, PRODUCTO))
+    conn.commit()
+    salidas_previas = conn.execute("SELECT COUNT(*) FROM salidas_detalle WHERE producto_id = ?", (PRODUCTO,)).fetchone()[0]
+    diferencias = diferencias_stock(conn)
+    stock_compras, costo_compras = conn.execute("""
+        SELECT sa.stock_actual, p.costo_promedio FROM productos p
+        JOIN stock_almacen sa ON sa.producto_id = p.id AND sa.almacen_id = ?
+        WHERE p.id = ?
+    """, (ALMACEN, PRODUCTO_COMPRAS)).fetchone()
+    conn.close()
+    return salidas_previas, diferencias, (stock_compras, costo_compras)
+
+
+def diferencias_stock(conn):
+    """{producto: productos.stock_actual - suma de stock_almacen} (los datos sintéticos no cuadran de origen)"""
+    return dict(conn.execute("""
+        SELECT p.id, ROUND(p.stock_actual - (SELECT TOTAL(stock_actual) FROM stock_almacen WHERE producto_id = p.id), 6)
+        FROM productos p
+    """).fetchall())
+
+
+def trabajo(hilo, operaciones, resultados):
+    hoy = date.today().isoformat()
+    for i in range(operaciones):
+        if i % 3 == 0:
+            ok, msg = db.registrar_compra({
+                "proveedor_id": 1, "fecha": hoy, "moneda": "PEN", "serie": f"V{hilo:03d}",
+                "numero": str(i), "tc": 3.75, "tasa_igv": 18,
+                "items": [{"pid": PRODUCTO_COMPRAS, "cantidad": CANTIDAD_COMPRA, "precio_unitario": PRECIO_COMPRA}],
+            })
+            resultados.append(("compra", ok, msg))
+        elif i % 3 == 1:
+            ok, msg = db.registrar_salida({"fecha": hoy, "tipo": "CONSUMO", "destino": "Obra"},
+                                          [{"pid": PRODUCTO, "cantidad": 1, "almacen_id": ALMACEN}])
+            resultados.append(("salida", ok, msg))
+        else:
+            pid = 3 + (hilo * operaciones + i) % (NUM_PRODUCTOS - 2)
+            ok, msg = db.registrar_traslado({"fecha": hoy, "origen_id": ALMACEN, "destino_id": ALMACEN_DESTINO},
+                                            [{"pid": pid, "cantidad": 0.001}])
+            resultados.append(("traslado", ok, msg))
+
+
+def carga(filas, resultados):
+    # Costo 0: la carga no toca el costo promedio (solo stock del almacén de carga)
+    df = pd.DataFrame({"CodigoSKU": [f"SKU-{i % NUM_PRODUCTOS + 1}" for i in range(filas)],
+                       "Cantidad": [i % 9 + 1 for i in range(filas)], "CostoUnitario": 0})
+    msg = db.carga_masiva_stock_inicial(df, ALMACEN_CARGA)
+    resultados.append(("carga", msg.startswith("Carga Exitosa"), msg))
+
+
+def revisar(db_path, stock_inicial, salidas_previas, diferencias_previas, compras_previas, resultados):
+    conn = sqlite3.connect(db_path)
+    stock_final = conn.execute("SELECT stock_actual FROM stock_almacen WHERE producto_id = ? AND almacen_id = ?",
+                               (PRODUCTO, ALMACEN)).fetchone()[0]
+    salidas_ok = sum(1 for tipo, ok, _ in resultados if tipo == "salida" and ok)
+    # Productos cuyo stock global dejó de coincidir con sus almacenes (escrituras perdidas)
+    descuadres = sum(1 for pid, diferencia in diferencias_stock(conn).items()
+                     if abs(diferencia - diferencias_previas.get(pid, 0.0)) > 1e-6)
+    salidas_guardadas = conn.execute("SELECT COUNT(*) FROM salidas_detalle WHERE producto_id = ?",
+                                     (PRODUCTO,)).fetchone()[0] - salidas_previas
+    costo_final = conn.execute("SELECT costo_promedio FROM productos WHERE id = ?", (PRODUCTO_COMPRAS,)).fetchone()[0]
+    conn.close()
+    # Costo promedio ponderado de aplicar en serie las compras aceptadas (todas iguales)
+    stock_compras, costo_compras = compras_previas
+    compras_ok = sum(1 for tipo, ok, _ in resultados if tipo == "compra" and ok)
+    unidades = compras_ok * CANTIDAD_COMPRA
+    costo_esperado = (stock_compras * costo_compras + unidades * PRECIO_COMPRA) / (stock_compras + unidades)
+    return {
+        "costo_final": costo_final,
+        "costo_esperado": costo_esperado,
+        "stock_final": stock_final,
+        "stock_esperado": stock_inicial - salidas_ok,
+        "salidas_ok": salidas_ok,
+        "sobreventa": salidas_ok > stock_inicial or stock_final < 0,
+        "descuadres": descuadres,
+        "salidas_guardadas": salidas_guardadas,
+    }
+
+
+def correr(modo, base, hilos, operaciones, stock_inicial, filas_carga):
+    db_path = os.path.join(os.path.dirname(base), f"{modo}.db")
+    salidas_previas, diferencias_previas, compras_previas = preparar_base(base, db_path, stock_inicial)
+    db.DB_PATH = db_path
+    ejecutar_escritura = db.ejecutar_escritura
+    if modo == "directo":
+        db.ejecutar_escritura = _directo
+    resultados = []
+    try:
+        inicio = time.perf_counter()
+        hilo_carga = threading.Thread(target=carga, args=(filas_carga, resultados))
+        hilo_carga.start()
+        time.sleep(0.5)  # la carga ya tiene la base tomada cuando llegan las demás escrituras
+        ts = [threading.Thread(target=trabajo, args=(h, operaciones, resultados)) for h in range(hilos)]
+        for t in ts:
+            t.start()
+        for t in ts + [hilo_carga]:
+            t.join()
+        duracion = time.perf_counter() - inicio
+    finally:
+        db.ejecutar_escritura = ejecutar_escritura
+    stats = db.obtener_estadisticas_escritor() if modo == "escritor" else None
+    db.cerrar_escritor()
+    db.get_pool(db_path).cerrar()
+    revision = revisar(db_path, stock_inicial, salidas_previas, diferencias_previas, compras_previas, resultados)
+    bloqueos = sum(1 for _, ok, msg in resultados if not ok and "locked" in str(msg).lower())
+    otros = sum(1 for _, ok, msg in resultados
+                if not ok and "locked" not in str(msg).lower() and "insuficiente" not in str(msg))
+    return resultados, duracion, revision, bloqueos, otros, stats
+
+
+def main():
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    operaciones = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    stock_inicial = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    filas_carga = int(sys.argv[4]) if len(sys.argv) > 4 else 60000
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_escritor_")
+    base = os.path.join(tmp_dir, "base.db")
+    conn = sqlite3.connect(base)
+    crear_tablas(conn.cursor())
+    generar_datos(conn, 2000, 2000)
+    aplicar_migraciones(conn)
+    conn.commit()
+    conn.close()
+
+    print(f"{hilos} hilos x {operaciones} operaciones (compra/salida/traslado); "
+          f"stock inicial del producto {PRODUCTO}: {stock_inicial}; carga masiva de {filas_carga} filas\n")
+    print("| Modo | Operaciones | OK | Sin stock | database is locked | Otros errores | Stock final | Esperado "
+          "| Sobreventa | Salidas OK / guardadas | Costo prom. final / en serie | Descuadres productos/almacén | Duración (s) |")
+    print("|---|---:|---:|---:|---:|---:|---:|---:|:---:|---:|---:|---:|---:|")
+    stats_escritor = None
+    for modo in ("directo", "escritor"):
+        resultados, duracion, r, bloqueos, otros, stats = correr(modo, base, hilos, operaciones, stock_inicial, filas_carga)
+        stats_escritor = stats or stats_escritor
+        ok = sum(1 for _, exito, _ in resultados if exito)
+        sin_stock = sum(1 for _, exito, msg in resultados if not exito and "insuficiente" in str(msg))
+        print(f"| {modo} | {len(resultados)} | {ok} | {sin_stock} | {bloqueos} | {otros} | {r['stock_final']:g} "
+              f"| {r['stock_esperado']:g} | {'SÍ' if r['sobreventa'] else 'no'} "
+              f"| {r['salidas_ok']} / {r['salidas_guardadas']} | {r['costo_final']:.4f} / {r['costo_esperado']:.4f} "
+              f"| {r['descuadres']} | {duracion:.1f} |")
+
+    print(f"\nEscritor: {stats_escritor['lotes']} lotes, {stats_escritor['operaciones_por_lote']:.2f} operaciones/lote "
+          f"(máx {stats_escritor['lote_max']}), {stats_escritor['reintentos']} reintentos\n")
+    print("| Operación | Cantidad | Errores | Espera en cola prom. (ms) | máx (ms) | Commit prom. (ms) | máx (ms) |")
+    print("|---|---:|---:|---:|---:|---:|---:|")
+    for nombre, v in stats_escritor["por_operacion"].items():
+        print(f"| {nombre} | {v['operaciones']} | {v['errores']} | {v['espera_cola_promedio'] * 1000:.1f} "
+              f"| {v['espera_cola_max'] * 1000:.1f} | {v['commit_promedio'] * 1000:.2f} | {v['commit_max'] * 1000:.2f} |")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Verificación de GET /metrics (src/metricas.py). Genera una base sintética (la
+de bench_indices.py), hace una mezcla conocida de peticiones con el cliente de
+pruebas de FastAPI y comprueba que:
+
+- el texto respeta el formato de Prometheus: HELP y TYPE una vez por familia y
+  antes de sus muestras, familias contiguas, buckets acumulados crecientes y
+  el de +Inf igual a _count
+- erp_http_requests_total por ruta/estado coincide con las peticiones hechas
+  (rutas como plantilla: /api/orders/{oid}, 404 sin ruta, 405 de otro método)
+- los contadores de SQLite (consultas, filas, tiempo) suben con las peticiones
+
+y mide el costo: latencia de una petición con y sin el middleware, y de una
+consulta con CursorMedido frente a un cursor sqlite3 sin medir.
+
+Uso: python backend/scripts/verify_metricas.py [repeticiones] [num_compras]
+"""
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fastapi.testclient import TestClient
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos
+from src import backend as db
+from src import api
+from src import metricas
+
+MUESTRA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+SUFIJOS_HISTOGRAMA = ("_bucket", "_sum", "_count")
+
+
+def parsear(texto):
+    """{familia: (tipo, [(nombre, {etiquetas}, valor)])}; AssertionError si el formato no es válido"""
+    familias, actual, vistas = {}, None, set()
+    for linea in texto.splitlines():
+        if linea.startswith("# HELP "):
+            nombre = linea.split()[2]
+            assert nombre not in vistas, f"familia repetida o no contigua: {nombre}"
+            vistas.add(nombre)
+            actual = nombre
+            continue
+        if linea.startswith("# TYPE "):
+            _, _, nombre, tipo = linea.split()
+            assert nombre == actual, f"TYPE fuera de lugar: {linea}"
+            familias[nombre] = (tipo, [])
+            continue
+        m = MUESTRA.match(linea)
+        assert m, f"línea inválida: {linea!r}"
+        nombre, etiquetas, valor = m.group(1), m.group(2) or "", m.group(3)
+        base = nombre
+        if familias[actual][0] == "histogram":
+            base = next((nombre[:-len(s)] for s in SUFIJOS_HISTOGRAMA if nombre.endswith(s)), nombre)
+        assert base == actual, f"muestra {nombre} fuera de su familia {actual}"
+        pares = dict(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"', etiquetas))
+        familias[actual][1].append((nombre, pares, float(valor)))
+    return familias
+
+
+def revisar_histogramas(familias):
+    for nombre, (tipo, muestras) in familias.items():
+        if tipo != "histogram":
+            continue
+        series = {}
+        for muestra, etiquetas, valor in muestras:
+            clave = tuple(sorted((k, v) for k, v in etiquetas.items() if k != "le"))
+            series.setdefault(clave, {"buckets": [], "count": None})
+            if muestra.endswith("_bucket"):
+                series[clave]["buckets"].append(valor)
+            elif muestra.endswith("_count"):
+                series[clave]["count"] = valor
+        for clave, serie in series.items():
+            buckets = serie["buckets"]
+            assert buckets == sorted(buckets), f"buckets no acumulados: {nombre} {clave}"
+            assert buckets[-1] == serie["count"], f"+Inf distinto de _count: {nombre} {clave}"
+    return True
+
+
+def valor(familias, nombre, **etiquetas):
+    return sum(v for _, e, v in familias.get(nombre, (None, []))[1] if all(e.get(k) == str(x) for k, x in etiquetas.items()))
+
+
+def latencias(cliente, url, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cliente.get(url)
+        tiempos.append((time.perf_counter() - inicio) * 1000.0)
+    return statistics.median(tiempos)
+
+
+def costo_cursor(db_path, repeticiones):
+    """µs por consulta+lectura con CursorMedido (pool) y con un cursor sqlite3 sin medir"""
+    resultados = {}
+    medida = db.get_connection()
+    cruda = sqlite3.connect(db_path)
+    try:
+        for nombre, sql in (("consulta trivial", "SELECT 1"),
+                            ("almacenes", db.SQL_ALMACENES),
+                            ("productos (2000 filas)", db.SQL_PRODUCTOS_EXTENDIDO)):
+            n = repeticiones * (200 if nombre == "consulta trivial" else 1)
+            fila = []
+            for conn in (medida, cruda):
+                cursor = conn.cursor()
+                mejor = float("inf")
+                for _ in range(3):
+                    inicio = time.perf_counter()
+                    for _ in range(n):
+                        cursor.execute(sql).fetchall()
+                    mejor = min(mejor, (time.perf_counter() - inicio) / n * 1e6)
+                fila.append(mejor)
+            resultados[nombre] = fila
+    finally:
+        medida.close()
+        cruda.close()
+    return resultados
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    num_compras = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_metricas_")
+    db_path = os.path.join(tmp_dir, "metricas.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    generar_datos(conn, num_compras, num_compras)
+    conn.close()
+    db.DB_PATH = api.DB_PATH = db_path
+    db.migrar_esquema()
+
+    import main as app_main
+    cliente = TestClient(app_main.app, raise_server_exceptions=False)
+    antes = parsear(cliente.get("/metrics").text)
+
+    # (método, URL, plantilla esperada); el estado es el que devuelva cada respuesta
+    peticiones = ([("GET", "/api/warehouses", "/api/warehouses")] * 7
+                  + [("GET", f"/api/orders/{oid}", "/api/orders/{oid}") for oid in (1, 2, 3)]
+                  + [("GET", "/api/products", "/api/products"), ("GET", "/api/products?limit=5", "/api/products"),
+                     ("GET", "/api/inventory/detailed", "/api/inventory/detailed"),
+                     ("GET", "/no/existe", metricas.SIN_RUTA), ("GET", "/tampoco", metricas.SIN_RUTA),
+                     ("POST", "/api/warehouses", "/api/warehouses"), ("DELETE", "/api/warehouses", "/api/warehouses")])
+    esperadas = {}
+    for metodo, url, ruta in peticiones:
+        estado = cliente.request(metodo, url, json={} if metodo == "POST" else None).status_code
+        esperadas[(metodo, ruta, estado)] = esperadas.get((metodo, ruta, estado), 0) + 1
+
+    texto = cliente.get("/metrics").text
+    despues = parsear(texto)
+    revisar_histogramas(despues)
+    print(f"Formato: {len(despues)} familias, {sum(len(m) for _, m in despues.values())} muestras, válido\n")
+
+    print("| Método | Ruta | Estado | Esperadas | erp_http_requests_total | _count del histograma |")
+    print("|---|---|---:|---:|---:|---:|")
+    ok = True
+    for (metodo, ruta, estado), cantidad in esperadas.items():
+        filtro = {"method": metodo, "route": ruta, "status": estado}
+        total = valor(despues, "erp_http_requests_total", **filtro) - valor(antes, "erp_http_requests_total", **filtro)
+        conteo = sum(v for n, e, v in despues["erp_http_request_duration_seconds"][1]
+                     if n.endswith("_count") and all(e.get(k) == str(x) for k, x in filtro.items()))
+        ok &= total == cantidad == conteo
+        print(f"| {metodo} | {ruta} | {estado} | {cantidad} | {total:g} | {conteo:g} |")
+    print(f"\nConteos por ruta: {'correctos' if ok else 'INCORRECTOS'}\n")
+
+    print("| Pool | Consultas | Filas | Tiempo en SQLite (ms) |")
+    print("|---|---:|---:|---:|")
+    for pool in ("operaciones", "reportes"):
+        delta = [valor(despues, familia, pool=pool) - valor(antes, familia, pool=pool)
+                 for familia in ("erp_db_queries_total", "erp_db_rows_returned_total", "erp_db_query_seconds_total")]
+        print(f"| {pool} | {delta[0]:g} | {delta[1]:g} | {delta[2] * 1000:.2f} |")
+
+    con_middleware = latencias(cliente, "/api/warehouses", repeticiones)
+    app = app_main.app
+    app.user_middleware = [m for m in app.user_middleware if m.cls is not metricas.MiddlewareMetricas]
+    app.middleware_stack = None  # se reconstruye sin el middleware en la próxima petición
+    sin_middleware = latencias(cliente, "/api/warehouses", repeticiones)
+    print(f"\nGET /api/warehouses p50: {con_middleware:.2f} ms con middleware, {sin_middleware:.2f} ms sin él\n")
+
+    print("| Consulta | CursorMedido (µs) | sqlite3.Cursor (µs) | Costo de medir (µs) |")
+    print("|---|---:|---:|---:|")
+    for nombre, (medido, crudo) in costo_cursor(db_path, repeticiones).items():
+        print(f"| {nombre} | {medido:.1f} | {crudo:.1f} | {medido - crudo:.1f} |")
+
+    db.cerrar_escritor()
+    db.get_pool(db_path, solo_lectura=True).cerrar()
+    db.get_pool(db_path).cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Prueba diferencial del motor FIFO vectorizado contra el algoritmo anterior
+(bucle por producto con iterrows y lista de lotes).
+Genera una base sintética temporal y compara:
+  - valorización de inventario (con y sin IGV) desde capas_fifo reconstruidas
+  - valor de salidas por periodo: motor y suma del costo estampado en salidas_detalle
+
+Uso: python backend/scripts/verify_motor_fifo.py [num_compras] [num_salidas]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import bench_indices
+from init_db_schema import crear_tablas
+from src.migrations import aplicar_migraciones
+from src import capas_fifo, motor_fifo
+
+TOLERANCIA = 1e-6
+
+
+# --- Algoritmo anterior (referencia) ---
+
+def _lotes_legacy(conn, pid, incluir_igv=True):
+    df_ent = pd.read_sql("""
+        SELECT cd.cantidad, cd.precio_unitario, cc.fecha_emision, cc.moneda, cc.tipo_cambio
+        FROM compras_detalle cd
+        JOIN compras_cabecera cc ON cd.compra_id = cc.id
+        WHERE cd.producto_id = ?
+        ORDER BY cc.fecha_emision ASC, cc.id ASC, cd.id ASC
+    """, conn, params=(pid,))
+    batches = []
+    for _, row in df_ent.iterrows():
+        tc = row['tipo_cambio'] if row['tipo_cambio'] else 3.75
+        price_pen = row['precio_unitario'] * tc if row['moneda'] == 'USD' else row['precio_unitario']
+        if not incluir_igv:
+            price_pen = price_pen / 1.18
+        batches.append({'qty': row['cantidad'], 'price': price_pen})
+    return batches
+
+
+def valorizado_legacy(conn, incluir_igv=True):
+    productos = pd.read_sql("SELECT id, nombre FROM productos", conn)
+    total_general = 0.0
+    detalle_map = {}
+    for _, prod in productos.iterrows():
+        pid = int(prod['id'])
+        batches = _lotes_legacy(conn, pid, incluir_igv)
+        df_sal = pd.read_sql("SELECT cantidad FROM salidas_detalle WHERE producto_id = ?", conn, params=(pid,))
+        remaining_qty = df_sal['cantidad'].sum() if not df_sal.empty else 0
+        while remaining_qty > 0 and batches:
+            batch = batches[0]
+            if batch['qty'] > remaining_qty:
+                batch['qty'] -= remaining_qty
+                remaining_qty = 0
+            else:
+                remaining_qty -= batch['qty']
+                batches.pop(0)
+        val_prod = sum(b['qty'] * b['price'] for b in batches)
+        total_general += val_prod
+        detalle_map[pid] = {'stock': sum(b['qty'] for b in batches), 'valor': val_prod}
+    return total_general, detalle_map
+
+
+def valor_salidas_legacy(conn, start_date, end_date):
+    df_pids = pd.read_sql("""
+        SELECT DISTINCT producto_id FROM salidas_detalle sd
+        JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+        WHERE sc.fecha BETWEEN ? AND ?
+    """, conn, params=(start_date, end_date))
+    total = 0.0
+    for pid in df_pids['producto_id']:
+        batches = _lotes_legacy(conn, int(pid))
+        df_sal = pd.read_sql("""
+            SELECT sd.cantidad, sc.fecha FROM salidas_detalle sd
+            JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+            WHERE sd.producto_id = ?
+            ORDER BY sc.fecha ASC, sc.id ASC, sd.id ASC
+        """, conn, params=(int(pid),))
+        if not batches or df_sal.empty:
+            continue
+        for _, row_s in df_sal.iterrows():
+            qty_to_consume = row_s['cantidad']
+            valor = 0.0
+            while qty_to_consume > 0 and batches:
+                batch = batches[0]
+                if batch['qty'] <= qty_to_consume:
+                    valor += batch['qty'] * batch['price']
+                    qty_to_consume -= batch['qty']
+                    batches.pop(0)
+                else:
+                    valor += qty_to_consume * batch['price']
+                    batch['qty'] -= qty_to_consume
+                    qty_to_consume = 0
+            if str(start_date) <= str(row_s['fecha']) <= str(end_date):
+                total += valor
+    return total
+
+
+# --- Comparación ---
+
+def casos_borde(conn):
+    """Salidas sin compras, salidas mayores a lo comprado, cantidades cero y T.C. nulo/cero"""
+    cur = conn.cursor()
+    cur.execute("UPDATE compras_cabecera SET tipo_cambio = 0 WHERE id % 11 = 0")
+    cur.execute("UPDATE compras_cabecera SET tipo_cambio = NULL WHERE id % 13 = 0 AND moneda = 'PEN'")
+    cur.execute("UPDATE compras_detalle SET cantidad = 0 WHERE id % 97 = 0")
+    cur.execute("INSERT INTO productos (codigo_sku, nombre, unidad_medida, categoria_id) VALUES ('SIN-COMPRAS', 'SIN COMPRAS', 'UND', 1)")
+    sin_compras = cur.lastrowid
+    cur.execute("INSERT INTO salidas_cabecera (fecha, destino) VALUES ('2022-06-01', 'Obra')")
+    salida_id = cur.lastrowid
+    cur.executemany("INSERT INTO salidas_detalle (salida_id, producto_id, cantidad, almacen_id) VALUES (?, ?, ?, 1)",
+                    [(salida_id, sin_compras, 7), (salida_id, 1, 100000)])
+    conn.commit()
+
+
+def comparar(nombre, esperado, obtenido):
+    ok = abs(esperado - obtenido) <= TOLERANCIA * max(1.0, abs(esperado))
+    print(f"{'✅' if ok else '❌'} {nombre}: anterior={esperado:.6f} motor={obtenido:.6f}")
+    return ok
+
+
+def main():
+    num_compras = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    num_salidas = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    bench_indices.NUM_PRODUCTOS = 150
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_fifo_")
+    db_path = os.path.join(tmp_dir, "fifo.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    bench_indices.generar_datos(conn, num_compras, num_salidas)
+    casos_borde(conn)
+    aplicar_migraciones(conn)
+
+    todo_ok = True
+
+    inicio = time.perf_counter()
+    capas_fifo.reconstruir_capas(conn.cursor())
+    conn.commit()
+    t_motor = time.perf_counter() - inicio
+
+    for incluir_igv in (True, False):
+        inicio = time.perf_counter()
+        total_ant, det_ant = valorizado_legacy(conn, incluir_igv)
+        t_ant = time.perf_counter() - inicio
+        total_new, det_new = capas_fifo.valorizar(conn, incluir_igv)
+        todo_ok &= comparar(f"Valorizado total (IGV={incluir_igv})", total_ant, total_new)
+        malos = [pid for pid in det_ant
+                 if abs(det_ant[pid]['valor'] - det_new[pid]['valor']) > TOLERANCIA * max(1.0, abs(det_ant[pid]['valor']))
+                 or abs(det_ant[pid]['stock'] - det_new[pid]['stock']) > TOLERANCIA]
+        todo_ok &= not malos and set(det_ant) == set(det_new)
+        print(f"   productos con diferencias: {len(malos)} | anterior {t_ant:.2f} s, reconstrucción de capas {t_motor:.3f} s")
+
+    for desde, hasta in [("2020-01-01", "2024-12-31"), ("2022-03-01", "2022-03-31"),
+                         ("2022-06-01", "2022-06-01"), ("2030-01-01", "2030-12-31")]:
+        inicio = time.perf_counter()
+        ant = valor_salidas_legacy(conn, desde, hasta)
+        t_ant = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        new = motor_fifo.valor_salidas_periodo(conn.cursor(), desde, hasta)
+        t_new = time.perf_counter() - inicio
+        todo_ok &= comparar(f"Salidas {desde}..{hasta}", ant, new)
+        inicio = time.perf_counter()
+        estampado = conn.execute("""
+            SELECT TOTAL(sd.costo_total) FROM salidas_cabecera sc
+            JOIN salidas_detalle sd ON sd.salida_id = sc.id
+            WHERE sc.fecha BETWEEN ? AND ?
+        """, (desde, hasta)).fetchone()[0]
+        t_sum = time.perf_counter() - inicio
+        todo_ok &= comparar(f"Salidas {desde}..{hasta} (costo estampado)", ant, estampado)
+        print(f"   anterior {t_ant:.2f} s, motor {t_new:.3f} s, suma estampada {t_sum * 1000:.2f} ms")
+
+    conn.close()
+    os.remove(db_path)
+    print("\nRESULTADO:", "OK" if todo_ok else "DIFERENCIAS")
+    sys.exit(0 if todo_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
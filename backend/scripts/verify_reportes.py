@@ -0,0 +1,159 @@
+"""
+Verificación del pool de reportes (solo lectura) con reportes pesados y
+escrituras concurrentes. Genera una base sintética (la de bench_indices.py),
+lanza varios hilos que corren reportes en bucle (detalle histórico de compras,
+kardex general, valorización FIFO) y, mientras tanto, mide la latencia de las
+escrituras de un operador: crear_producto (conexión del pool transaccional) y
+registrar_salida (escritor único). Compara:
+
+- sin reportes: latencia base de las escrituras
+- compartido:   los reportes toman conexiones del pool transaccional (antes)
+- reportes:     los reportes usan el pool de solo lectura
+
+También comprueba que una conexión de reportes no puede escribir y que ve una
+instantánea fija aunque haya commits mientras la tiene prestada.
+
+Uso: python backend/scripts/verify_reportes.py [hilos_reportes] [segundos] [num_compras]
+"""
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos
+from src.migrations import aplicar_migraciones
+from src import backend as db
+
+INTERVALO_ESCRITURAS = 0.05
+
+REPORTES = [
+    ("compras detalle", db.obtener_compras_detalle_historial),
+    ("kardex general", lambda: db.obtener_kardex_general("2020-01-01", "2024-12-31")),
+    ("valorización FIFO", db.calcular_valorizado_fifo),
+]
+
+
+def correr_reportes(fin, contador, errores):
+    i = 0
+    while not fin.is_set():
+        nombre, reporte = REPORTES[i % len(REPORTES)]
+        try:
+            reporte()
+            contador.append(nombre)
+        except Exception as e:
+            errores.append(f"{nombre}: {e}")
+        i += 1
+
+
+def correr_escrituras(segundos, latencias, errores, prefijo):
+    hoy = date.today().isoformat()
+    limite = time.perf_counter() + segundos
+    i = 0
+    while time.perf_counter() < limite:
+        inicio = time.perf_counter()
+        if i % 2 == 0:
+            ok, msg, _ = db.crear_producto(f"{prefijo}-{i}", f"PRODUCTO {prefijo} {i}", "UND", 1)
+            tipo = "crear_producto"
+        else:
+            ok, msg = db.registrar_salida({"fecha": hoy, "tipo": "CONSUMO", "destino": "Obra"},
+                                          [{"pid": 1, "cantidad": 0.001, "almacen_id": 1}])
+            tipo = "registrar_salida"
+        latencias.setdefault(tipo, []).append((time.perf_counter() - inicio) * 1000.0)
+        if not ok:
+            errores.append(f"{tipo}: {msg}")
+        i += 1
+        time.sleep(INTERVALO_ESCRITURAS)
+
+
+def escenario(modo, hilos, segundos):
+    get_connection_reportes = db.get_connection_reportes
+    if modo == "compartido":
+        db.get_connection_reportes = db.get_connection
+    fin = threading.Event()
+    contador, errores_reportes, errores_escritura, latencias = [], [], [], {}
+    lectores = [threading.Thread(target=correr_reportes, args=(fin, contador, errores_reportes))
+                for _ in range(hilos if modo != "sin reportes" else 0)]
+    try:
+        for t in lectores:
+            t.start()
+        time.sleep(0.5 if lectores else 0)
+        correr_escrituras(segundos, latencias, errores_escritura, modo.replace(" ", "_"))
+        fin.set()
+        for t in lectores:
+            t.join()
+    finally:
+        db.get_connection_reportes = get_connection_reportes
+    return latencias, len(contador), errores_reportes, errores_escritura
+
+
+def verificar_solo_lectura():
+    conn = db.get_connection_reportes()
+    try:
+        antes = conn.execute("SELECT COUNT(*) FROM salidas_cabecera").fetchone()[0]
+        db.registrar_salida({"fecha": date.today().isoformat(), "tipo": "CONSUMO", "destino": "Obra"},
+                            [{"pid": 1, "cantidad": 0.001, "almacen_id": 1}])
+        despues = conn.execute("SELECT COUNT(*) FROM salidas_cabecera").fetchone()[0]
+        try:
+            conn.execute("DELETE FROM salidas_cabecera")
+            escritura = "PERMITIDA"
+        except sqlite3.Error as e:
+            escritura = f"rechazada ({e})"
+    finally:
+        conn.close()
+    fresca = db.get_connection_reportes()
+    try:
+        nueva = fresca.execute("SELECT COUNT(*) FROM salidas_cabecera").fetchone()[0]
+    finally:
+        fresca.close()
+    print(f"- Escritura en conexión de reportes: {escritura}")
+    print(f"- Instantánea: {antes} salidas antes y {despues} después de un commit concurrente "
+          f"({'fija' if antes == despues else 'NO fija'}); préstamo nuevo ve {nueva}\n")
+
+
+def main():
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 8
+    num_compras = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_reportes_")
+    db_path = os.path.join(tmp_dir, "reportes.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    print(f"Generando datos sintéticos: {num_compras} compras...")
+    generar_datos(conn, num_compras, num_compras)
+    conn.close()
+    db.DB_PATH = db_path
+    db.migrar_esquema()
+
+    verificar_solo_lectura()
+    print(f"{hilos} hilos de reportes, escrituras cada {INTERVALO_ESCRITURAS * 1000:.0f} ms durante {segundos:g} s\n")
+    print("| Modo | Escritura | Cantidad | p50 (ms) | p95 (ms) | máx (ms) | Reportes completados | Errores |")
+    print("|---|---|---:|---:|---:|---:|---:|---:|")
+    for modo in ("sin reportes", "compartido", "reportes"):
+        latencias, reportes, errores_reportes, errores_escritura = escenario(modo, hilos, segundos)
+        for tipo, valores in sorted(latencias.items()):
+            valores.sort()
+            p95 = valores[min(len(valores) - 1, int(len(valores) * 0.95))]
+            print(f"| {modo} | {tipo} | {len(valores)} | {statistics.median(valores):.1f} | {p95:.1f} "
+                  f"| {valores[-1]:.1f} | {reportes} | {len(errores_reportes) + len(errores_escritura)} |")
+        for error in (errores_reportes + errores_escritura)[:3]:
+            print(f"  error: {error}")
+
+    print("\nPool transaccional:", {k: v for k, v in db.obtener_estadisticas_pool().items()
+                                     if k in ("checkouts", "esperas", "tiempo_espera_max", "timeouts")})
+    print("Pool de reportes:", {k: v for k, v in db.obtener_estadisticas_pool_reportes().items()
+                                if k in ("checkouts", "esperas", "tiempo_espera_max", "timeouts")})
+    db.cerrar_escritor()
+    db.get_pool(db_path, solo_lectura=True).cerrar()
+    db.get_pool(db_path).cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Verifica el servicio de tipo de cambio (src/api.py) contra un servidor HTTP local
+que simula la API de SUNAT, sin salir a internet.
+Comprueba:
+  - obtener_tc_sunat() responde desde memoria sin esperar a la red, aun con la API lenta
+  - cada consulta respeta el plazo estricto (API colgada -> falla dentro del plazo)
+  - un refresco exitoso actualiza memoria y tabla tipo_cambio
+  - el hilo de fondo obtiene el T.C. y se detiene limpiamente
+
+Uso: python backend/scripts/verify_tc_service.py
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import api
+
+# Comportamiento del servidor simulado (se cambia entre pruebas)
+STUB = {"venta": 3.812, "retardo": 0.0, "status": 200}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(STUB["retardo"])
+        cuerpo = json.dumps({"venta": STUB["venta"], "compra": STUB["venta"] - 0.01}).encode()
+        try:
+            self.send_response(STUB["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def comprobar(nombre, condicion, detalle=""):
+    print(f"{'OK ' if condicion else 'ERR'} {nombre} {detalle}")
+    return condicion
+
+
+def main():
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    api.DB_PATH = db_path
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/v1/tipo-cambio-sunat"
+
+    plazo = 0.5
+    servicio = api.ServicioTipoCambio(url=url, plazo=plazo, intervalo=0.2)
+    api.servicio_tc = servicio
+    todo_ok = True
+
+    # 1. Sin datos: valor por defecto, inmediato
+    inicio = time.perf_counter()
+    tc = api.obtener_tc_sunat()
+    t = time.perf_counter() - inicio
+    todo_ok &= comprobar("Sin datos -> defecto", tc == api.TC_DEFECTO and t < 0.1, f"({tc}, {t * 1000:.1f} ms)")
+
+    # 2. API colgada: el refresco falla dentro del plazo y la lectura sigue inmediata
+    STUB["retardo"] = 5.0
+    inicio = time.perf_counter()
+    ok = servicio.refrescar()
+    t = time.perf_counter() - inicio
+    todo_ok &= comprobar("API colgada -> plazo estricto", not ok and t < plazo + 0.3, f"({t:.2f} s, plazo {plazo} s)")
+
+    hilo = threading.Thread(target=servicio.refrescar)
+    hilo.start()
+    inicio = time.perf_counter()
+    tc = api.obtener_tc_sunat()
+    t = time.perf_counter() - inicio
+    todo_ok &= comprobar("Lectura durante refresco lento", t < 0.05, f"({t * 1000:.2f} ms)")
+    hilo.join()
+
+    # 3. Error HTTP: no cambia el valor en memoria
+    STUB["retardo"], STUB["status"] = 0.0, 500
+    todo_ok &= comprobar("HTTP 500 -> sin cambio", not servicio.refrescar() and api.obtener_tc_sunat() == tc)
+
+    # 4. Refresco exitoso: memoria y tabla
+    STUB["status"] = 200
+    ok = servicio.refrescar()
+    conn = sqlite3.connect(db_path)
+    fila = conn.execute("SELECT venta, origen FROM tipo_cambio WHERE fecha = ?", (date.today().isoformat(),)).fetchone()
+    conn.close()
+    todo_ok &= comprobar("Refresco exitoso", ok and api.obtener_tc_sunat() == STUB["venta"] and fila == (STUB["venta"], "API_SUNAT"),
+                         f"({api.obtener_tc_sunat()}, {fila})")
+
+    # 5. Hilo de fondo: con el T.C. del día ya guardado no vuelve a consultar la API
+    consultas = servicio.estado()["consultas"]
+    servicio.iniciar()
+    time.sleep(0.6)
+    estado = servicio.estado()
+    servicio.detener()
+    todo_ok &= comprobar("Refresco en segundo plano", estado["refresco_activo"] and estado["consultas"] == consultas
+                         and not servicio.estado()["refresco_activo"], f"({estado['consultas']} consultas)")
+
+    servidor.shutdown()
+    for ruta in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    print("\nRESULTADO:", "OK" if todo_ok else "ERRORES")
+    sys.exit(0 if todo_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
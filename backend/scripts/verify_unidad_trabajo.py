@@ -0,0 +1,161 @@
+"""
+Verificación de la conexión por petición (dependencias conexion_reportes y
+unidad_de_trabajo de main.py). Genera una base sintética (la de bench_indices.py)
+y, con el cliente de pruebas de FastAPI, compara dos modos:
+
+- por llamada: las dependencias retornan None y cada función del backend toma
+  su propia conexión del pool (lo que hacían los endpoints antes)
+- por petición: una conexión (una instantánea) para toda la petición
+
+Reporta préstamos de conexión por petición y latencia, y luego inyecta una
+escritura concurrente a mitad de la petición:
+
+- /api/inventory/fifo: una compra entre la valorización FIFO y la lectura de
+  productos (el stock y el valor FIFO deben venir del mismo estado)
+- /api/products: un producto nuevo entre la lectura de versiones (ETag) y la
+  del listado (el ETag debe corresponder al cuerpo)
+
+Uso: python backend/scripts/verify_unidad_trabajo.py [repeticiones] [num_compras]
+"""
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fastapi.testclient import TestClient
+from init_db_schema import crear_tablas
+from bench_indices import generar_datos
+from src import backend as db
+from src import api
+
+PRODUCTO = 1
+ENDPOINTS = ["/api/inventory/fifo", "/api/inventory/detailed", "/api/products", "/api/warehouses"]
+
+
+def prestamos():
+    """Checkouts acumulados de los dos pools (transaccional y de reportes)"""
+    return db.obtener_estadisticas_pool()["checkouts"] + db.obtener_estadisticas_pool_reportes()["checkouts"]
+
+
+def medir(cliente, repeticiones):
+    resultados = {}
+    for _ in range(repeticiones):
+        for url in ENDPOINTS:
+            antes = prestamos()
+            inicio = time.perf_counter()
+            r = cliente.get(url)
+            duracion = (time.perf_counter() - inicio) * 1000.0
+            assert r.status_code == 200, (url, r.text[:200])
+            tiempos, checkouts = resultados.setdefault(url, ([], []))
+            tiempos.append(duracion)
+            checkouts.append(prestamos() - antes)
+    return resultados
+
+
+def compra(numero):
+    ok, msg = db.registrar_compra({
+        "proveedor_id": 1, "fecha": date.today().isoformat(), "moneda": "PEN", "serie": "VUT",
+        "numero": str(numero), "tc": 3.75, "tasa_igv": 18,
+        "items": [{"pid": PRODUCTO, "cantidad": 100, "precio_unitario": 1000.0}],
+    })
+    assert ok, msg
+
+
+def fifo_con_escritura(cliente, numero):
+    """Stock de PRODUCTO en la respuesta frente al estado que valorizó el FIFO"""
+    original = db.calcular_valorizado_fifo
+
+    def valorizar_y_comprar(*args, **kwargs):
+        resultado = original(*args, **kwargs)
+        compra(numero)  # commit de otra conexión entre los dos pasos del endpoint
+        return resultado
+
+    antes = next(i for i in cliente.get("/api/inventory/fifo").json()["items"] if i["id"] == PRODUCTO)
+    db.calcular_valorizado_fifo = valorizar_y_comprar
+    try:
+        r = cliente.get("/api/inventory/fifo")
+    finally:
+        db.calcular_valorizado_fifo = original
+    item = next(i for i in r.json()["items"] if i["id"] == PRODUCTO)
+    consistente = item["stock"] == antes["stock"] and item["fifo_valuated"] == antes["fifo_valuated"]
+    return antes, item, consistente
+
+
+def productos_con_escritura(cliente, numero):
+    """ETag y cuerpo de /api/products con un producto creado entre ambas lecturas"""
+    original = db.obtener_versiones_tabla
+
+    def versiones_y_crear(*args, **kwargs):
+        resultado = original(*args, **kwargs)
+        ok, msg, _ = db.crear_producto(f"UT-{numero}", f"PRODUCTO UT {numero}", "UND", 1)
+        assert ok, msg
+        return resultado
+
+    db.obtener_versiones_tabla = versiones_y_crear
+    try:
+        r = cliente.get("/api/products")
+    finally:
+        db.obtener_versiones_tabla = original
+    etag, cuerpo = r.headers["etag"], len(r.json())
+    # Cuerpo que correspondería al ETag recibido: el de la base antes del producto nuevo
+    actual = cliente.get("/api/products")
+    consistente = etag != actual.headers["etag"] and cuerpo == len(actual.json()) - 1
+    return etag, cuerpo, len(actual.json()), consistente
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    num_compras = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    tmp_dir = tempfile.mkdtemp(prefix="erp_unidad_trabajo_")
+    db_path = os.path.join(tmp_dir, "unidad_trabajo.db")
+    conn = sqlite3.connect(db_path)
+    crear_tablas(conn.cursor())
+    print(f"Generando datos sintéticos: {num_compras} compras...")
+    generar_datos(conn, num_compras, num_compras)
+    conn.close()
+    db.DB_PATH = api.DB_PATH = db_path
+    db.migrar_esquema()
+
+    import main as app_main
+    cliente = TestClient(app_main.app)
+    cliente.get("/api/inventory/fifo")  # calentar
+    sin_dependencia = {app_main.conexion_reportes: lambda: None, app_main.unidad_de_trabajo: lambda: None}
+
+    modos = []
+    for modo, overrides in (("por llamada", sin_dependencia), ("por petición", {})):
+        app_main.app.dependency_overrides = overrides
+        modos.append((modo, medir(cliente, repeticiones)))
+    print(f"\n{repeticiones} repeticiones por endpoint\n")
+    print("| Modo | Endpoint | Préstamos de conexión / petición | p50 (ms) | máx (ms) |")
+    print("|---|---|---:|---:|---:|")
+    for modo, resultados in modos:
+        for nombre, (tiempos, checkouts) in resultados.items():
+            print(f"| {modo} | {nombre} | {statistics.mean(checkouts):g} | {statistics.median(tiempos):.1f} "
+                  f"| {max(tiempos):.1f} |")
+
+    print("\nEscritura concurrente a mitad de la petición\n")
+    print("| Modo | Endpoint | Respuesta | Consistente |")
+    print("|---|---|---|:---:|")
+    for i, (modo, overrides) in enumerate((("por llamada", sin_dependencia), ("por petición", {}))):
+        app_main.app.dependency_overrides = overrides
+        antes, item, ok = fifo_con_escritura(cliente, 1000 + i)
+        print(f"| {modo} | /api/inventory/fifo | stock {antes['stock']:g} -> {item['stock']:g}, "
+              f"valor FIFO {antes['fifo_valuated']:.2f} -> {item['fifo_valuated']:.2f} | {'sí' if ok else 'NO'} |")
+        etag, cuerpo, actual, ok = productos_con_escritura(cliente, i)
+        print(f"| {modo} | /api/products | ETag {etag} con {cuerpo} productos (la base ya tiene {actual}) "
+              f"| {'sí' if ok else 'NO'} |")
+    app_main.app.dependency_overrides = {}
+
+    db.cerrar_escritor()
+    db.get_pool(db_path, solo_lectura=True).cerrar()
+    db.get_pool(db_path).cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Alertas del dashboard materializadas (tabla alertas).
+Cada escritura re-evalúa solo lo que tocó: evaluar_productos() para stock y
+salidas, evaluar_proveedores() para compras; el dashboard las lee con una
+sola consulta. recalcular() regenera todo (conciliación, tablas derivadas).
+Las altas y bajas de alertas vigentes se anotan como eventos (src/eventos.py).
+
+Las condiciones que dependen de la fecha actual no se congelan: se guarda la
+fecha relevante (última salida, emisión de la compra) y el plazo se aplica al
+leer, así una alerta "aparece" sola al cumplirse los 90 / vencer los 7 días.
+"""
+
+from src import eventos
+
+SIN_STOCK = 'sin_stock'
+SIN_MOVIMIENTO = 'sin_movimiento'
+COMPRAS_GRANDES = 'compras_grandes'
+FACTURAS_DUPLICADAS = 'facturas_duplicadas'
+TIPOS = (SIN_STOCK, SIN_MOVIMIENTO, COMPRAS_GRANDES, FACTURAS_DUPLICADAS)
+
+# Umbrales (los mismos que usaban las consultas del dashboard)
+DIAS_SIN_MOVIMIENTO = 90
+DIAS_COMPRAS_GRANDES = 7
+MONTO_COMPRA_GRANDE = 10000
+
+DDL_ALERTAS = [
+    """CREATE TABLE IF NOT EXISTS alertas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        producto_id INTEGER,
+        proveedor_id INTEGER,
+        compra_id INTEGER,
+        fecha TEXT,
+        monto REAL,
+        cantidad INTEGER,
+        evaluado_en DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+    # Lectura: cada tipo/plazo es un rango de este índice (sin recorrer los candidatos vigentes)
+    "CREATE INDEX IF NOT EXISTS idx_alertas_tipo_fecha ON alertas(tipo, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_alertas_producto ON alertas(producto_id, tipo)",
+    "CREATE INDEX IF NOT EXISTS idx_alertas_proveedor ON alertas(proveedor_id, tipo)",
+]
+
+# Lectura única: nombres y stock se toman en vivo; los plazos se aplican aquí
+SQL_COLUMNAS = """
+    SELECT a.tipo, a.fecha, a.monto, a.cantidad,
+           pr.nombre, pr.stock_actual, pr.stock_minimo, pr.unidad_medida,
+           pv.razon_social, c.serie || '-' || c.numero,
+           a.producto_id, a.proveedor_id, a.compra_id
+    FROM alertas a
+    LEFT JOIN productos pr ON pr.id = a.producto_id
+    LEFT JOIN proveedores pv ON pv.id = a.proveedor_id
+    LEFT JOIN compras_cabecera c ON c.id = a.compra_id
+"""
+SQL_VIGENTES = f"""(
+       a.tipo IN ('{SIN_STOCK}', '{FACTURAS_DUPLICADAS}')
+       OR (a.tipo = '{SIN_MOVIMIENTO}' AND a.fecha IS NULL)
+       OR (a.tipo = '{SIN_MOVIMIENTO}' AND a.fecha < date('now', '-{DIAS_SIN_MOVIMIENTO} days'))
+       OR (a.tipo = '{COMPRAS_GRANDES}' AND a.fecha >= date('now', '-{DIAS_COMPRAS_GRANDES} days'))
+)"""
+SQL_LEER = f"{SQL_COLUMNAS} WHERE {SQL_VIGENTES} ORDER BY a.id"
+
+
+def crear_tabla(cursor):
+    for ddl in DDL_ALERTAS:
+        cursor.execute(ddl)
+
+
+def _filtro_ids(columna, ids):
+    """(' AND columna IN (?, ...)', params) o ('', ()) si ids es None (todos)"""
+    if ids is None:
+        return "", ()
+    ids = list(dict.fromkeys(ids))
+    return f" AND {columna} IN ({', '.join('?' * len(ids))})", tuple(ids)
+
+
+def _item(fila):
+    """Fila de SQL_COLUMNAS -> (tipo, item como lo muestra el dashboard)"""
+    tipo, fecha, monto, cantidad, nombre, stock, minimo, um, proveedor, documento = fila[:10]
+    if tipo == SIN_STOCK:
+        return tipo, {'nombre': nombre, 'stock': stock, 'min': minimo, 'um': um}
+    if tipo == SIN_MOVIMIENTO:
+        return tipo, {'nombre': nombre, 'ultimo_movimiento': fecha if fecha else 'Nunca'}
+    if tipo == COMPRAS_GRANDES:
+        return tipo, {'documento': documento, 'proveedor': proveedor, 'fecha': fecha, 'monto': monto}
+    return tipo, {'proveedor': proveedor, 'fecha': fecha, 'monto': monto, 'cantidad': cantidad}
+
+
+def _vigentes(cursor, tipos, columna, ids):
+    """Alertas vigentes de `tipos` para los ids: {clave: fila}"""
+    filtro, params = _filtro_ids(f"a.{columna}", ids)
+    cursor.execute(f"{SQL_COLUMNAS} WHERE {SQL_VIGENTES} AND a.tipo IN (?, ?){filtro}", tuple(tipos) + params)
+    # Clave: lo que identifica la alerta (tipo, entidad y datos que la definen)
+    return {(f[0], f[10], f[11], f[12], f[1], f[2], f[3]): f for f in cursor.fetchall()}
+
+
+def _emitir_cambios(cursor, antes, despues):
+    """Anota como eventos las alertas vigentes que aparecieron o desaparecieron"""
+    for accion, claves, filas in (('baja', antes.keys() - despues.keys(), antes),
+                                  ('alta', despues.keys() - antes.keys(), despues)):
+        for clave in claves:
+            fila = filas[clave]
+            tipo, item = _item(fila)
+            eventos.emitir(cursor.connection, eventos.ALERTA, {
+                'alerta': tipo, 'accion': accion, 'item': item,
+                'producto_id': fila[10], 'proveedor_id': fila[11], 'compra_id': fila[12],
+            })
+
+
+def evaluar_productos(cursor, producto_ids=None):
+    """Re-evalúa sin_stock y sin_movimiento de los productos indicados (todos si None)"""
+    if producto_ids is not None and not producto_ids:
+        return
+    publicar = eventos.activo(cursor.connection)
+    if publicar:
+        antes = _vigentes(cursor, (SIN_STOCK, SIN_MOVIMIENTO), "producto_id", producto_ids)
+    filtro, params = _filtro_ids("producto_id", producto_ids)
+    cursor.execute(f"DELETE FROM alertas WHERE tipo IN (?, ?){filtro}", (SIN_STOCK, SIN_MOVIMIENTO) + params)
+    filtro, params = _filtro_ids("p.id", producto_ids)
+    cursor.execute(f"""
+        INSERT INTO alertas (tipo, producto_id)
+        SELECT ?, p.id FROM productos p WHERE p.stock_actual <= 0{filtro}
+    """, (SIN_STOCK,) + params)
+    # Candidatos con stock y su última salida; el plazo de días se aplica al leer
+    cursor.execute(f"""
+        INSERT INTO alertas (tipo, producto_id, fecha)
+        SELECT ?, p.id, MAX(s.fecha)
+        FROM productos p
+        LEFT JOIN salidas_detalle sd ON p.id = sd.producto_id
+        LEFT JOIN salidas_cabecera s ON sd.salida_id = s.id
+        WHERE p.stock_actual > 0{filtro}
+        GROUP BY p.id
+    """, (SIN_MOVIMIENTO,) + params)
+    if publicar:
+        _emitir_cambios(cursor, antes, _vigentes(cursor, (SIN_STOCK, SIN_MOVIMIENTO), "producto_id", producto_ids))
+
+
+def evaluar_proveedores(cursor, proveedor_ids=None):
+    """Re-evalúa compras_grandes y facturas_duplicadas de los proveedores indicados (todos si None)"""
+    if proveedor_ids is not None and not proveedor_ids:
+        return
+    publicar = eventos.activo(cursor.connection)
+    if publicar:
+        antes = _vigentes(cursor, (COMPRAS_GRANDES, FACTURAS_DUPLICADAS), "proveedor_id", proveedor_ids)
+    filtro, params = _filtro_ids("proveedor_id", proveedor_ids)
+    cursor.execute(f"DELETE FROM alertas WHERE tipo IN (?, ?){filtro}", (COMPRAS_GRANDES, FACTURAS_DUPLICADAS) + params)
+    filtro, params = _filtro_ids("c.proveedor_id", proveedor_ids)
+    cursor.execute(f"""
+        INSERT INTO alertas (tipo, proveedor_id, compra_id, fecha, monto)
+        SELECT ?, c.proveedor_id, c.id, c.fecha_emision, c.total_pen
+        FROM compras_cabecera c
+        JOIN proveedores p ON c.proveedor_id = p.id
+        WHERE c.total_pen > ?{filtro}
+    """, (COMPRAS_GRANDES, MONTO_COMPRA_GRANDE) + params)
+    # Mismo proveedor, fecha y monto
+    cursor.execute(f"""
+        INSERT INTO alertas (tipo, proveedor_id, fecha, monto, cantidad)
+        SELECT ?, c.proveedor_id, c.fecha_emision, c.total_compra, COUNT(*)
+        FROM compras_cabecera c
+        JOIN proveedores p ON c.proveedor_id = p.id
+        WHERE 1 = 1{filtro}
+        GROUP BY c.proveedor_id, c.fecha_emision, c.total_compra
+        HAVING COUNT(*) > 1
+    """, (FACTURAS_DUPLICADAS,) + params)
+    if publicar:
+        _emitir_cambios(cursor, antes, _vigentes(cursor, (COMPRAS_GRANDES, FACTURAS_DUPLICADAS), "proveedor_id", proveedor_ids))
+
+
+def recalcular(cursor):
+    """Regenera todas las alertas. Retorna el número de filas guardadas."""
+    crear_tabla(cursor)
+    # Cada evaluación sin ids reemplaza todas las filas de sus tipos
+    evaluar_productos(cursor)
+    evaluar_proveedores(cursor)
+    cursor.execute("SELECT COUNT(*) FROM alertas")
+    return cursor.fetchone()[0]
+
+
+def leer(cursor):
+    """Alertas vigentes agrupadas por tipo: {tipo: {'count', 'items'}}"""
+    alertas = {tipo: {'count': 0, 'items': []} for tipo in TIPOS}
+    cursor.execute(SQL_LEER)
+    for fila in cursor.fetchall():
+        tipo, item = _item(fila)
+        alertas[tipo]['items'].append(item)
+    for grupo in alertas.values():
+        grupo['count'] = len(grupo['items'])
+    return alertas
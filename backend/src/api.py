@@ -1,71 +1,258 @@
 import requests
 import sqlite3
+import threading
 from datetime import datetime, date
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from src.db_pool import get_pool
+from src.escritor import get_escritor
+from src import tipo_cambio, gasto_diario, alertas
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, "data", "gestion_basica.db")
 
+# API Gratuita de Sunat (no requiere token). Configurable para usar un servidor local en pruebas.
+TC_API_URL = os.environ.get("ERP_TC_API_URL", "https://api.apis.net.pe/v1/tipo-cambio-sunat")
+# Plazo máximo (s) de cada consulta a la API, incluyendo conexión y lectura
+TC_PLAZO = float(os.environ.get("ERP_TC_PLAZO", "3"))
+# Cada cuánto (s) el refresco en segundo plano vuelve a consultar
+TC_INTERVALO = float(os.environ.get("ERP_TC_INTERVALO", "3600"))
+TC_DEFECTO = 3.75
+
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    return get_pool(DB_PATH).obtener()
+
+
+def ejecutar_escritura(nombre, operacion, agrupable=True):
+    """operacion(conn) en el escritor único (ver backend.ejecutar_escritura)"""
+    return get_escritor(DB_PATH).ejecutar(nombre, operacion, agrupable)
+
+
+def _crear_tabla_tc(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS tipo_cambio (fecha TEXT PRIMARY KEY, venta REAL, compra REAL, origen TEXT)")
+
+
+def _consultar_api(url, plazo):
+    """
+    GET a la API con un plazo total estricto (requests solo limita cada operación
+    de socket, no el total). Retorna el JSON o lanza TimeoutError / la excepción de la consulta.
+    """
+    resultado = {}
+
+    def consultar():
+        try:
+            resp = requests.get(url, timeout=plazo)
+            resp.raise_for_status()
+            resultado['data'] = resp.json()
+        except Exception as e:
+            resultado['error'] = e
+
+    hilo = threading.Thread(target=consultar, daemon=True)
+    hilo.start()
+    hilo.join(plazo)
+    if hilo.is_alive():
+        raise TimeoutError(f"La API de T.C. no respondió en {plazo}s")
+    if 'error' in resultado:
+        raise resultado['error']
+    return resultado['data']
+
+
+class ServicioTipoCambio:
+    """
+    T.C. del día en memoria. La consulta a la API se hace solo en refrescar(),
+    que corre en un hilo de fondo (iniciar); actual() nunca espera a la red.
+    """
+
+    def __init__(self, url=None, plazo=None, intervalo=None):
+        self.url = url or TC_API_URL
+        self.plazo = plazo or TC_PLAZO
+        self.intervalo = intervalo or TC_INTERVALO
+        self._lock = threading.Lock()
+        self._venta = None
+        self._fecha = None
+        self._origen = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._stats = {"consultas": 0, "exitos": 0, "errores": 0, "ultimo_error": None, "ultima_consulta": None}
+
+    def _cargar_de_db(self, fecha):
+        """Último T.C. guardado hasta `fecha` (o None)"""
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            _crear_tabla_tc(cursor)
+            cursor.execute(
+                "SELECT venta, fecha FROM tipo_cambio WHERE fecha <= ? AND venta > 0 ORDER BY fecha DESC LIMIT 1",
+                (fecha.isoformat(),)
+            )
+            return cursor.fetchone()
+        except Exception as e:
+            print(f"Error DB TC: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def actual(self):
+        """T.C. venta vigente: el de memoria, o el último guardado en DB, o 3.75"""
+        with self._lock:
+            if self._venta is not None:
+                return self._venta
+        fila = self._cargar_de_db(date.today())
+        with self._lock:
+            if self._venta is None:
+                self._venta, self._fecha, self._origen = (fila[0], fila[1], 'DB') if fila else (TC_DEFECTO, None, 'DEFECTO')
+            return self._venta
+
+    def refrescar(self):
+        """Consulta la API (con plazo estricto) y guarda el T.C. del día. Retorna True si lo obtuvo."""
+        hoy = date.today()
+        fila = self._cargar_de_db(hoy)
+        if fila and fila[1] == hoy.isoformat():
+            with self._lock:
+                self._venta, self._fecha, self._origen = fila[0], fila[1], 'DB'
+            return True
+
+        print(f"🌐 Consultando API TC para {hoy}...")
+        with self._lock:
+            self._stats["consultas"] += 1
+            self._stats["ultima_consulta"] = datetime.now().isoformat(timespec='seconds')
+        try:
+            data = _consultar_api(self.url, self.plazo)
+            tc_venta = data.get('venta')
+            tc_compra = data.get('compra')
+            if not tc_venta:
+                raise ValueError(f"Respuesta sin 'venta': {data}")
+            tc_val = float(tc_venta)
+        except Exception as e:
+            print(f"⚠️ Error consultando API TC: {e}")
+            with self._lock:
+                self._stats["errores"] += 1
+                self._stats["ultimo_error"] = str(e)
+                if self._venta is None and fila:
+                    self._venta, self._fecha, self._origen = fila[0], fila[1], 'DB'
+            return False
+
+        def guardar(conn):
+            cursor = conn.cursor()
+            _crear_tabla_tc(cursor)
+            cursor.execute("INSERT OR REPLACE INTO tipo_cambio (fecha, venta, compra, origen) VALUES (?, ?, ?, ?)",
+                           (hoy.isoformat(), tc_val, tc_compra, 'API_SUNAT'))
+
+        try:
+            ejecutar_escritura("guardar_tc", guardar)
+        except Exception as db_err:
+            print(f"No se pudo guardar TC: {db_err}")
+
+        with self._lock:
+            self._venta, self._fecha, self._origen = tc_val, hoy.isoformat(), 'API_SUNAT'
+            self._stats["exitos"] += 1
+        return True
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                ok = self.refrescar()
+            except Exception as e:
+                print(f"⚠️ Error en refresco de TC: {e}")
+                ok = False
+            # Sin éxito se reintenta antes; con éxito basta el intervalo normal
+            espera = self.intervalo if ok else min(self.intervalo, 60.0)
+            self._detener.wait(espera)
+
+    def iniciar(self):
+        """Arranca el refresco en segundo plano (idempotente)"""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="refresco-tc", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(self.plazo + 1)
+
+    def estado(self):
+        with self._lock:
+            estado = dict(self._stats)
+            estado.update({"venta": self._venta, "fecha": self._fecha, "origen": self._origen,
+                           "url": self.url, "plazo": self.plazo, "intervalo": self.intervalo,
+                           "refresco_activo": self._hilo is not None and self._hilo.is_alive()})
+        return estado
+
+
+servicio_tc = ServicioTipoCambio()
+
 
 def obtener_tc_sunat(fecha_query=None):
     """
-    Obtiene el TC de venta de una API pública.
-    Fuente: apis.net.pe (Gratis y estable para T.C.)
+    Obtiene el TC de venta (SUNAT, vía apis.net.pe) sin consultar la red:
+    el del día lo mantiene servicio_tc en memoria; otra fecha se lee de la tabla
+    tipo_cambio (último conocido hasta esa fecha).
     Fallback: valor previo o 3.75
     """
-    if fecha_query is None:
-        fecha_query = date.today()
-    
+    if fecha_query is None or fecha_query == date.today():
+        return servicio_tc.actual()
+    fila = servicio_tc._cargar_de_db(fecha_query)
+    return fila[0] if fila else servicio_tc.actual()
+
+
+def consultar_tc_fecha(fecha, url=None, plazo=None):
+    """T.C. (venta, compra) de SUNAT para una fecha pasada, con el mismo plazo estricto"""
+    data = _consultar_api(f"{url or TC_API_URL}?fecha={fecha}", plazo or TC_PLAZO)
+    return (float(data['venta']) if data.get('venta') else None), data.get('compra')
+
+
+def completar_historico_tc(desde, hasta, todas=False, hilos=4, url=None, plazo=None):
+    """
+    Completa tipo_cambio consultando la API para las fechas que faltan entre desde y hasta.
+    Por defecto solo las fechas con compras en USD sin T.C. propio; con todas=True, cada día
+    del rango. Consulta en paralelo (hilos) y guarda todo en un solo INSERT en bloque.
+    Retorna (fechas_consultadas, fechas_guardadas, errores).
+    Las consultas corren fuera del escritor único; solo el guardado (y el recálculo
+    que dispara) pasa por él, sin retener el bloqueo de escritura durante la red.
+    """
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    # 1. Verificar si ya tenemos el TC de hoy en DB
-    try:
-        cursor.execute("CREATE TABLE IF NOT EXISTS tipo_cambio (fecha TEXT PRIMARY KEY, venta REAL, compra REAL, origen TEXT)")
-        cursor.execute("SELECT venta FROM tipo_cambio WHERE fecha = ?", (fecha_query.isoformat(),))
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return row[0]
-    except Exception as e:
-        print(f"Error DB TC: {e}")
-
-    # 2. Consultar API Externa
-    print(f"🌐 Consultando API TC para {fecha_query}...")
-    tc_val = 3.75 # Default Fallback
-    
     try:
-        # API Gratuita de Sunat (no requiere token)
-        url = "https://api.apis.net.pe/v1/tipo-cambio-sunat" 
-        # Si quisiéramos fecha especifica: ?fecha=YYYY-MM-DD
-        
-        resp = requests.get(url, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            tc_venta = data.get('venta')
-            tc_compra = data.get('compra')
-            
-            if tc_venta:
-                tc_val = float(tc_venta)
-                
-                # 3. Guardar en DB
-                try:
-                    cursor.execute("INSERT OR REPLACE INTO tipo_cambio (fecha, venta, compra, origen) VALUES (?, ?, ?, ?)", 
-                                   (fecha_query.isoformat(), tc_val, tc_compra, 'API_SUNAT'))
-                    conn.commit()
-                except Exception as db_err:
-                     print(f"No se pudo guardar TC: {db_err}")
-    except Exception as e:
-        print(f"⚠️ Error consultando API TC: {e}")
-        # Intentar obtener el último conocido
+        cursor = conn.cursor()
+        _crear_tabla_tc(cursor)
+        if todas:
+            cursor.execute("SELECT fecha FROM tipo_cambio WHERE fecha BETWEEN ? AND ?", (str(desde), str(hasta)))
+            existentes = {f[0] for f in cursor.fetchall()}
+            inicio = date.fromisoformat(str(desde)[:10])
+            dias = (date.fromisoformat(str(hasta)[:10]) - inicio).days + 1
+            fechas = [f for f in ((inicio + timedelta(days=i)).isoformat() for i in range(dias)) if f not in existentes]
+        else:
+            fechas = tipo_cambio.fechas_sin_tasa(cursor, desde, hasta)
+    finally:
+        conn.close()
+    if not fechas:
+        return 0, 0, 0
+
+    def consultar(fecha):
         try:
-             cursor.execute("SELECT venta FROM tipo_cambio ORDER BY fecha DESC LIMIT 1")
-             last = cursor.fetchone()
-             if last: tc_val = last[0]
-        except: pass
+            venta, compra = consultar_tc_fecha(fecha, url, plazo)
+            return fecha, venta, compra
+        except Exception as e:
+            print(f"⚠️ TC {fecha}: {e}")
+            return fecha, None, None
+
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        resultados = list(executor.map(consultar, fechas))
+    errores = sum(1 for _, venta, _ in resultados if not venta)
+
+    def guardar(conn):
+        cursor = conn.cursor()
+        # INSERT OR IGNORE: una fecha guardada mientras se consultaba no se pisa
+        guardadas = tipo_cambio.guardar_historico(cursor, resultados)
+        if guardadas:
+            # Las compras sin T.C. propio toman ahora la tasa de su fecha
+            tipo_cambio.normalizar_compras(cursor)
+            gasto_diario.recalcular(cursor)
+            alertas.evaluar_proveedores(cursor)
+        return guardadas
 
-    conn.close()
-    return tc_val
+    guardadas = ejecutar_escritura("completar_historico_tc", guardar, agrupable=False)
+    return len(fechas), guardadas, errores
@@ -0,0 +1,118 @@
+"""
+Fachada asíncrona para los endpoints `async` de la API.
+El trabajo bloqueante no corre en el event loop (detendría todas las demás
+peticiones del worker): se despacha a uno de dos ejecutores acotados y el
+endpoint hace await del resultado.
+
+- en_db():  funciones de backend.py (SQLite). Tantos hilos como conexiones
+            base del pool, para no forzar conexiones de desborde.
+- en_cpu(): trabajo de CPU: bcrypt, parseo de CSV/Excel con pandas. Aparte
+            del de base de datos para que una ráfaga de logins o un archivo
+            grande no ocupe los hilos de las consultas.
+
+Los ejecutores se crean al primer uso y cerrar() los detiene (shutdown de la app).
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.db_pool import TAMANO_POOL
+
+HILOS_DB = TAMANO_POOL
+HILOS_CPU = max(2, os.cpu_count() or 1)
+
+
+class EjecutorAcotado:
+    """ThreadPoolExecutor de tamaño fijo, creado al primer uso, con contadores de uso."""
+
+    def __init__(self, nombre, hilos):
+        self.nombre = nombre
+        self.hilos = hilos
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enviadas": 0,
+            "completadas": 0,
+            "errores": 0,
+            "en_curso": 0,
+            "tiempo_cola_total": 0.0,
+            "tiempo_cola_max": 0.0,
+            "tiempo_ejecucion_total": 0.0,
+        }
+
+    def _obtener(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix=self.nombre)
+            return self._executor
+
+    def _ejecutar(self, funcion, encolada):
+        inicio = time.perf_counter()
+        with self._lock:
+            espera = inicio - encolada
+            self._stats["en_curso"] += 1
+            self._stats["tiempo_cola_total"] += espera
+            self._stats["tiempo_cola_max"] = max(self._stats["tiempo_cola_max"], espera)
+        error = False
+        try:
+            return funcion()
+        except BaseException:
+            error = True
+            raise
+        finally:
+            with self._lock:
+                self._stats["en_curso"] -= 1
+                self._stats["completadas"] += 1
+                self._stats["errores"] += error
+                self._stats["tiempo_ejecucion_total"] += time.perf_counter() - inicio
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        """Corre funcion(*args, **kwargs) en un hilo del ejecutor y espera su resultado"""
+        executor = self._obtener()
+        with self._lock:
+            self._stats["enviadas"] += 1
+        llamada = functools.partial(funcion, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, self._ejecutar, llamada, time.perf_counter())
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hilos"] = self.hilos
+        stats["en_cola"] = stats["enviadas"] - stats["completadas"] - stats["en_curso"]
+        completadas = stats["completadas"]
+        stats["tiempo_cola_promedio"] = stats["tiempo_cola_total"] / completadas if completadas else 0.0
+        return stats
+
+
+ejecutor_db = EjecutorAcotado("async-db", HILOS_DB)
+ejecutor_cpu = EjecutorAcotado("async-cpu", HILOS_CPU)
+
+
+async def en_db(funcion, *args, **kwargs):
+    """Acceso a SQLite (funciones de backend.py) fuera del event loop"""
+    return await ejecutor_db.ejecutar(funcion, *args, **kwargs)
+
+
+async def en_cpu(funcion, *args, **kwargs):
+    """Trabajo de CPU (bcrypt, parseo de archivos) fuera del event loop"""
+    return await ejecutor_cpu.ejecutar(funcion, *args, **kwargs)
+
+
+def cerrar():
+    ejecutor_db.cerrar()
+    ejecutor_cpu.cerrar()
+
+
+def estadisticas():
+    return {"db": ejecutor_db.estadisticas(), "cpu": ejecutor_cpu.estadisticas()}
@@ -91,8 +91,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     
     from src.backend import obtener_usuario_por_username
-    # username in token might be hash or plain (legacy)
-    user = obtener_usuario_por_username(token_data.username)
+    from src import asincrono
+    # username in token might be hash or plain (legacy); the lookup runs off the event loop
+    user = await asincrono.en_db(obtener_usuario_por_username, token_data.username)
     
     if user is None:
         raise credentials_exception
@@ -10,8 +10,13 @@ Implementa funciones de analítica para el dashboard y wrappers para el backend
 import sqlite3
 import pandas as pd
 import os
+import json
+import base64
 from datetime import datetime
 from src.auth import get_password_hash
+from src.db_pool import get_pool
+from src.escritor import get_escritor, cerrar_escritores
+from src import capas_fifo, movimientos, saldos, kardex_valorizado, tipo_cambio, gasto_diario, alertas, eventos, filas, paginacion, versiones
 
 # Definir ruta de BD hardcoded o relativa robusta para evitar problemas de import
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,8 +24,59 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, "data", "gestion_basica.db")
 
 def get_connection():
-    """Retorna conexión a la base de datos"""
-    return sqlite3.connect(DB_PATH)
+    """Retorna conexión del pool (conn.close() la devuelve al pool)"""
+    return get_pool(DB_PATH).obtener()
+
+def get_connection_reportes():
+    """
+    Conexión del pool de reportes: solo lectura (mode=ro, query_only) sobre una
+    instantánea WAL; no compite con las conexiones de las operaciones.
+    """
+    return get_pool(DB_PATH, solo_lectura=True).obtener()
+
+def ejecutar_escritura(nombre, operacion, agrupable=True):
+    """
+    Ejecuta operacion(conn) en el escritor único (BEGIN IMMEDIATE, commits por lotes).
+    Retorna su resultado ya confirmado o relanza su error con sus cambios deshechos.
+    """
+    return get_escritor(DB_PATH).ejecutar(nombre, operacion, agrupable)
+
+def conexion_peticion(reportes=False, transaccion=False):
+    """
+    Context manager con una conexión para toda una petición de la API (ver
+    PoolConexiones.conexion_peticion): se pasa en `conn` a las funciones de
+    lectura, que la usan en lugar de tomar una propia; sus close() no la devuelven.
+    reportes=True la toma del pool de solo lectura (instantánea por préstamo).
+    """
+    return get_pool(DB_PATH, solo_lectura=reportes).conexion_peticion(transaccion)
+
+def obtener_estadisticas_escritor():
+    """Estadísticas del escritor único (lotes, reintentos, espera en cola y commit por operación)"""
+    return get_escritor(DB_PATH).estadisticas()
+
+def cerrar_escritor():
+    """Detiene el hilo escritor y cierra su conexión"""
+    cerrar_escritores()
+
+def obtener_estadisticas_pool():
+    """Retorna estadísticas de uso del pool de conexiones (checkouts, esperas)"""
+    return get_pool(DB_PATH).estadisticas()
+
+def obtener_estadisticas_pool_reportes():
+    """Retorna estadísticas de uso del pool de reportes (solo lectura)"""
+    return get_pool(DB_PATH, solo_lectura=True).estadisticas()
+
+def version_datos():
+    """Versión de los datos: cambia con cada commit de escritura (invalida la caché del dashboard)"""
+    return get_pool(DB_PATH).version_datos()
+
+def obtener_versiones_tabla(tablas, conn=None):
+    """Versiones persistidas de las tablas maestras (ETags de la API), en el orden pedido"""
+    conn = conn or get_connection()
+    try:
+        return versiones.leer(conn, tablas)
+    finally:
+        conn.close()
 
 
 # --- User Management & Auth ---
@@ -70,6 +126,34 @@ def init_users_db():
     finally:
         conn.close()
 
+def migrar_esquema():
+    """Aplica las migraciones versionadas pendientes (índices, tablas nuevas)"""
+    from src.migrations import aplicar_migraciones
+    conn = get_connection()
+    try:
+        return aplicar_migraciones(conn)
+    except Exception as e:
+        print(f"Error aplicando migraciones: {e}")
+        return []
+    finally:
+        conn.close()
+
+def _generar_saldos(hasta_periodo):
+    return ejecutar_escritura("generar_saldos_mensuales",
+                              lambda conn: saldos.generar_saldos(conn.cursor(), hasta_periodo),
+                              agrupable=False)
+
+# Cierra también los meses que terminan con el servidor en marcha (iniciar/detener en main.py)
+cierre_mensual = saldos.CierreMensual(_generar_saldos)
+
+def generar_saldos_mensuales():
+    """Genera los cierres mensuales de stock pendientes (meses ya cerrados)"""
+    try:
+        return cierre_mensual.cerrar_pendientes()
+    except Exception as e:
+        print(f"Error generando saldos mensuales: {e}")
+        return []
+
 def crear_usuario(username, password, role='user', username_hash=None, username_encrypted=None):
     conn = get_connection()
     try:
@@ -133,21 +217,17 @@ def obtener_tipo_cambio_actual():
     """Retorna T.C. venta de SUNAT (API) o fallback"""
     return obtener_tc_sunat()
 
-def obtener_kpis_dashboard(start_date, end_date):
+def obtener_kpis_dashboard(start_date, end_date, conn=None):
     """Calcula KPIs principales: Compras, Inventario, Docs, TC"""
-    conn = get_connection()
-    
+    # Antes de tomar la conexión: si el T.C. falla no queda una conexión sin devolver
     tc = obtener_tipo_cambio_actual()
     
+    conn = conn or get_connection_reportes()
+    
     try:
-        # 1. Total Compras en el periodo (Convertido a PEN)
-        query_compras = f"""
-            SELECT TOTAL(
-                CASE 
-                    WHEN moneda = 'USD' THEN total_compra * COALESCE(tipo_cambio, {tc})
-                    ELSE total_compra
-                END
-            ) as monto, 
+        # 1. Total Compras en el periodo (total_pen: convertido con el T.C. de cada documento/fecha)
+        query_compras = """
+            SELECT TOTAL(total_pen) as monto, 
             COUNT(*) as docs
             FROM compras_cabecera
             WHERE fecha_emision BETWEEN ? AND ?
@@ -166,11 +246,15 @@ def obtener_kpis_dashboard(start_date, end_date):
         cursor.execute(query_inv)
         valor_inv = cursor.fetchone()[0]
 
+        # 3. Valor de las salidas (misma instantánea que compras e inventario)
+        monto_salidas = _valor_salidas_fifo(cursor, start_date, end_date)
+
     except Exception as e:
         print(f"Error calculando KPIs: {e}")
         monto_compras = 0.0
         docs_compras = 0
         valor_inv = 0.0
+        monto_salidas = 0.0
     finally:
         conn.close()
 
@@ -178,30 +262,24 @@ def obtener_kpis_dashboard(start_date, end_date):
         'compras_monto': monto_compras,
         'compras_docs': docs_compras,
         'valor_inventario': valor_inv,
-        'salidas_monto': obtener_valor_salidas_fifo(start_date, end_date),
+        'salidas_monto': monto_salidas,
         'tc': tc
     }
 
-def obtener_top_proveedores(start_date, end_date, top_n=10):
-    """Retorna DF con top proveedores por monto de compra (en PEN)"""
-    conn = get_connection()
-    tc = obtener_tipo_cambio_actual()
-    query = f"""
+def obtener_top_proveedores(start_date, end_date, top_n=10, conn=None):
+    """Retorna DF con top proveedores por monto de compra (en PEN, desde gasto_diario_proveedor)"""
+    conn = conn or get_connection_reportes()
+    query = """
         SELECT p.razon_social as Proveedor, 
-               TOTAL(
-                   CASE 
-                       WHEN c.moneda = 'USD' THEN c.total_compra * COALESCE(c.tipo_cambio, {tc})
-                       ELSE c.total_compra
-                   END
-               ) as Monto
-        FROM compras_cabecera c
-        JOIN proveedores p ON c.proveedor_id = p.id
-        WHERE c.fecha_emision BETWEEN ? AND ?
+               TOTAL(g.monto_pen) as Monto
+        FROM gasto_diario_proveedor g
+        JOIN proveedores p ON g.proveedor_id = p.id
+        WHERE g.fecha BETWEEN ? AND ?
         GROUP BY p.id, p.razon_social
         ORDER BY Monto DESC
-        LIMIT {int(top_n)}
+        LIMIT ?
     """
-    df = pd.read_sql(query, conn, params=(start_date, end_date))
+    df = pd.read_sql(query, conn, params=(start_date, end_date, int(top_n)))
     conn.close()
     return df
 
@@ -216,24 +294,15 @@ def obtener_proveedores():
         conn.close()
     return df
 
-def obtener_gastos_por_categoria(start_date, end_date):
-    """Retorna DF con gastos agrupados por categoría (en PEN)"""
-    conn = get_connection()
-    tc = obtener_tipo_cambio_actual()
-    # Note: compras_detalle subtotal needs conversion using cabecera currency
-    query = f"""
+def obtener_gastos_por_categoria(start_date, end_date, conn=None):
+    """Retorna DF con gastos agrupados por categoría (en PEN, desde gasto_diario_categoria)"""
+    conn = conn or get_connection_reportes()
+    query = """
         SELECT cat.nombre as Categoria, 
-               TOTAL(
-                   CASE 
-                       WHEN cc.moneda = 'USD' THEN cd.subtotal * COALESCE(cc.tipo_cambio, {tc})
-                       ELSE cd.subtotal
-                   END
-               ) as Monto
-        FROM compras_detalle cd
-        JOIN compras_cabecera cc ON cd.compra_id = cc.id
-        JOIN productos p ON cd.producto_id = p.id
-        JOIN categorias cat ON p.categoria_id = cat.id
-        WHERE cc.fecha_emision BETWEEN ? AND ?
+               TOTAL(g.monto_pen) as Monto
+        FROM gasto_diario_categoria g
+        JOIN categorias cat ON g.categoria_id = cat.id
+        WHERE g.fecha BETWEEN ? AND ?
         GROUP BY cat.nombre
         ORDER BY Monto DESC
     """
@@ -241,23 +310,17 @@ def obtener_gastos_por_categoria(start_date, end_date):
     conn.close()
     return df
 
-def obtener_evolucion_compras(start_date, end_date):
-    """Retorna DF con evolución diaria de compras (en PEN)"""
-    conn = get_connection()
-    tc = obtener_tipo_cambio_actual()
-    query = f"""
-        SELECT fecha_emision as Fecha, 
-               TOTAL(
-                   CASE 
-                       WHEN moneda = 'USD' THEN total_compra * COALESCE(tipo_cambio, {tc})
-                       ELSE total_compra
-                   END
-               ) as Monto, 
-               COUNT(*) as Cantidad
-        FROM compras_cabecera
-        WHERE fecha_emision BETWEEN ? AND ?
-        GROUP BY fecha_emision
-        ORDER BY fecha_emision
+def obtener_evolucion_compras(start_date, end_date, conn=None):
+    """Retorna DF con evolución diaria de compras (en PEN, desde gasto_diario_proveedor)"""
+    conn = conn or get_connection_reportes()
+    query = """
+        SELECT fecha as Fecha, 
+               TOTAL(monto_pen) as Monto, 
+               SUM(docs) as Cantidad
+        FROM gasto_diario_proveedor
+        WHERE fecha BETWEEN ? AND ?
+        GROUP BY fecha
+        ORDER BY fecha
     """
     df = pd.read_sql(query, conn, params=(start_date, end_date))
     conn.close()
@@ -267,12 +330,12 @@ def obtener_evolucion_compras(start_date, end_date):
         
     return df
 
-def obtener_stock_critico():
+def obtener_stock_critico(conn=None):
     """
     Retorna productos con stock crítico clasificados por semáforo.
     Criterio: Compara stock actual vs stock_minimo definido por el usuario.
     """
-    conn = get_connection()
+    conn = conn or get_connection_reportes()
     try:
         query = """
             SELECT * FROM (
@@ -311,12 +374,12 @@ def obtener_stock_critico():
         conn.close()
 
 
-def obtener_rotacion_inventario():
+def obtener_rotacion_inventario(conn=None):
     """
     Retorna Top 10 productos más movidos y Top 10 menos movidos.
     Basado en salidas de los últimos 30 días.
     """
-    conn = get_connection()
+    conn = conn or get_connection_reportes()
     
     try:
         # Top 10 más movidos
@@ -365,101 +428,30 @@ def obtener_rotacion_inventario():
     finally:
         conn.close()
 
-def obtener_alertas_criticas():
+def obtener_alertas_criticas(conn=None):
     """
     Retorna dict con contadores y detalles de alertas críticas para el dashboard.
-    Ahora devuelve objetos ricos con info detallada.
+    Lee la tabla alertas (mantenida en cada escritura, ver src/alertas.py) con una sola consulta.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    alertas = {
-        'sin_stock': {'count': 0, 'items': []},
-        'sin_movimiento': {'count': 0, 'items': []},
-        'compras_grandes': {'count': 0, 'items': []},
-        'facturas_duplicadas': {'count': 0, 'items': []}
-    }
-    
+    conn = conn or get_connection_reportes()
     try:
-        # 1. Productos sin stock
-        try:
-            cursor.execute("SELECT nombre, stock_actual, stock_minimo, unidad_medida FROM productos WHERE stock_actual <= 0")
-            rows = cursor.fetchall()
-            alertas['sin_stock']['items'] = [
-                {'nombre': r[0], 'stock': r[1], 'min': r[2], 'um': r[3]} 
-                for r in rows
-            ]
-            alertas['sin_stock']['count'] = len(rows)
-        except Exception as e:
-            print(f"⚠️ Error calculando sin_stock: {e}")
-        
-        # 2. Productos sin movimiento (> 90 días)
-        try:
-            # Get product info + days since last exit
-            cursor.execute("""
-                SELECT p.nombre, MAX(s.fecha) as ultima_salida
-                FROM productos p
-                LEFT JOIN salidas_detalle sd ON p.id = sd.producto_id
-                LEFT JOIN salidas_cabecera s ON sd.salida_id = s.id
-                WHERE p.stock_actual > 0
-                GROUP BY p.id
-                HAVING (MAX(s.fecha) < date('now', '-90 days')) OR (MAX(s.fecha) IS NULL)
-            """)
-            rows = cursor.fetchall()
-            alertas['sin_movimiento']['items'] = [
-                {'nombre': r[0], 'ultimo_movimiento': r[1] if r[1] else 'Nunca'}
-                for r in rows
-            ]
-            alertas['sin_movimiento']['count'] = len(rows)
-        except Exception as e:
-            print(f"⚠️ Error calculando sin_movimiento: {e}")
-        
-        # 3. Compras grandes recientes (> S/ 10,000 últimos 7 días)
-        try:
-            cursor.execute("""
-                SELECT c.serie || '-' || c.numero, p.razon_social, c.fecha_emision,
-                       CASE 
-                           WHEN c.moneda = 'USD' THEN c.total_compra * COALESCE(c.tipo_cambio, 3.75) 
-                           ELSE c.total_compra 
-                       END as monto_pen
-                FROM compras_cabecera c
-                JOIN proveedores p ON c.proveedor_id = p.id
-                WHERE c.fecha_emision >= date('now', '-7 days')
-                AND monto_pen > 10000
-            """)
-            rows = cursor.fetchall()
-            alertas['compras_grandes']['items'] = [
-                {'documento': r[0], 'proveedor': r[1], 'fecha': r[2], 'monto': r[3]}
-                for r in rows
-            ]
-            alertas['compras_grandes']['count'] = len(rows)
-        except Exception as e:
-            print(f"⚠️ Error calculando compras_grandes: {e}")
-        
-        # 4. Posibles facturas duplicadas (mismo proveedor, fecha, monto)
-        try:
-            cursor.execute("""
-                SELECT p.razon_social, c.fecha_emision, c.total_compra, COUNT(*) as cnt
-                FROM compras_cabecera c
-                JOIN proveedores p ON c.proveedor_id = p.id
-                GROUP BY c.proveedor_id, c.fecha_emision, c.total_compra
-                HAVING cnt > 1
-            """)
-            rows = cursor.fetchall()
-            alertas['facturas_duplicadas']['items'] = [
-                {'proveedor': r[0], 'fecha': r[1], 'monto': r[2], 'cantidad': r[3]}
-                for r in rows
-            ]
-            alertas['facturas_duplicadas']['count'] = len(rows)
-        except Exception as e:
-            print(f"⚠️ Error calculando facturas_duplicadas: {e}")
-        
+        return alertas.leer(conn.cursor())
     except Exception as e:
         print(f"❌ Error general en obtener_alertas_criticas: {e}")
+        return {tipo: {'count': 0, 'items': []} for tipo in alertas.TIPOS}
     finally:
         conn.close()
-    
-    return alertas
+
+def recalcular_alertas():
+    """Regenera la tabla alertas desde cero (conciliación). Retorna (ok, mensaje)."""
+    def operacion(conn):
+        return alertas.recalcular(conn.cursor())
+
+    try:
+        n = ejecutar_escritura("recalcular_alertas", operacion, agrupable=False)
+        return True, f"{n} alertas evaluadas"
+    except Exception as e:
+        return False, str(e)
 
 
 
@@ -500,7 +492,7 @@ def obtener_info_producto(producto_id):
 
 def obtener_kardex_producto(producto_id, start_date=None, end_date=None):
     """Retorna DF con movimientos (Kardex)"""
-    conn = get_connection()
+    conn = get_connection_reportes()
     
     params = []
     
@@ -577,13 +569,23 @@ def obtener_kardex_producto(producto_id, start_date=None, end_date=None):
 
 # --- Funciones CRUD Wrappers ---
 
+# Return all fields for the full grid (id, ruc_dni, razon_social, direccion, telefono, email, categoria)
+SQL_PROVEEDORES = "SELECT id, ruc_dni, razon_social, direccion, telefono, email, categoria FROM proveedores"
+
 def obtener_proveedores():
     conn = get_connection()
-    # Return all fields for the full grid (id, ruc_dni, razon_social, direccion, telefono, email, categoria)
-    df = pd.read_sql("SELECT id, ruc_dni, razon_social, direccion, telefono, email, categoria FROM proveedores", conn)
+    df = pd.read_sql(SQL_PROVEEDORES, conn)
     conn.close()
     return df
 
+def obtener_proveedores_filas(conn=None):
+    """Proveedores como filas (sin pandas) para la API"""
+    conn = conn or get_connection()
+    try:
+        return filas.consultar(conn, SQL_PROVEEDORES)
+    finally:
+        conn.close()
+
 def obtener_proveedores_completo():
     conn = get_connection()
     df = pd.read_sql("SELECT id, ruc_dni as RUC, razon_social as RazonSocial FROM proveedores", conn)
@@ -609,19 +611,39 @@ def obtener_productos_completo():
     conn.close()
     return df
 
+SQL_CATEGORIAS = "SELECT id, nombre FROM categorias"
+
 def obtener_categorias():
     conn = get_connection()
-    df = pd.read_sql("SELECT id, nombre FROM categorias", conn)
+    df = pd.read_sql(SQL_CATEGORIAS, conn)
     conn.close()
     return df
 
+def obtener_categorias_filas(conn=None):
+    """Categorías como filas (sin pandas) para la API"""
+    conn = conn or get_connection()
+    try:
+        return filas.consultar(conn, SQL_CATEGORIAS)
+    finally:
+        conn.close()
+
+SQL_ALMACENES = "SELECT id, nombre, ubicacion FROM almacenes"
+
 def obtener_almacenes():
     """Retorna lista de almacenes disponibles"""
     conn = get_connection()
-    df = pd.read_sql("SELECT id, nombre, ubicacion FROM almacenes", conn)
+    df = pd.read_sql(SQL_ALMACENES, conn)
     conn.close()
     return df
 
+def obtener_almacenes_filas(conn=None):
+    """Almacenes como filas (sin pandas) para la API"""
+    conn = conn or get_connection()
+    try:
+        return filas.consultar(conn, SQL_ALMACENES)
+    finally:
+        conn.close()
+
 def registrar_orden_compra(proveedor_id, fecha, moneda, items):
     conn = get_connection()
     cursor = conn.cursor()
@@ -902,28 +924,50 @@ def registrar_traslado(cab, detalles):
     finally:
         conn.close()
 
-def obtener_historial_traslados():
-    conn = get_connection()
-    query = """
-        SELECT 
+LISTADO_TRASLADOS = paginacion.Listado(
+    columnas="""
             t.id, t.fecha, 
             ao.nombre as Origen, 
             ad.nombre as Destino, 
             t.estado,
             (SELECT COUNT(*) FROM traslados_detalle WHERE traslado_id = t.id) as Items,
-            GROUP_CONCAT(p.unidad_medida, ', ') as UMs
-        FROM traslados_cabecera t
+            (SELECT GROUP_CONCAT(p.unidad_medida, ', ')
+             FROM traslados_detalle td JOIN productos p ON td.producto_id = p.id
+             WHERE td.traslado_id = t.id) as UMs
+    """,
+    desde="""traslados_cabecera t
         JOIN almacenes ao ON t.origen_id = ao.id
-        JOIN almacenes ad ON t.destino_id = ad.id
-        LEFT JOIN traslados_detalle td ON t.id = td.traslado_id
-        LEFT JOIN productos p ON td.producto_id = p.id
-        GROUP BY t.id
+        JOIN almacenes ad ON t.destino_id = ad.id""",
+    claves=["t.id"],
+    orden={"fecha": "t.fecha", "id": "t.id", "estado": "t.estado"},
+    orden_defecto="-fecha",
+    filtros={
+        "start_date": "t.fecha >= ?",
+        "end_date": "t.fecha <= ?",
+        "product_id": "t.id IN (SELECT traslado_id FROM traslados_detalle WHERE producto_id = ?)",
+        "almacen_id": "(t.origen_id = ? OR t.destino_id = ?)",
+    },
+)
+SQL_HISTORIAL_TRASLADOS = f"""
+        SELECT {LISTADO_TRASLADOS.columnas}
+        FROM {LISTADO_TRASLADOS.desde}
         ORDER BY t.fecha DESC, t.id DESC
-    """
-    df = pd.read_sql(query, conn)
+"""
+
+def obtener_historial_traslados():
+    conn = get_connection_reportes()
+    df = pd.read_sql(SQL_HISTORIAL_TRASLADOS, conn)
     conn.close()
     return df
 
+def obtener_historial_traslados_filas():
+    """Historial de traslados como filas (sin pandas) para la API"""
+    conn = get_connection_reportes()
+    try:
+        return filas.consultar(conn, SQL_HISTORIAL_TRASLADOS)
+    finally:
+        conn.close()
+
 def obtener_productos_con_stock_por_almacen(almacen_id):
     """
     Retorna productos con su stock global y stock específico en el almacén indicado.
@@ -951,7 +995,7 @@ def obtener_productos_con_stock_por_almacen(almacen_id):
     return df
 
 def obtener_stock_por_almacen(producto_id=None):
-    conn = get_connection()
+    conn = get_connection_reportes()
     base_query = """
         SELECT 
             p.nombre as Producto,
@@ -972,190 +1016,104 @@ def obtener_stock_por_almacen(producto_id=None):
     conn.close()
     return df
 
-def obtener_kardex_producto(producto_id, start_date=None, end_date=None):
-    """Retorna DF con movimientos (Kardex: Compras, Salidas, Traslados)"""
-    conn = get_connection()
-    
-    params = []
-    cond_compras = "True"
-    cond_salidas = "True"
-    cond_traslados_sal = "True"
-    cond_traslados_ent = "True"
-    
-    p_format = [producto_id]
-    
+def _consulta_kardex_producto(cursor, producto_id, start_date=None, end_date=None):
+    """(query, params) del kardex de un producto, con saldo acumulado desde la apertura"""
+    cond_fecha = ""
+    apertura = 0.0
+    params = [producto_id]
     if start_date and end_date:
-        cond_compras = "cc.fecha_emision BETWEEN ? AND ?"
-        cond_salidas = "sc.fecha BETWEEN ? AND ?"
-        cond_traslados_sal = "tc.fecha BETWEEN ? AND ?"
-        cond_traslados_ent = "tc.fecha BETWEEN ? AND ?"
-        p_format.extend([start_date, end_date])
-        
-    # Compras + Salidas + Traslados (Salida Origen) + Traslados (Entrada Destino)
-    # UNION ALL requires same column count/types
+        cond_fecha = "AND fecha BETWEEN ? AND ?"
+        params.extend([start_date, end_date])
+        # Saldo inicial: cierre mensual más cercano + movimientos hasta start_date
+        apertura = saldos.saldo_apertura(cursor, producto_id, start_date)
     
+    # Saldo acumulado en orden cronológico (fecha, id); se retorna DESC como antes
     query = f"""
         SELECT 
-            cc.fecha_emision as Fecha, 
-            'COMPRA' as TipoMovimiento, 
-            cc.numero as Documento,
-            'Proveedor' as OrigenDestino,
-            cd.cantidad as Entradas,
-            0 as Salidas
-        FROM compras_detalle cd
-        JOIN compras_cabecera cc ON cd.compra_id = cc.id
-        WHERE cd.producto_id = ? AND {cond_compras}
-        
-        UNION ALL
-        
-        SELECT 
-            sc.fecha as Fecha, 
-            'SALIDA' as TipoMovimiento, 
-            'Salida #' || sc.id as Documento,
-            sc.destino as OrigenDestino,
-            0 as Entradas,
-            sd.cantidad as Salidas
-        FROM salidas_detalle sd
-        JOIN salidas_cabecera sc ON sd.salida_id = sc.id
-        WHERE sd.producto_id = ? AND {cond_salidas}
-        
-        UNION ALL
-        
-        SELECT 
-            tc.fecha as Fecha,
-            'TRASLADO SALIDA' as TipoMovimiento,
-            'Traslado #' || tc.id as Documento,
-            'A: ' || ad.nombre as OrigenDestino,
-            0 as Entradas,
-            td.cantidad as Salidas
-        FROM traslados_detalle td
-        JOIN traslados_cabecera tc ON td.traslado_id = tc.id
-        JOIN almacenes ad ON tc.destino_id = ad.id
-        WHERE td.producto_id = ? AND {cond_traslados_sal}
-        
-        UNION ALL
-        
-        SELECT 
-            tc.fecha as Fecha,
-            'TRASLADO ENTRADA' as TipoMovimiento,
-            'Traslado #' || tc.id as Documento,
-            'De: ' || ao.nombre as OrigenDestino,
-            td.cantidad as Entradas,
-            0 as Salidas
-        FROM traslados_detalle td
-        JOIN traslados_cabecera tc ON td.traslado_id = tc.id
-        JOIN almacenes ao ON tc.origen_id = ao.id
-        WHERE td.producto_id = ? AND {cond_traslados_ent}
-        
-        ORDER BY Fecha DESC
-    """
+            fecha as Fecha,
+            tipo as TipoMovimiento,
+            documento as Documento,
+            origen_destino as OrigenDestino,
+            CASE WHEN cantidad > 0 THEN cantidad ELSE 0 END as Entradas,
+            CASE WHEN cantidad < 0 THEN -cantidad ELSE 0 END as Salidas,
+            ? + SUM(cantidad) OVER (ORDER BY fecha, id) as Saldo
+        FROM movimientos_inventario
+        WHERE producto_id = ? {cond_fecha}
+        ORDER BY fecha DESC, id DESC
+    """
+    return query, [apertura] + params
+
+def obtener_kardex_producto(producto_id, start_date=None, end_date=None):
+    """Retorna DF con movimientos (Kardex: Compras, Salidas, Traslados) desde movimientos_inventario"""
+    conn = get_connection_reportes()
     
-    # Need to repeat params for each union part
-    full_params = p_format * 4 
+    cursor = conn.cursor()
     
-    columns = ['Fecha', 'TipoMovimiento', 'Documento', 'OrigenDestino', 'Entradas', 'Salidas']
+    columns = ['Fecha', 'TipoMovimiento', 'Documento', 'OrigenDestino', 'Entradas', 'Salidas', 'Saldo']
     data = []
     
-    cursor = conn.cursor()
     try:
-        cursor.execute(query, full_params)
-        rows = cursor.fetchall()
-        for r in rows:
-            data.append(r)
+        query, params = _consulta_kardex_producto(cursor, producto_id, start_date, end_date)
+        cursor.execute(query, params)
+        data = cursor.fetchall()
     except Exception as e:
         print(f"Error kardex: {e}")
-        pass
-        
-    df = pd.DataFrame(data, columns=columns)
-    
-    # Calculate balance (requires ASC sort first, then flip back if needed)
-    if not df.empty:
-        df = df.sort_values(by=['Fecha'], ascending=True) # Sort ASC for cumulative sum
-        df['Saldo'] = (df['Entradas'] - df['Salidas']).cumsum()
-        df = df.sort_values(by=['Fecha'], ascending=False) # Return DESC as requested
-    else:
-        df['Saldo'] = 0
+    finally:
+        conn.close()
         
-    conn.close()
-    return df
+    return pd.DataFrame(data, columns=columns)
 
-def obtener_kardex_general(start_date, end_date):
-    """Retorna Kardex General (todos los productos) en rango de fechas"""
-    conn = get_connection()
-    
-    # Compras
-    q_compras = """
-        SELECT 
-            cc.fecha_emision as Fecha,
-            p.nombre as Producto,
-            'COMPRA' as TipoMovimiento,
-            cc.numero as Documento,
-            'Proveedor' as OrigenDestino,
-            cd.cantidad as Entradas,
-            0 as Salidas
-        FROM compras_detalle cd
-        JOIN compras_cabecera cc ON cd.compra_id = cc.id
-        JOIN productos p ON cd.producto_id = p.id
-        WHERE cc.fecha_emision BETWEEN ? AND ?
-    """
-    
-    # Salidas
-    q_salidas = """
-        SELECT 
-            sc.fecha as Fecha,
-            p.nombre as Producto,
-            'SALIDA' as TipoMovimiento,
-            'Salida #' || sc.id as Documento,
-            sc.destino as OrigenDestino,
-            0 as Entradas,
-            sd.cantidad as Salidas
-        FROM salidas_detalle sd
-        JOIN salidas_cabecera sc ON sd.salida_id = sc.id
-        JOIN productos p ON sd.producto_id = p.id
-        WHERE sc.fecha BETWEEN ? AND ?
+def obtener_kardex_producto_filas(producto_id, start_date=None, end_date=None):
+    """Kardex de un producto como filas (sin pandas) para la API"""
+    conn = get_connection_reportes()
+    try:
+        query, params = _consulta_kardex_producto(conn.cursor(), producto_id, start_date, end_date)
+        return filas.consultar(conn, query, params)
+    except Exception as e:
+        print(f"Error kardex: {e}")
+        return []
+    finally:
+        conn.close()
+
+def obtener_stock_a_fecha(fecha, producto_id=None, almacen_id=None):
     """
-    
-    # Traslados Salida
-    q_tras_sal = """
-        SELECT 
-            tc.fecha as Fecha,
-            p.nombre as Producto,
-            'TRASLADO SALIDA' as TipoMovimiento,
-            'Traslado #' || tc.id as Documento,
-            'A: ' || ad.nombre as OrigenDestino,
-            0 as Entradas,
-            td.cantidad as Salidas
-        FROM traslados_detalle td
-        JOIN traslados_cabecera tc ON td.traslado_id = tc.id
-        JOIN productos p ON td.producto_id = p.id
-        JOIN almacenes ad ON tc.destino_id = ad.id
-        WHERE tc.fecha BETWEEN ? AND ?
+    Stock por producto y almacén al cierre de `fecha`.
+    Usa el cierre mensual anterior más los movimientos desde entonces.
     """
+    conn = get_connection_reportes()
+    try:
+        cursor = conn.cursor()
+        filas = saldos.stock_a_fecha(cursor, fecha, producto_id, almacen_id)
+        df = pd.DataFrame(filas, columns=['producto_id', 'almacen_id', 'stock'])
+        productos = pd.read_sql("SELECT id as producto_id, codigo_sku as sku, nombre as producto FROM productos", conn)
+        almacenes = pd.read_sql("SELECT id as almacen_id, nombre as almacen FROM almacenes", conn)
+        df = df.merge(productos, on='producto_id', how='left').merge(almacenes, on='almacen_id', how='left')
+        return df[['producto_id', 'sku', 'producto', 'almacen_id', 'almacen', 'stock']]
+    finally:
+        conn.close()
+
+def obtener_kardex_general(start_date, end_date):
+    """Retorna Kardex General (todos los productos) en rango de fechas desde movimientos_inventario"""
+    conn = get_connection_reportes()
     
-    # Traslados Entrada
-    q_tras_ent = """
+    query = """
         SELECT 
-            tc.fecha as Fecha,
+            m.fecha as Fecha,
             p.nombre as Producto,
-            'TRASLADO ENTRADA' as TipoMovimiento,
-            'Traslado #' || tc.id as Documento,
-            'De: ' || ao.nombre as OrigenDestino,
-            td.cantidad as Entradas,
-            0 as Salidas
-        FROM traslados_detalle td
-        JOIN traslados_cabecera tc ON td.traslado_id = tc.id
-        JOIN productos p ON td.producto_id = p.id
-        JOIN almacenes ao ON tc.origen_id = ao.id
-        WHERE tc.fecha BETWEEN ? AND ?
+            m.tipo as TipoMovimiento,
+            m.documento as Documento,
+            m.origen_destino as OrigenDestino,
+            CASE WHEN m.cantidad > 0 THEN m.cantidad ELSE 0 END as Entradas,
+            CASE WHEN m.cantidad < 0 THEN -m.cantidad ELSE 0 END as Salidas,
+            0 as Saldo
+        FROM movimientos_inventario m
+        JOIN productos p ON m.producto_id = p.id
+        WHERE m.fecha BETWEEN ? AND ?
+        ORDER BY m.fecha DESC, m.id DESC
     """
     
-    full_query = f"{q_compras} UNION ALL {q_salidas} UNION ALL {q_tras_sal} UNION ALL {q_tras_ent} ORDER BY Fecha DESC"
-    
-    params = [start_date, end_date] * 4
-    
     try:
-        df = pd.read_sql(full_query, conn, params=params)
-        df['Saldo'] = 0 # No calculated balance for general view
+        df = pd.read_sql(query, conn, params=(start_date, end_date))
     except Exception as e:
         print(f"Error kardex general: {e}")
         df = pd.DataFrame(columns=['Fecha', 'Producto', 'TipoMovimiento', 'Documento', 'OrigenDestino', 'Entradas', 'Salidas', 'Saldo'])
@@ -1163,13 +1121,115 @@ def obtener_kardex_general(start_date, end_date):
     conn.close()
     return df
 
+# --- KARDEX GENERAL PAGINADO (keyset sobre fecha, id del libro) ---
+
+KARDEX_GENERAL_COLUMNAS = ['Fecha', 'Producto', 'TipoMovimiento', 'Documento', 'OrigenDestino', 'Entradas', 'Salidas', 'Saldo']
+
+def codificar_cursor_kardex(fecha, mov_id):
+    """Cursor opaco (base64) con la posición (fecha, id) de la última fila entregada"""
+    return base64.urlsafe_b64encode(json.dumps([fecha, mov_id]).encode()).decode()
+
+def decodificar_cursor_kardex(token):
+    try:
+        fecha, mov_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return str(fecha), int(mov_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def iterar_kardex_general(start_date, end_date, cursor=None, limit=None, lote=500):
+    """
+    Generador del Kardex General en orden fecha DESC, id DESC (mismo orden que obtener_kardex_general).
+    Lee directo del cursor SQLite por lotes, sin cargar el rango completo en memoria.
+    Produce tuplas (mov_id, fila_dict); `cursor` continúa después de la posición indicada.
+    """
+    conn = get_connection_reportes()
+    try:
+        cond_cursor = ""
+        params = [start_date, end_date]
+        if cursor:
+            cond_cursor = "AND (m.fecha, m.id) < (?, ?)"
+            params.extend(decodificar_cursor_kardex(cursor))
+        cond_limit = ""
+        if limit is not None:
+            cond_limit = "LIMIT ?"
+            params.append(int(limit))
+        
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT 
+                m.id,
+                m.fecha,
+                p.nombre,
+                m.tipo,
+                m.documento,
+                m.origen_destino,
+                CASE WHEN m.cantidad > 0 THEN m.cantidad ELSE 0 END,
+                CASE WHEN m.cantidad < 0 THEN -m.cantidad ELSE 0 END,
+                0
+            FROM movimientos_inventario m
+            JOIN productos p ON m.producto_id = p.id
+            WHERE m.fecha BETWEEN ? AND ? {cond_cursor}
+            ORDER BY m.fecha DESC, m.id DESC
+            {cond_limit}
+        """, params)
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                break
+            for fila in filas:
+                # Mismo contrato que fillna(""): NULL -> ""
+                yield fila[0], dict(zip(KARDEX_GENERAL_COLUMNAS, ("" if v is None else v for v in fila[1:])))
+    finally:
+        conn.close()
+
+def obtener_kardex_general_pagina(start_date, end_date, cursor=None, limit=100):
+    """
+    Página del Kardex General con paginación keyset.
+    Retorna (items, next_cursor); next_cursor es None en la última página.
+    """
+    items = []
+    ultimo = None
+    filas = iterar_kardex_general(start_date, end_date, cursor, limit + 1)
+    try:
+        for mov_id, fila in filas:
+            if len(items) == limit:
+                return items, codificar_cursor_kardex(*ultimo)
+            items.append(fila)
+            ultimo = (fila['Fecha'], mov_id)
+        return items, None
+    finally:
+        filas.close()
+
+# --- KARDEX VALORIZADO (formato 13.1 SUNAT) ---
+
+KARDEX_VALORIZADO_COLUMNAS = kardex_valorizado.COLUMNAS
+
+def iterar_kardex_valorizado(start_date, end_date, metodo='fifo', producto_id=None, incluir_igv=True):
+    """
+    Generador del Kardex Valorizado (todos los productos o uno) entre start_date y end_date.
+    metodo: 'fifo' o 'promedio'. Una sola lectura ordenada del libro de movimientos;
+    las filas se producen en orden producto, fecha sin cargar el rango en memoria.
+    """
+    conn = get_connection_reportes()
+    try:
+        yield from kardex_valorizado.generar(conn.cursor(), start_date, end_date, metodo, producto_id, incluir_igv)
+    finally:
+        conn.close()
+
+def obtener_kardex_valorizado(start_date, end_date, metodo='fifo', producto_id=None, incluir_igv=True):
+    """Kardex Valorizado como DataFrame (para rangos acotados o un producto)"""
+    return pd.DataFrame(
+        list(iterar_kardex_valorizado(start_date, end_date, metodo, producto_id, incluir_igv)),
+        columns=KARDEX_VALORIZADO_COLUMNAS
+    )
+
 def obtener_compras_historial():
     """Retorna historial de cabeceras de compra"""
     return obtener_historial_compras()
 
 def obtener_compras_detalle_historial():
     """Retorna historial detallado de items comprados"""
-    conn = get_connection()
+    conn = get_connection_reportes()
     query = """
         SELECT 
             c.fecha_emision as fecha,
@@ -1192,21 +1252,34 @@ def obtener_compras_detalle_historial():
     conn.close()
     return df
 
-def obtener_salidas_historial():
-    """Retorna historial de salidas agrupado por cabecera"""
-    conn = get_connection()
-    query = """
-        SELECT 
+LISTADO_SALIDAS = paginacion.Listado(
+    columnas="""
             sc.id,
             sc.fecha,
-            sc.tipo_movimiento as tipo,
+            sc.tipo_salida as tipo,
             sc.destino,
             sc.observaciones,
-            COUNT(sd.id) as items,
-            SUM(sd.cantidad) as total_cantidad
-        FROM salidas_cabecera sc
-        LEFT JOIN salidas_detalle sd ON sc.id = sd.salida_id
-        GROUP BY sc.id
+            (SELECT COUNT(*) FROM salidas_detalle WHERE salida_id = sc.id) as items,
+            (SELECT SUM(cantidad) FROM salidas_detalle WHERE salida_id = sc.id) as total_cantidad
+    """,
+    desde="salidas_cabecera sc",
+    claves=["sc.id"],
+    orden={"fecha": "sc.fecha", "id": "sc.id", "tipo": "sc.tipo_salida", "destino": "sc.destino"},
+    orden_defecto="-fecha",
+    filtros={
+        "start_date": "sc.fecha >= ?",
+        "end_date": "sc.fecha <= ?",
+        "product_id": "sc.id IN (SELECT salida_id FROM salidas_detalle WHERE producto_id = ?)",
+        "almacen_id": "sc.id IN (SELECT salida_id FROM salidas_detalle WHERE almacen_id = ?)",
+    },
+)
+
+def obtener_salidas_historial():
+    """Retorna historial de salidas agrupado por cabecera"""
+    conn = get_connection_reportes()
+    query = f"""
+        SELECT {LISTADO_SALIDAS.columnas}
+        FROM {LISTADO_SALIDAS.desde}
         ORDER BY sc.fecha DESC, sc.id DESC
     """
     df = pd.read_sql(query, conn)
@@ -1215,7 +1288,7 @@ def obtener_salidas_historial():
 
 def obtener_compras_historial():
     """Retorna historial de compras agrupado por cabecera"""
-    conn = get_connection()
+    conn = get_connection_reportes()
     query = """
         SELECT 
             cc.id,
@@ -1236,11 +1309,8 @@ def obtener_compras_historial():
     conn.close()
     return df
 
-def obtener_compras_detalle_historial():
-    """Retorna historial de compras detallado (línea por línea)"""
-    conn = get_connection()
-    query = """
-        SELECT 
+LISTADO_COMPRAS_DETALLE = paginacion.Listado(
+    columnas="""
             cc.fecha_emision as fecha,
             p.razon_social as proveedor,
             cc.serie,
@@ -1253,17 +1323,45 @@ def obtener_compras_detalle_historial():
             (cd.cantidad * cd.precio_unitario) as subtotal,
             cc.moneda,
             a.nombre as almacen
-        FROM compras_detalle cd
+    """,
+    desde="""compras_detalle cd
         JOIN compras_cabecera cc ON cd.compra_id = cc.id
         JOIN proveedores p ON cc.proveedor_id = p.id
         JOIN productos pr ON cd.producto_id = pr.id
-        LEFT JOIN almacenes a ON cd.almacen_id = a.id
+        LEFT JOIN almacenes a ON cd.almacen_id = a.id""",
+    claves=["cc.id", "cd.id"],
+    orden={"fecha": "cc.fecha_emision", "proveedor": "p.razon_social", "codigo": "pr.codigo_sku",
+           "producto": "pr.nombre", "subtotal": "(cd.cantidad * cd.precio_unitario)"},
+    orden_defecto="-fecha",
+    filtros={
+        "start_date": "cc.fecha_emision >= ?",
+        "end_date": "cc.fecha_emision <= ?",
+        "provider_id": "cc.proveedor_id = ?",
+        "product_id": "cd.producto_id = ?",
+        "almacen_id": "cd.almacen_id = ?",
+    },
+)
+SQL_COMPRAS_DETALLE_HISTORIAL = f"""
+        SELECT {LISTADO_COMPRAS_DETALLE.columnas}
+        FROM {LISTADO_COMPRAS_DETALLE.desde}
         ORDER BY cc.fecha_emision DESC, cc.id DESC
-    """
-    df = pd.read_sql(query, conn)
+"""
+
+def obtener_compras_detalle_historial():
+    """Retorna historial de compras detallado (línea por línea)"""
+    conn = get_connection_reportes()
+    df = pd.read_sql(SQL_COMPRAS_DETALLE_HISTORIAL, conn)
     conn.close()
     return df
 
+def obtener_compras_detalle_historial_filas():
+    """Historial de compras detallado como filas (sin pandas) para la API"""
+    conn = get_connection_reportes()
+    try:
+        return filas.consultar(conn, SQL_COMPRAS_DETALLE_HISTORIAL)
+    finally:
+        conn.close()
+
 def obtener_detalle_compras():
     """Alias for obtener_compras_detalle_historial"""
     return obtener_compras_detalle_historial()
@@ -1324,6 +1422,8 @@ def crear_orden_compra_con_correlativo(proveedor_id, fecha_emision, fecha_entreg
                 orden_id, item['pid'], item['cantidad'], item['precio_unitario']
             ))
         
+        eventos.documento(conn, 'orden_compra', orden_id, fecha=fecha_emision, proveedor_id=proveedor_id,
+                          estado='PENDIENTE', moneda=moneda, total=total_orden)
         conn.commit()
         return orden_id
         
@@ -1387,9 +1487,8 @@ def crear_categoria(nombre):
         conn.close()
 
 def crear_producto(sku, nombre, unidad, categoria_id, stock_minimo=0, stock_inicial=0):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         cursor.execute("SELECT id FROM productos WHERE nombre = ?", (nombre,))
         if cursor.fetchone():
             return False, "Producto ya existe con ese nombre", None
@@ -1402,14 +1501,22 @@ def crear_producto(sku, nombre, unidad, categoria_id, stock_minimo=0, stock_inic
         
         if stock_inicial > 0:
              cursor.execute("INSERT INTO stock_almacen (producto_id, almacen_id, stock_actual) VALUES (?, 1, ?)", (pid, stock_inicial))
+             stock_id = cursor.lastrowid
              cursor.execute("UPDATE productos SET stock_actual = ? WHERE id = ?", (stock_inicial, pid))
-             
-        conn.commit()
+             movimientos.registrar_movimiento(
+                 cursor, datetime.now().strftime("%Y-%m-%d"), pid, 1, stock_inicial, 0.0,
+                 movimientos.STOCK_INICIAL, 'Stock Inicial', 'Creación de producto', 'stock_almacen', stock_id
+             )
+             eventos.stock(conn, pid, 1)
+             versiones.incrementar(cursor, versiones.STOCK)
+        alertas.evaluar_productos(cursor, [pid])
+        versiones.incrementar(cursor, versiones.PRODUCTOS)
         return True, "Producto creado", pid
+
+    try:
+        return ejecutar_escritura("crear_producto", operacion)
     except Exception as e:
         return False, f"Error: {str(e)}", None
-    finally:
-        conn.close()
 
 def obtener_productos_extendido():
     """Retorna productos con info extendida para Dashboards y tablas"""
@@ -1446,10 +1553,8 @@ def obtener_compras_por_categoria(start_date, end_date):
 
     return df
 
-def obtener_compras_historial():
-    conn = get_connection()
-    query = """
-        SELECT 
+LISTADO_COMPRAS = paginacion.Listado(
+    columnas="""
             c.id, 
             c.fecha_emision as fecha, 
             c.serie || '-' || c.numero as numero_documento, 
@@ -1458,14 +1563,40 @@ def obtener_compras_historial():
             c.total_compra as total_final,
             (SELECT COUNT(*) FROM compras_detalle WHERE compra_id = c.id) as items,
             c.orden_compra_id as oc_id
-        FROM compras_cabecera c
-        JOIN proveedores p ON c.proveedor_id = p.id
+    """,
+    desde="compras_cabecera c JOIN proveedores p ON c.proveedor_id = p.id",
+    claves=["c.id"],
+    orden={"fecha": "c.fecha_emision", "id": "c.id", "numero_documento": "c.serie || '-' || c.numero",
+           "proveedor": "p.razon_social", "total_final": "c.total_compra"},
+    orden_defecto="-fecha",
+    filtros={
+        "start_date": "c.fecha_emision >= ?",
+        "end_date": "c.fecha_emision <= ?",
+        "provider_id": "c.proveedor_id = ?",
+        "product_id": "c.id IN (SELECT compra_id FROM compras_detalle WHERE producto_id = ?)",
+        "almacen_id": "c.id IN (SELECT compra_id FROM compras_detalle WHERE almacen_id = ?)",
+    },
+)
+SQL_COMPRAS_HISTORIAL = f"""
+        SELECT {LISTADO_COMPRAS.columnas}
+        FROM {LISTADO_COMPRAS.desde}
         ORDER BY c.fecha_emision DESC, c.id DESC
-    """
-    df = pd.read_sql(query, conn)
+"""
+
+def obtener_compras_historial():
+    conn = get_connection_reportes()
+    df = pd.read_sql(SQL_COMPRAS_HISTORIAL, conn)
     conn.close()
     return df
 
+def obtener_compras_historial_filas():
+    """Resumen de compras como filas (sin pandas) para la API"""
+    conn = get_connection_reportes()
+    try:
+        return filas.consultar(conn, SQL_COMPRAS_HISTORIAL)
+    finally:
+        conn.close()
+
 def obtener_historial_compras_detallado():
     return obtener_compras_detalle_historial()
 
@@ -1499,9 +1630,8 @@ def registrar_compra(data):
         orden_compra_id (optional)
     }
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         # 0. Quick Check: Avoid Duplicates (Robust: Case-Insensitive, Ignore Leading Zeros)
         cursor.execute("SELECT serie, numero FROM compras_cabecera WHERE proveedor_id=?", (data['proveedor_id'],))
         existing_docs = cursor.fetchall()
@@ -1571,6 +1701,16 @@ def registrar_compra(data):
                 d['price'], d['subtotal'], d['p_costo_prev'], data.get('tasa_igv', 18)
             ))
             
+            cd_id = cursor.lastrowid
+            costo_pen = capas_fifo.costo_unitario_pen(d['price'], moneda, tc_actual)
+            
+            # Libro de movimientos y capa FIFO de esta línea
+            movimientos.registrar_movimiento(
+                cursor, data['fecha'], d['pid'], 1, d['qty'], costo_pen,
+                movimientos.COMPRA, data['numero'], 'Proveedor', 'compras_detalle', cd_id
+            )
+            capas_fifo.abrir_capa(cursor, d['pid'], cd_id, data['fecha'], d['qty'], costo_pen)
+            
             # Update Stock & Cost
             # Get current stock in warehouse 1
             cursor.execute("SELECT id, stock_actual FROM stock_almacen WHERE producto_id=? AND almacen_id=1", (d['pid'],))
@@ -1594,92 +1734,42 @@ def registrar_compra(data):
                 cursor.execute("INSERT INTO stock_almacen (producto_id, almacen_id, stock_actual) VALUES (?, 1, ?)", (d['pid'], qty))
                 cursor.execute("UPDATE productos SET costo_promedio=?, stock_actual=stock_actual+? WHERE id=?", (new_cost, qty, d['pid']))
 
+        # Montos normalizados PEN/USD de cabecera y detalle
+        tipo_cambio.normalizar_compras(cursor, compra_id)
+        gasto_diario.aplicar_compra(cursor, compra_id)
+        alertas.evaluar_productos(cursor, [d['pid'] for d in detalles_compra])
+        alertas.evaluar_proveedores(cursor, [data['proveedor_id']])
+        versiones.incrementar(cursor, versiones.STOCK)
+
+        # Eventos en vivo (se publican tras el commit)
+        for d in detalles_compra:
+            eventos.stock(conn, d['pid'], 1)
+        eventos.documento(conn, 'compra', compra_id, fecha=data['fecha'], proveedor_id=data['proveedor_id'],
+                          numero=f"{data['serie']}-{data['numero']}", moneda=moneda, total=total_compra)
+
         # 4. Update OC status if linked
         if data.get('orden_compra_id'):
              cursor.execute("UPDATE ordenes_compra SET estado='FACTURADA' WHERE id=?", (data.get('orden_compra_id'),))
+             eventos.documento(conn, 'orden_compra', data.get('orden_compra_id'), estado='FACTURADA')
 
-        conn.commit()
         return True, "Compra registrada correctamente"
+
+    try:
+        return ejecutar_escritura("registrar_compra", operacion)
     except Exception as e:
-        conn.rollback()
         return False, str(e)
-    finally:
-        conn.close()
 
-def calcular_valorizado_fifo(incluir_igv=True):
+def calcular_valorizado_fifo(incluir_igv=True, conn=None):
     """
     Calcula el valor del inventario usando método FIFO.
+    Lee el saldo vigente de la tabla capas_fifo (mantenida al registrar compras y salidas).
     Retorna (total_valorizado, mapa_detalle_por_producto)
     """
-    conn = get_connection()
-    
-    # 1. Obtener todos los productos
-    productos = pd.read_sql("SELECT id, nombre FROM productos", conn)
-    
-    total_general = 0.0
-    detalle_map = {} 
-    
-    for _, prod in productos.iterrows():
-        pid = prod['id']
-        nombre = prod['nombre']
-        
-        q_ent = """
-            SELECT cd.cantidad, cd.precio_unitario, cc.fecha_emision, cc.moneda, cc.tipo_cambio
-            FROM compras_detalle cd
-            JOIN compras_cabecera cc ON cd.compra_id = cc.id
-            WHERE cd.producto_id = ?
-            ORDER BY cc.fecha_emision ASC, cc.id ASC
-        """
-        df_ent = pd.read_sql(q_ent, conn, params=(pid,))
-        
-        q_sal = """
-            SELECT sd.cantidad, sc.fecha
-            FROM salidas_detalle sd
-            JOIN salidas_cabecera sc ON sd.salida_id = sc.id
-            WHERE sd.producto_id = ?
-            ORDER BY sc.fecha ASC, sc.id ASC
-        """
-        df_sal = pd.read_sql(q_sal, conn, params=(pid,))
-        
-        batches = []
-        tc_def = 3.75
-        
-        for _, row in df_ent.iterrows():
-            qty = row['cantidad']
-            price = row['precio_unitario']
-            moneda = row['moneda']
-            tc = row['tipo_cambio'] if row['tipo_cambio'] else tc_def
-            
-            price_pen = price * tc if moneda == 'USD' else price
-            if not incluir_igv:
-                price_pen = price_pen / 1.18
-            
-            batches.append({'qty': qty, 'price': price_pen, 'date': row['fecha_emision']})
-            
-        total_salidas = df_sal['cantidad'].sum() if not df_sal.empty else 0
-        remaining_qty = total_salidas
-        
-        while remaining_qty > 0 and batches:
-            batch = batches[0]
-            if batch['qty'] > remaining_qty:
-                batch['qty'] -= remaining_qty
-                remaining_qty = 0
-            else:
-                remaining_qty -= batch['qty']
-                batches.pop(0)
-                
-        val_prod = sum(b['qty'] * b['price'] for b in batches)
-        stock_prod = sum(b['qty'] for b in batches)
-        
-        total_general += val_prod
-        detalle_map[pid] = {
-            'nombre': nombre,
-            'stock': stock_prod,
-            'valor': val_prod
-        }
-        
-    conn.close()
-    return total_general, detalle_map
+    conn = conn or get_connection_reportes()
+    try:
+        return capas_fifo.valorizar(conn, incluir_igv)
+    finally:
+        conn.close()
 
 def registrar_salida(cab, detalles):
     """
@@ -1687,9 +1777,8 @@ def registrar_salida(cab, detalles):
     cab: {fecha, tipo, destino, obs}
     detalles: [{pid, cantidad, almacen_id}, ...]
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO salidas_cabecera (fecha, tipo_salida, destino, observaciones, fecha_registro)
             VALUES (?, ?, ?, ?, ?)
@@ -1720,6 +1809,7 @@ def registrar_salida(cab, detalles):
                 INSERT INTO salidas_detalle (salida_id, producto_id, cantidad, almacen_id)
                 VALUES (?, ?, ?, ?)
             """, (salida_id, pid, qty, alm_id))
+            sd_id = cursor.lastrowid
             
             # Descontar Stock Almacén
             new_st = current_stock - qty
@@ -1728,18 +1818,27 @@ def registrar_salida(cab, detalles):
             # Descontar Stock Global Producto
             cursor.execute("UPDATE productos SET stock_actual = stock_actual - ? WHERE id = ?", (qty, pid))
             
-        conn.commit()
+            # Libro de movimientos; el costo lo estampa el consumo de capas FIFO
+            movimientos.registrar_movimiento(
+                cursor, cab['fecha'], pid, alm_id, -qty, 0.0,
+                movimientos.SALIDA, f"Salida #{salida_id}", cab['destino'], 'salidas_detalle', sd_id
+            )
+            capas_fifo.registrar_consumo_salida(cursor, sd_id, pid, cab['fecha'], qty)
+            eventos.stock(conn, pid, alm_id)
+        alertas.evaluar_productos(cursor, [d['pid'] for d in detalles])
+        versiones.incrementar(cursor, versiones.STOCK)
+        eventos.documento(conn, 'salida', salida_id, fecha=cab['fecha'], tipo=cab['tipo'], destino=cab['destino'])
+            
         return True, f"Salida #{salida_id} registrada correctamente"
         
+    try:
+        return ejecutar_escritura("registrar_salida", operacion)
     except Exception as e:
-        conn.rollback()
         return False, f"Error al registrar salida: {str(e)}"
-    finally:
-        conn.close()
 
 def obtener_historial_salidas():
     """Retorna resumen de salidas registradas"""
-    conn = get_connection()
+    conn = get_connection_reportes()
     query = """
         SELECT 
             s.id, 
@@ -1759,7 +1858,7 @@ def obtener_historial_salidas_detallado():
     """
     Retorna detalle de salidas con nombres de productos.
     """
-    conn = get_connection()
+    conn = get_connection_reportes()
     try:
         query = """
             SELECT 
@@ -1782,83 +1881,23 @@ def obtener_historial_salidas_detallado():
 
 
 
-def obtener_valor_salidas_fifo(start_date, end_date):
+def _valor_salidas_fifo(cursor, start_date, end_date):
+    cursor.execute("""
+        SELECT TOTAL(sd.costo_total)
+        FROM salidas_cabecera sc
+        JOIN salidas_detalle sd ON sd.salida_id = sc.id
+        WHERE sc.fecha BETWEEN ? AND ?
+    """, (start_date, end_date))
+    return cursor.fetchone()[0]
+
+def obtener_valor_salidas_fifo(start_date, end_date, conn=None):
     """
     Calcula el valor monetario de las salidas en un periodo específico usando FIFO.
+    Suma el costo estampado en cada línea al registrarla (salidas_detalle.costo_total).
     """
-    conn = get_connection()
+    conn = conn or get_connection_reportes()
     try:
-        # 1. Obtener productos que tuvieron salidas en el periodo
-        query_prod = """
-            SELECT DISTINCT producto_id 
-            FROM salidas_detalle sd
-            JOIN salidas_cabecera sc ON sd.salida_id = sc.id
-            WHERE sc.fecha BETWEEN ? AND ?
-        """
-        df_pids = pd.read_sql(query_prod, conn, params=(start_date, end_date))
-        
-        valor_total_salidas_periodo = 0.0
-        
-        for pid in df_pids['producto_id']:
-            # Obtener todas las entradas cronológicas
-            q_ent = """
-                SELECT cd.cantidad, cd.precio_unitario, cc.fecha_emision, cc.moneda, cc.tipo_cambio
-                FROM compras_detalle cd
-                JOIN compras_cabecera cc ON cd.compra_id = cc.id
-                WHERE cd.producto_id = ?
-                ORDER BY cc.fecha_emision ASC, cc.id ASC
-            """
-            df_ent = pd.read_sql(q_ent, conn, params=(int(pid),))
-            
-            # Obtener todas las salidas cronológicas
-            q_sal = """
-                SELECT sd.cantidad, sc.fecha, sc.id as salida_id
-                FROM salidas_detalle sd
-                JOIN salidas_cabecera sc ON sd.salida_id = sc.id
-                WHERE sd.producto_id = ?
-                ORDER BY sc.fecha ASC, sc.id ASC
-            """
-            df_sal = pd.read_sql(q_sal, conn, params=(int(pid),))
-            
-            if df_ent.empty or df_sal.empty:
-                continue
-                
-            # Preparar lotes de entrada (PEN, Sin IGV por defecto para consistencia)
-            batches = []
-            tc_def = 3.75
-            for _, row in df_ent.iterrows():
-                qty = row['cantidad']
-                price = row['precio_unitario']
-                moneda = row['moneda']
-                tc = row['tipo_cambio'] if row['tipo_cambio'] else tc_def
-                price_pen = price * tc if moneda == 'USD' else price
-                batches.append({'qty': qty, 'price': price_pen})
-            
-            # Procesar salidas cronológicamente
-            for _, row_s in df_sal.iterrows():
-                qty_to_consume = row_s['cantidad']
-                salida_fecha = row_s['fecha']
-                
-                # Para cada salida, consumimos de los batches
-                valor_esta_salida = 0.0
-                while qty_to_consume > 0 and batches:
-                    batch = batches[0]
-                    if batch['qty'] <= qty_to_consume:
-                        # Consumir todo el batch
-                        valor_esta_salida += batch['qty'] * batch['price']
-                        qty_to_consume -= batch['qty']
-                        batches.pop(0)
-                    else:
-                        # Consumir parte del batch
-                        valor_esta_salida += qty_to_consume * batch['price']
-                        batch['qty'] -= qty_to_consume
-                        qty_to_consume = 0
-                
-                # Si la fecha de esta salida está en el rango, sumar al total del periodo
-                if str(start_date) <= str(salida_fecha) <= str(end_date):
-                    valor_total_salidas_periodo += valor_esta_salida
-        
-        return valor_total_salidas_periodo
+        return _valor_salidas_fifo(conn.cursor(), start_date, end_date)
     finally:
         conn.close()
 
@@ -1909,9 +1948,8 @@ def registrar_traslado(cab, detalles):
     cab: {fecha, origen_id, destino_id, observaciones}
     detalles: [{pid, cantidad}, ...]
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         # Validar mismo origen/destino
         if cab['origen_id'] == cab['destino_id']:
             return False, "Origen y Destino no pueden ser iguales"
@@ -1926,6 +1964,9 @@ def registrar_traslado(cab, detalles):
         ))
         traslado_id = cursor.lastrowid
         
+        cursor.execute("SELECT id, nombre FROM almacenes WHERE id IN (?, ?)", (cab['origen_id'], cab['destino_id']))
+        nombres_alm = dict(cursor.fetchall())
+        
         for d in detalles:
             pid = d['pid']
             qty = float(d['cantidad'])
@@ -1946,6 +1987,16 @@ def registrar_traslado(cab, detalles):
                 INSERT INTO traslados_detalle (traslado_id, producto_id, cantidad)
                 VALUES (?, ?, ?)
             """, (traslado_id, pid, qty))
+            td_id = cursor.lastrowid
+            
+            # Libro de movimientos: salida en origen y entrada en destino
+            cursor.execute("SELECT costo_promedio FROM productos WHERE id = ?", (pid,))
+            row_costo = cursor.fetchone()
+            movimientos.registrar_traslado(
+                cursor, cab['fecha'], traslado_id, td_id, pid, qty, row_costo[0] if row_costo else 0.0,
+                cab['origen_id'], nombres_alm.get(cab['origen_id'], cab['origen_id']),
+                cab['destino_id'], nombres_alm.get(cab['destino_id'], cab['destino_id'])
+            )
             
             # 3. Actualizar Stock Origen (Resta)
             cursor.execute("UPDATE stock_almacen SET stock_actual = stock_actual - ? WHERE id = ?", (qty, sid_orig))
@@ -1959,20 +2010,21 @@ def registrar_traslado(cab, detalles):
                 cursor.execute("UPDATE stock_almacen SET stock_actual = stock_actual + ? WHERE id = ?", (qty, sid_dest))
             else:
                 cursor.execute("INSERT INTO stock_almacen (producto_id, almacen_id, stock_actual) VALUES (?, ?, ?)", (pid, cab['destino_id'], qty))
+
+            eventos.stock(conn, pid, cab['origen_id'])
+            eventos.stock(conn, pid, cab['destino_id'])
                 
-        conn.commit()
+        versiones.incrementar(cursor, versiones.STOCK)
+        eventos.documento(conn, 'traslado', traslado_id, fecha=cab['fecha'],
+                          origen_id=cab['origen_id'], destino_id=cab['destino_id'])
         return True, f"Traslado #{traslado_id} registrado exitosamente"
         
+    try:
+        return ejecutar_escritura("registrar_traslado", operacion)
     except Exception as e:
-        conn.rollback()
         return False, f"Error en traslado: {str(e)}"
-    finally:
-        conn.close()
 
-def obtener_inventario_detallado():
-    """Retorna inventario desglosado por Almacén"""
-    conn = get_connection()
-    query = """
+SQL_INVENTARIO_DETALLADO = """
         SELECT 
             p.id as ProductID,
             p.codigo_sku as Codigo,
@@ -1988,16 +2040,23 @@ def obtener_inventario_detallado():
         LEFT JOIN categorias c ON p.categoria_id = c.id
         WHERE sa.stock_actual <> 0
         ORDER BY p.nombre, a.nombre
-    """
-    # Fix table name in query if needed (products vs productos check done upstream, assuming consistent schema now)
-    
-    df = pd.read_sql(query, conn)
-    conn.close()
+"""
+
+def obtener_inventario_detallado(conn=None):
+    """Retorna inventario desglosado por Almacén"""
+    conn = conn or get_connection_reportes()
+    try:
+        df = pd.read_sql(SQL_INVENTARIO_DETALLADO, conn)
+        # Calculate Global FIFO Valuation to distribute (same snapshot as the stock)
+        try:
+            _, fifo_map = capas_fifo.valorizar(conn, True)
+        except Exception as e:
+            print(f"Error calculating FIFO distribution: {e}")
+            fifo_map = {}  # every row falls back to avg cost
+    finally:
+        conn.close()
     
-    # Calculate Global FIFO Valuation to distribute
     try:
-        _, fifo_map = calcular_valorizado_fifo(incluir_igv=True)
-        
         vals = []
         fifo_costs = []
         
@@ -2027,13 +2086,42 @@ def obtener_inventario_detallado():
     
     return df
 
+def obtener_inventario_detallado_filas(conn=None):
+    """
+    Inventario por almacén como filas (sin pandas) para la API, con el mismo
+    reparto del valor FIFO global. Los NULL se retornan como 0.
+    """
+    conn = conn or get_connection_reportes()
+    try:
+        items = filas.consultar(conn, SQL_INVENTARIO_DETALLADO, nulo=None)
+        # Capas FIFO de la misma instantánea que el stock por almacén
+        try:
+            _, fifo_map = capas_fifo.valorizar(conn, True)
+        except Exception as e:
+            print(f"Error calculating FIFO distribution: {e}")
+            fifo_map = {}
+    finally:
+        conn.close()
+    
+    for item in items:
+        f_data = fifo_map.get(item['ProductID'])
+        if f_data and f_data['stock'] > 0:
+            costo = f_data['valor'] / f_data['stock']
+        else:
+            costo = item['CostoUnitRef'] # Fallback to avg cost
+        item['CostoUnitFIFO'] = costo
+        item['ValorTotal'] = None if costo is None else item['Stock'] * costo
+        for clave, valor in item.items():
+            if valor is None:
+                item[clave] = 0
+    return items
+
 def eliminar_producto(producto_id):
     """
     Elimina un producto si no tiene movimientos asociados (Integridad Referencial).
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         # 1. Verificar Compras
         cursor.execute("SELECT COUNT(*) FROM compras_detalle WHERE producto_id = ?", (producto_id,))
         if cursor.fetchone()[0] > 0:
@@ -2061,17 +2149,20 @@ def eliminar_producto(producto_id):
         if res_st and res_st[0] and res_st[0] != 0:
              return False, "No se puede eliminar: El producto tiene stock físico registrado."
 
-        # Si pasa todo, eliminar
+        # Si pasa todo, eliminar (incluye ajustes de stock inicial del libro)
+        cursor.execute("DELETE FROM movimientos_inventario WHERE producto_id = ?", (producto_id,))
+        saldos.eliminar_producto(cursor, producto_id)
         cursor.execute("DELETE FROM stock_almacen WHERE producto_id = ?", (producto_id,))
         cursor.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
-        conn.commit()
+        alertas.evaluar_productos(cursor, [producto_id])
+        eventos.emitir(conn, eventos.PRODUCTO_ELIMINADO, {'producto_id': producto_id})
+        versiones.incrementar(cursor, versiones.PRODUCTOS)
         return True, "Producto y su stock vinculado eliminados correctamente."
-        
+
+    try:
+        return ejecutar_escritura("eliminar_producto", operacion)
     except Exception as e:
-        conn.rollback()
         return False, f"Error al eliminar: {str(e)}"
-    finally:
-        conn.close()
 
 def actualizar_estado_oc(oc_id, nuevo_estado):
     """Actualiza el estado de una Orden de Compra"""
@@ -2079,6 +2170,7 @@ def actualizar_estado_oc(oc_id, nuevo_estado):
     cursor = conn.cursor()
     try:
         cursor.execute("UPDATE ordenes_compra SET estado = ? WHERE id = ?", (nuevo_estado, oc_id))
+        eventos.documento(conn, 'orden_compra', oc_id, estado=nuevo_estado)
         conn.commit()
         return True, "Estado actualizado correctamemte"
     except Exception as e:
@@ -2123,6 +2215,8 @@ def actualizar_orden_compra(oc_id, data):
             
         # Update Total
         cursor.execute("UPDATE ordenes_compra SET total_orden=? WHERE id=?", (total_orden, oc_id))
+        eventos.documento(conn, 'orden_compra', oc_id, fecha=data['fecha'], proveedor_id=data['proveedor_id'],
+                          estado='PENDIENTE', moneda=data['moneda'], total=total_orden)
         
         conn.commit()
         return True, "OC Actualizada"
@@ -2276,66 +2370,110 @@ def obtener_orden_compra(oc_id):
     finally:
         conn.close()
 
+LISTADO_ORDENES_COMPRA = paginacion.Listado(
+    columnas="""
+            oc.id, 
+            oc.fecha_emision,
+            oc.fecha_emision as fecha,
+            p.razon_social as proveedor_nombre,
+            oc.total_orden as total,
+            oc.estado,
+            oc.moneda
+    """,
+    desde="ordenes_compra oc LEFT JOIN proveedores p ON oc.proveedor_id = p.id",
+    claves=["oc.id"],
+    orden={"id": "oc.id", "fecha": "oc.fecha_emision", "proveedor_nombre": "p.razon_social",
+           "total": "oc.total_orden", "estado": "oc.estado"},
+    orden_defecto="-id",
+    filtros={
+        "start_date": "oc.fecha_emision >= ?",
+        "end_date": "oc.fecha_emision <= ?",
+        "provider_id": "oc.proveedor_id = ?",
+        "product_id": "oc.id IN (SELECT oc_id FROM ordenes_compra_det WHERE producto_id = ?)",
+        "estado": "oc.estado = ?",
+    },
+)
+SQL_ORDENES_COMPRA = f"""
+        SELECT {LISTADO_ORDENES_COMPRA.columnas}
+        FROM {LISTADO_ORDENES_COMPRA.desde}
+        ORDER BY oc.id DESC
+"""
+
 def obtener_ordenes_compra():
     """Retorna lista de todas las OCs para el grid"""
     conn = get_connection()
     try:
-        query = """
-            SELECT 
-                oc.id, 
-                oc.fecha_emision,
-                oc.fecha_emision as fecha,
-                p.razon_social as proveedor_nombre,
-                oc.total_orden as total,
-                oc.estado,
-                oc.moneda
-            FROM ordenes_compra oc
-            LEFT JOIN proveedores p ON oc.proveedor_id = p.id
-            ORDER BY oc.id DESC
-        """
-        df = pd.read_sql(query, conn)
+        df = pd.read_sql(SQL_ORDENES_COMPRA, conn)
         return df
     finally:
         conn.close()
 
-def obtener_productos_extendido():
+def obtener_ordenes_compra_filas():
+    """Órdenes de compra como filas (sin pandas) para la API"""
+    conn = get_connection()
+    try:
+        return filas.consultar(conn, SQL_ORDENES_COMPRA)
+    finally:
+        conn.close()
+
+LISTADO_PRODUCTOS = paginacion.Listado(
+    columnas="""
+            p.id, 
+            p.codigo_sku, 
+            p.nombre, 
+            p.unidad_medida, 
+            p.costo_promedio,
+            (SELECT COALESCE(SUM(sa.stock_actual), 0) FROM stock_almacen sa WHERE sa.producto_id = p.id) as stock_actual,
+            c.nombre as categoria_nombre
+    """,
+    desde="productos p LEFT JOIN categorias c ON p.categoria_id = c.id",
+    claves=["p.id"],
+    orden={"id": "p.id", "codigo_sku": "p.codigo_sku", "nombre": "p.nombre", "categoria_nombre": "c.nombre"},
+    orden_defecto="id",
+    filtros={
+        "categoria_id": "p.categoria_id = ?",
+        "almacen_id": "p.id IN (SELECT producto_id FROM stock_almacen WHERE almacen_id = ?)",
+    },
+)
+SQL_PRODUCTOS_EXTENDIDO = f"""
+        SELECT {LISTADO_PRODUCTOS.columnas}
+        FROM {LISTADO_PRODUCTOS.desde}
+        ORDER BY p.id
+"""
+
+def obtener_productos_extendido(conn=None):
     """
     Retorna productos con info extendida (Categoria, UM) para el inventario.
     """
-    conn = get_connection()
+    conn = conn or get_connection()
     try:
-        query = """
-            SELECT 
-                p.id, 
-                p.codigo_sku, 
-                p.nombre, 
-                p.unidad_medida, 
-                p.costo_promedio,
-                COALESCE(SUM(sa.stock_actual), 0) as stock_actual,
-                c.nombre as categoria_nombre
-            FROM productos p
-            LEFT JOIN stock_almacen sa ON p.id = sa.producto_id
-            LEFT JOIN categorias c ON p.categoria_id = c.id
-            GROUP BY p.id
-        """
-        df = pd.read_sql(query, conn)
+        df = pd.read_sql(SQL_PRODUCTOS_EXTENDIDO, conn)
         return df
     finally:
         conn.close()
 
+def obtener_productos_extendido_filas(conn=None):
+    """Productos con stock global como filas (sin pandas) para la API"""
+    conn = conn or get_connection()
+    try:
+        return filas.consultar(conn, SQL_PRODUCTOS_EXTENDIDO)
+    finally:
+        conn.close()
+
 def carga_masiva_stock_inicial(df, almacen_id):
     """
     Carga masiva de inventario inicial por almacén.
     Columns: CodigoSKU, Cantidad, CostoUnitario
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    log_errors = []
-    processed = 0
-    updated_products = 0
+    def operacion(conn):
+        cursor = conn.cursor()
     
-    try:
+        log_errors = []
+        processed = 0
+        updated_products = 0
+        pids_cargados = []
+        fecha_carga = datetime.now().strftime("%Y-%m-%d")
+        
         # Expected columns validation - Case Insensitive for user friendliness
         # Map input columns to required
         cols_map = {c.lower(): c for c in df.columns}
@@ -2374,11 +2512,13 @@ def carga_masiva_stock_inicial(df, almacen_id):
             old_stock_almacen = 0.0
             if stock_row:
                 old_stock_almacen = stock_row[1]
+                stock_id = stock_row[0]
                 # Update existing record
                 cursor.execute("UPDATE stock_almacen SET stock_actual = ? WHERE id=?", (qty, stock_row[0]))
             else:
                 # Insert new record
                 cursor.execute("INSERT INTO stock_almacen (producto_id, almacen_id, stock_actual) VALUES (?, ?, ?)", (pid, almacen_id, qty))
+                stock_id = cursor.lastrowid
                 
             # 2. Update Product Global Stock (Re-calculate from all warehouses to be safe)
             # Or just Add Difference?
@@ -2388,24 +2528,34 @@ def carga_masiva_stock_inicial(df, almacen_id):
             diff = qty - old_stock_almacen
             cursor.execute("UPDATE productos SET stock_actual = stock_actual + ? WHERE id=?", (diff, pid))
             
+            # Libro de movimientos: el ajuste queda como STOCK INICIAL
+            if diff != 0:
+                movimientos.registrar_movimiento(
+                    cursor, fecha_carga, pid, almacen_id, diff, cost,
+                    movimientos.STOCK_INICIAL, 'Carga Inicial', 'Carga masiva', 'stock_almacen', stock_id
+                )
+            
             # 3. Update Average Cost if provided and > 0
             if cost > 0:
                 cursor.execute("UPDATE productos SET costo_promedio = ? WHERE id=?", (cost, pid))
                 
+            pids_cargados.append(pid)
+            eventos.stock(conn, pid, almacen_id)
             processed += 1
             
-        conn.commit()
+        alertas.evaluar_productos(cursor, pids_cargados)
+        if pids_cargados:
+            versiones.incrementar(cursor, versiones.STOCK)
         
         msg = f"Carga Exitosa. {processed} productos actualizados."
         if log_errors:
              msg += f" Errores ({len(log_errors)}): {'; '.join(log_errors[:3])}..."
         return msg
         
+    try:
+        return ejecutar_escritura("carga_masiva_stock_inicial", operacion, agrupable=False)
     except Exception as e:
-        conn.rollback()
         return f"Error en carga masiva: {str(e)}"
-    finally:
-        conn.close()
 
 # --- GESTION DE GUIAS DE REMISION ---
 
@@ -2424,9 +2574,8 @@ def crear_guia_remision(data):
         "observaciones": str (optional)
     }
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    def operacion(conn):
+        cursor = conn.cursor()
         # 0. Validate/Fetch Provider
         proveedor_id = data.get('proveedor_id')
         oc_id = data.get('oc_id')
@@ -2470,20 +2619,17 @@ def crear_guia_remision(data):
                 VALUES (?, ?, ?, ?)
             """, (guia_id, item['pid'], item['cantidad'], almacen_id))
             
-        conn.commit()
+        eventos.documento(conn, 'guia', guia_id, fecha=data['fecha_recepcion'], proveedor_id=proveedor_id,
+                          oc_id=oc_id, numero=data['numero_guia'])
         return True, guia_id
+
+    try:
+        return ejecutar_escritura("crear_guia_remision", operacion)
     except Exception as e:
-        conn.rollback()
         return False, str(e)
-    finally:
-        conn.close()
 
-def obtener_guias():
-    conn = get_connection()
-    # Check if table exists just in case (though we checked via python earlier)
-    # The previous check confirmed table exists.
-    query = """
-        SELECT 
+LISTADO_GUIAS = paginacion.Listado(
+    columnas="""
             g.id,
             g.fecha_recepcion,
             g.fecha_recepcion as fecha,
@@ -2491,8 +2637,26 @@ def obtener_guias():
             p.razon_social as proveedor,
             g.oc_id,
             (SELECT COUNT(*) FROM guias_remision_det WHERE guia_id = g.id) as items_count
-        FROM guias_remision g
-        JOIN proveedores p ON g.proveedor_id = p.id
+    """,
+    desde="guias_remision g JOIN proveedores p ON g.proveedor_id = p.id",
+    claves=["g.id"],
+    orden={"fecha": "g.fecha_recepcion", "id": "g.id", "numero_guia": "g.numero_guia", "proveedor": "p.razon_social"},
+    orden_defecto="-fecha",
+    filtros={
+        "start_date": "g.fecha_recepcion >= ?",
+        "end_date": "g.fecha_recepcion <= ?",
+        "provider_id": "g.proveedor_id = ?",
+        "product_id": "g.id IN (SELECT guia_id FROM guias_remision_det WHERE producto_id = ?)",
+        "almacen_id": "g.id IN (SELECT guia_id FROM guias_remision_det WHERE almacen_destino_id = ?)",
+    },
+    nulo=None,
+)
+
+def obtener_guias():
+    conn = get_connection()
+    query = f"""
+        SELECT {LISTADO_GUIAS.columnas}
+        FROM {LISTADO_GUIAS.desde}
         ORDER BY g.fecha_recepcion DESC
     """
     try:
@@ -2663,14 +2827,14 @@ def crear_proveedor(data):
     try:
         # Check if RUC exists
         if data.get('ruc'):
-            cursor.execute("SELECT id FROM proveedores WHERE ruc=?", (data['ruc'],))
+            cursor.execute("SELECT id FROM proveedores WHERE ruc_dni=?", (data['ruc'],))
             existing = cursor.fetchone()
             if existing:
                 return False, f"El proveedor con RUC {data['ruc']} ya existe."
 
         cursor.execute("""
-            INSERT INTO proveedores (ruc, razon_social, direccion, telefono, email, fecha_registro)
-            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            INSERT INTO proveedores (ruc_dni, razon_social, direccion, telefono, email)
+            VALUES (?, ?, ?, ?, ?)
         """, (
             data.get('ruc'),
             data['razon_social'],
@@ -2678,6 +2842,7 @@ def crear_proveedor(data):
             data.get('telefono'),
             data.get('email')
         ))
+        versiones.incrementar(cursor, versiones.PROVEEDORES)
         conn.commit()
         return True, "Proveedor creado exitosamente"
     except Exception as e:
@@ -2698,10 +2863,9 @@ def crear_categoria(nombre, descripcion=""):
         if cursor.fetchone():
             return False, f"La categoría '{nombre}' ya existe."
 
-        cursor.execute("""
-            INSERT INTO categorias (nombre, descripcion)
-            VALUES (?, ?)
-        """, (nombre, descripcion))
+        # categorias solo tiene nombre; la descripción del formulario no se guarda
+        cursor.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
+        versiones.incrementar(cursor, versiones.CATEGORIAS)
         conn.commit()
         return True, "Categoría creada exitosamente"
     except Exception as e:
@@ -2735,6 +2899,7 @@ def crear_almacen(nombre, ubicacion=""):
         # `obtener_stock_global` suma todo.
         # `stock_almacen` tiene (producto_id, almacen_id).
         
+        versiones.incrementar(cursor, versiones.ALMACENES)
         conn.commit()
         return True, "Almacén creado exitosamente"
     except Exception as e:
@@ -2808,3 +2973,25 @@ def eliminar_usuario(user_id):
     finally:
         conn.close()
 
+# --- LISTADOS PAGINADOS (API) ---
+
+LISTADOS = {
+    'productos': LISTADO_PRODUCTOS,
+    'compras': LISTADO_COMPRAS,
+    'compras_detalle': LISTADO_COMPRAS_DETALLE,
+    'salidas': LISTADO_SALIDAS,
+    'traslados': LISTADO_TRASLADOS,
+    'ordenes_compra': LISTADO_ORDENES_COMPRA,
+    'guias': LISTADO_GUIAS,
+}
+
+def obtener_listado_pagina(nombre, filtros=None, sort=None, limit=None, cursor=None, conn=None):
+    """
+    Página de un listado de LISTADOS con filtros, orden y paginación keyset.
+    Retorna (items, total, next_cursor). Parámetros inválidos -> ValueError.
+    """
+    conn = conn or get_connection_reportes()
+    try:
+        return paginacion.pagina(conn, LISTADOS[nombre], filtros, sort, limit, cursor)
+    finally:
+        conn.close()
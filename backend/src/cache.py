@@ -0,0 +1,94 @@
+"""
+Caché de resultados en memoria (LRU con TTL) invalidada por versión de datos.
+Cada entrada guarda la versión de datos vigente al calcularse; si la versión
+cambió (hubo un commit de escritura en el pool), la entrada se descarta y se
+recalcula. El TTL acota la antigüedad ante escrituras que no pasan por el pool
+(scripts externos sobre el mismo archivo).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Segundos que una entrada se considera válida aunque la versión no cambie.
+TTL_POR_DEFECTO = 300.0
+# Entradas máximas; al superarlo se descarta la usada hace más tiempo.
+MAX_ENTRADAS_POR_DEFECTO = 256
+
+
+class CacheResultados:
+    """Caché LRU acotada con TTL e invalidación por versión de datos, con estadísticas."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_POR_DEFECTO, ttl=TTL_POR_DEFECTO, version=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        # Función sin argumentos que retorna la versión actual de los datos
+        self._version = version or (lambda: 0)
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (valor, version, creado)
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expiradas": 0,
+            "invalidadas": 0,
+            "descartadas_lru": 0,
+        }
+
+    def obtener(self, clave):
+        """Retorna (encontrado, valor)."""
+        version = self._version()
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                valor, version_entrada, creado = entrada
+                if version_entrada != version:
+                    del self._entradas[clave]
+                    self._stats["invalidadas"] += 1
+                elif ahora - creado > self.ttl:
+                    del self._entradas[clave]
+                    self._stats["expiradas"] += 1
+                else:
+                    self._entradas.move_to_end(clave)
+                    self._stats["hits"] += 1
+                    return True, valor
+            self._stats["misses"] += 1
+            return False, None
+
+    def guardar(self, clave, valor, version=None):
+        """Guarda `valor`; `version` es la vigente cuando se empezó a calcular."""
+        if version is None:
+            version = self._version()
+        with self._lock:
+            self._entradas[clave] = (valor, version, time.monotonic())
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._stats["descartadas_lru"] += 1
+
+    def obtener_o_calcular(self, clave, funcion):
+        """Retorna el valor en caché o lo calcula con funcion() y lo guarda."""
+        # Versión leída antes de calcular: una escritura concurrente deja la entrada ya vencida
+        version = self._version()
+        encontrado, valor = self.obtener(clave)
+        if encontrado:
+            return valor
+        valor = funcion()
+        self.guardar(clave, valor, version)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Retorna dict con hits, misses, invalidaciones, tamaño y tasa de aciertos."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entradas"] = len(self._entradas)
+            stats["max_entradas"] = self.max_entradas
+            stats["ttl"] = self.ttl
+        consultas = stats["hits"] + stats["misses"]
+        stats["tasa_aciertos"] = stats["hits"] / consultas if consultas else 0.0
+        stats["version_datos"] = self._version()
+        return stats
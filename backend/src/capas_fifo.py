@@ -0,0 +1,204 @@
+"""
+Capas de costo FIFO persistentes.
+Cada línea de compra abre una capa (cantidad y costo unitario en PEN) y cada
+salida consume las capas más antiguas del producto. La valorización vigente
+es así una sola lectura agregada sobre las capas con saldo.
+"""
+
+from src import motor_fifo, movimientos
+from src.motor_fifo import TC_DEFECTO
+
+IGV_FACTOR = 1.18
+
+DDL_CAPAS_FIFO = [
+    """CREATE TABLE IF NOT EXISTS capas_fifo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER NOT NULL,
+        compra_detalle_id INTEGER,
+        fecha DATE NOT NULL,
+        cantidad_inicial REAL NOT NULL,
+        cantidad_restante REAL NOT NULL,
+        costo_unitario_pen REAL NOT NULL,
+        FOREIGN KEY(producto_id) REFERENCES productos(id),
+        FOREIGN KEY(compra_detalle_id) REFERENCES compras_detalle(id)
+    )""",
+    # Solo capas con saldo: es lo que recorren el consumo y la valorización
+    """CREATE INDEX IF NOT EXISTS idx_capas_fifo_abiertas
+        ON capas_fifo(producto_id, fecha, id) WHERE cantidad_restante > 0""",
+    "CREATE INDEX IF NOT EXISTS idx_capas_fifo_compra_det ON capas_fifo(compra_detalle_id)",
+]
+
+
+def crear_tabla(cursor):
+    for ddl in DDL_CAPAS_FIFO:
+        cursor.execute(ddl)
+
+
+def costo_unitario_pen(precio_unitario, moneda, tipo_cambio):
+    """Precio de compra convertido a PEN con el T.C. del documento (o el de defecto)"""
+    if moneda == 'USD':
+        return precio_unitario * (tipo_cambio or TC_DEFECTO)
+    return precio_unitario
+
+
+def abrir_capa(cursor, producto_id, compra_detalle_id, fecha, cantidad, costo_pen):
+    """
+    Registra una nueva capa de costo para una línea de compra.
+    Si la compra es anterior a capas ya consumidas, o hay salidas que no
+    encontraron capa, se re-aplican las salidas del producto en orden FIFO.
+    """
+    cursor.execute("""
+        INSERT INTO capas_fifo (producto_id, compra_detalle_id, fecha, cantidad_inicial, cantidad_restante, costo_unitario_pen)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (producto_id, compra_detalle_id, fecha, cantidad, cantidad, costo_pen))
+
+    cursor.execute("""
+        SELECT TOTAL(cantidad_inicial - cantidad_restante),
+               EXISTS(SELECT 1 FROM capas_fifo
+                      WHERE producto_id = ? AND fecha > ? AND cantidad_restante < cantidad_inicial)
+        FROM capas_fifo WHERE producto_id = ?
+    """, (producto_id, fecha, producto_id))
+    consumido, hay_posteriores = cursor.fetchone()
+    cursor.execute("SELECT TOTAL(cantidad) FROM salidas_detalle WHERE producto_id = ?", (producto_id,))
+    total_salidas = cursor.fetchone()[0]
+
+    if hay_posteriores or total_salidas > consumido + 1e-9:
+        reaplicar_salidas(cursor, producto_id, total_salidas)
+        estampar_costos_salidas(cursor, producto_id)
+
+
+def reaplicar_salidas(cursor, producto_id, total_salidas=None):
+    """Restablece las capas del producto y consume de nuevo el total de sus salidas"""
+    if total_salidas is None:
+        cursor.execute("SELECT TOTAL(cantidad) FROM salidas_detalle WHERE producto_id = ?", (producto_id,))
+        total_salidas = cursor.fetchone()[0]
+    cursor.execute(
+        "UPDATE capas_fifo SET cantidad_restante = cantidad_inicial WHERE producto_id = ?",
+        (producto_id,)
+    )
+    consumir_capas(cursor, producto_id, total_salidas)
+
+
+def consumir_capas(cursor, producto_id, cantidad):
+    """
+    Consume `cantidad` de las capas más antiguas del producto.
+    Retorna (cantidad_consumida, costo_total_pen). Si no hay saldo suficiente
+    en capas se consume lo disponible; el faltante lo absorbe la próxima
+    compra del producto (ver abrir_capa).
+    """
+    pendiente = float(cantidad)
+    costo_total = 0.0
+    consumido = 0.0
+    if pendiente <= 0:
+        return consumido, costo_total
+
+    cursor.execute("""
+        SELECT id, cantidad_restante, costo_unitario_pen
+        FROM capas_fifo
+        WHERE producto_id = ? AND cantidad_restante > 0
+        ORDER BY fecha ASC, id ASC
+    """, (producto_id,))
+    capas = cursor.fetchall()
+
+    for capa_id, restante, costo in capas:
+        if pendiente <= 0:
+            break
+        tomado = min(restante, pendiente)
+        cursor.execute(
+            "UPDATE capas_fifo SET cantidad_restante = ? WHERE id = ?",
+            (restante - tomado if restante > pendiente else 0.0, capa_id)
+        )
+        costo_total += tomado * costo
+        consumido += tomado
+        pendiente -= tomado
+
+    return consumido, costo_total
+
+
+def registrar_consumo_salida(cursor, salida_detalle_id, producto_id, fecha, cantidad):
+    """
+    Consume las capas para una línea de salida y le estampa su costo FIFO
+    (costo_unitario y costo_total en PEN). Si la salida es anterior a otras
+    ya registradas del producto, se recalcula el costo de todas sus salidas.
+    """
+    consumido, costo_total = consumir_capas(cursor, producto_id, cantidad)
+    costo_unitario = costo_total / cantidad if cantidad else 0.0
+    cursor.execute("""
+        UPDATE salidas_detalle SET costo_unitario = ?, costo_total = ? WHERE id = ?
+    """, (costo_unitario, costo_total, salida_detalle_id))
+    movimientos.actualizar_costos_salidas(cursor, [(costo_unitario, salida_detalle_id)])
+
+    cursor.execute("""
+        SELECT EXISTS(
+            SELECT 1 FROM salidas_detalle sd
+            JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+            WHERE sd.producto_id = ? AND sc.fecha > ?
+        )
+    """, (producto_id, fecha))
+    if cursor.fetchone()[0]:
+        estampar_costos_salidas(cursor, producto_id)
+    return costo_total
+
+
+def estampar_costos_salidas(cursor, producto_id=None):
+    """
+    Recalcula y guarda el costo FIFO de las líneas de salida (de un producto o
+    de todas), consumiendo en orden fecha, salida, línea. Retorna filas actualizadas.
+    """
+    entradas = motor_fifo.cargar_entradas(cursor, producto_id=producto_id)
+    salidas = motor_fifo.cargar_salidas(cursor, producto_id=producto_id)
+    valores = motor_fifo.calcular(entradas, salidas)['valor_salida']
+    cantidades = salidas['cantidad']
+    unitarios = [v / q if q else 0.0 for v, q in zip(valores.tolist(), cantidades.tolist())]
+    ids = salidas['id'].tolist()
+    cursor.executemany(
+        "UPDATE salidas_detalle SET costo_unitario = ?, costo_total = ? WHERE id = ?",
+        zip(unitarios, valores.tolist(), ids)
+    )
+    movimientos.actualizar_costos_salidas(cursor, zip(unitarios, ids))
+    return len(unitarios)
+
+
+def valorizar(conn, incluir_igv=True):
+    """
+    Retorna (total, {producto_id: {'nombre', 'stock', 'valor'}}) para todos los
+    productos, leyendo el saldo vigente de las capas.
+    """
+    divisor = 1.0 if incluir_igv else IGV_FACTOR
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT p.id, p.nombre,
+               TOTAL(c.cantidad_restante) as stock,
+               TOTAL(c.cantidad_restante * c.costo_unitario_pen) as valor
+        FROM productos p
+        LEFT JOIN capas_fifo c ON c.producto_id = p.id AND c.cantidad_restante > 0
+        GROUP BY p.id
+    """)
+    total = 0.0
+    detalle = {}
+    for pid, nombre, stock, valor in cursor.fetchall():
+        valor = valor / divisor
+        total += valor
+        detalle[pid] = {'nombre': nombre, 'stock': stock, 'valor': valor}
+    return total, detalle
+
+
+def reconstruir_capas(cursor):
+    """
+    Regenera capas_fifo desde el historial de compras y salidas.
+    Las salidas de cada producto consumen las compras más antiguas
+    (orden fecha_emision, id de compra, id de línea). Retorna el número de capas.
+    """
+    entradas = motor_fifo.cargar_entradas(cursor)
+    salidas = motor_fifo.cargar_salidas(cursor)
+    restante = motor_fifo.calcular(entradas, salidas)['restante']
+
+    cursor.execute("DELETE FROM capas_fifo")
+    cursor.executemany("""
+        INSERT INTO capas_fifo (producto_id, compra_detalle_id, fecha, cantidad_inicial, cantidad_restante, costo_unitario_pen)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, zip(
+        entradas['producto_id'].tolist(), entradas['id'].tolist(), entradas['fecha'],
+        entradas['cantidad'].tolist(), restante.tolist(), entradas['costo_pen'].tolist()
+    ))
+    return len(entradas['fecha'])
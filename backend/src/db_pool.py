@@ -0,0 +1,466 @@
+"""
+Pool de conexiones SQLite.
+Mantiene un número acotado de conexiones reutilizables para evitar abrir un
+sqlite3.connect() por cada consulta. Cada conexión se configura una sola vez
+(WAL, synchronous=NORMAL, cache, mmap, foreign_keys) y vuelve al pool al
+llamar a close(), por lo que el código existente (conn.close() en finally)
+sigue funcionando sin cambios.
+
+Los reportes usan un pool aparte de solo lectura (get_pool(..., solo_lectura=True)):
+conexiones abiertas con URI mode=ro y query_only, cada préstamo dentro de una
+transacción de lectura (una instantánea WAL consistente hasta el close()). Así
+un reporte largo no ocupa las conexiones de las operaciones ni puede escribir.
+
+Cada pool acumula además consultas ejecutadas, filas retornadas y tiempo dentro
+de SQLite (CursorMedido), exportados en /metrics.
+"""
+
+import gc
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Tamaño del pool: conexiones que se mantienen abiertas en reposo.
+TAMANO_POOL = 5
+# Conexiones adicionales permitidas en picos; se cierran al devolverse.
+DESBORDE_MAXIMO = 10
+# Segundos que espera un hilo por una conexión antes de fallar.
+TIMEOUT_ESPERA = 30.0
+# Pool de reportes (solo lectura): acotado aparte del transaccional.
+TAMANO_POOL_LECTURA = 4
+DESBORDE_LECTURA = 8
+
+PRAGMAS_POR_DEFECTO = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -20000),       # ~20 MB de page cache por conexión
+    ("mmap_size", 268435456),     # 256 MB de lectura mapeada en memoria
+    ("foreign_keys", "ON"),
+    ("busy_timeout", 5000),
+    ("temp_store", "MEMORY"),
+)
+
+# journal_mode no se puede cambiar en solo lectura: la base ya está en WAL (pool transaccional)
+PRAGMAS_LECTURA = (
+    ("query_only", "ON"),
+    ("cache_size", -20000),
+    ("mmap_size", 268435456),
+    ("busy_timeout", 5000),
+    ("temp_store", "MEMORY"),
+)
+
+
+_reloj = time.perf_counter
+
+
+class PoolAgotadoError(sqlite3.OperationalError):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera."""
+
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que suma al pool de su conexión las consultas, las filas leídas y el
+    tiempo en SQLite (execute + fetch; la ejecución de una consulta ocurre
+    en parte al leer sus filas).
+    """
+
+    def execute(self, sql, parametros=()):
+        inicio = _reloj()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self.connection._medir(1, 0, _reloj() - inicio)
+
+    def executemany(self, sql, parametros):
+        inicio = _reloj()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            self.connection._medir(1, 0, _reloj() - inicio)
+
+    def executescript(self, script):
+        inicio = _reloj()
+        try:
+            return super().executescript(script)
+        finally:
+            self.connection._medir(1, 0, _reloj() - inicio)
+
+    def fetchone(self):
+        inicio = _reloj()
+        fila = super().fetchone()
+        self.connection._medir(0, fila is not None, _reloj() - inicio)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = _reloj()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self.connection._medir(0, len(filas), _reloj() - inicio)
+        return filas
+
+    def fetchall(self):
+        inicio = _reloj()
+        filas = super().fetchall()
+        self.connection._medir(0, len(filas), _reloj() - inicio)
+        return filas
+
+    def __next__(self):
+        inicio = _reloj()
+        fila = super().__next__()
+        self.connection._medir(0, 1, _reloj() - inicio)
+        return fila
+
+
+class ConexionPool(sqlite3.Connection):
+    """
+    Conexión sqlite3 asociada a un pool.
+    close() la devuelve al pool; cerrar_real() la cierra de verdad.
+    Al ser subclase de sqlite3.Connection, pd.read_sql la acepta igual que antes.
+    Sus cursores (también los de execute()) son CursorMedido.
+    """
+
+    # Funciones a ejecutar tras el próximo commit (ver tareas_al_confirmar)
+    _tareas = None
+    # True mientras una petición la tiene (conexion_peticion): close() no la devuelve
+    _retenida = False
+
+    def commit(self):
+        # Un commit con transacción abierta es una escritura: sube la versión de datos del pool
+        escribio = self.in_transaction
+        super().commit()
+        pool = getattr(self, "_pool", None)
+        if escribio and pool is not None:
+            pool._registrar_escritura()
+        tareas, self._tareas = self._tareas, None
+        for tarea in tareas or ():
+            try:
+                tarea()
+            except Exception as e:
+                print(f"⚠️ Error en tarea posterior al commit: {e}")
+
+    def rollback(self):
+        super().rollback()
+        self._tareas = None
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    # Connection.execute* crean su cursor sin pasar por cursor(): se redirigen
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def _medir(self, consultas, filas, segundos):
+        # Sin pool no se mide; _crear() lo reemplaza por pool._registrar_consulta
+        pass
+
+    def tareas_al_confirmar(self):
+        """
+        Lista de funciones sin argumentos que se ejecutan, en orden, después del
+        próximo commit; rollback() o devolver la conexión al pool las descarta.
+        """
+        if self._tareas is None:
+            self._tareas = []
+        return self._tareas
+
+    def close(self):
+        if self._retenida:
+            return
+        pool = getattr(self, "_pool", None)
+        if pool is None:
+            super().close()
+            return
+        pool._devolver(self)
+
+    def cerrar_real(self):
+        try:
+            # Refresca las estadísticas del planificador si quedaron desactualizadas
+            self.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        super().close()
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones a un archivo SQLite con estadísticas de uso."""
+
+    def __init__(self, db_path, tamano=TAMANO_POOL, desborde=DESBORDE_MAXIMO,
+                 timeout=TIMEOUT_ESPERA, pragmas=PRAGMAS_POR_DEFECTO,
+                 factory=ConexionPool, solo_lectura=False):
+        self.db_path = db_path
+        self.tamano = tamano
+        self.desborde = desborde
+        self.timeout = timeout
+        self.pragmas = PRAGMAS_LECTURA if solo_lectura and pragmas is PRAGMAS_POR_DEFECTO else pragmas
+        self.factory = factory
+        self.solo_lectura = solo_lectura
+
+        # RLock: el callback de GC (_recolectada) puede dispararse dentro de una sección bloqueada
+        self._lock = threading.RLock()
+        self._disponible = threading.Condition(self._lock)
+        self._libres = deque()
+        self._prestadas = {}
+        self._total = 0
+        self._cerrado = False
+        # Sube con cada commit de escritura; invalida cachés de resultados
+        self._version_datos = 0
+
+        self._stats = {
+            "creadas": 0,
+            "cerradas": 0,
+            "checkouts": 0,
+            "esperas": 0,
+            "tiempo_espera_total": 0.0,
+            "tiempo_espera_max": 0.0,
+            "timeouts": 0,
+            "fugas": 0,
+        }
+        # [consultas, filas, segundos en SQLite] por hilo: cada consulta suma en el
+        # de su hilo sin tomar un lock; estadisticas() los agrega
+        self._medicion_hilo = threading.local()
+        self._mediciones = []
+
+    # --- Ciclo de vida de conexiones ---
+
+    def _crear(self):
+        if self.solo_lectura:
+            uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=self.factory)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=self.factory)
+        for nombre, valor in self.pragmas:
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        conn._pool = self
+        conn._medir = self._registrar_consulta
+        conn._prestada = False
+        return conn
+
+    def obtener(self):
+        """Presta una conexión (bloquea hasta `timeout` si el pool está lleno)."""
+        inicio = time.perf_counter()
+        espero = False
+        recolecto = False
+        with self._lock:
+            while True:
+                if self._cerrado:
+                    raise sqlite3.ProgrammingError("El pool de conexiones está cerrado")
+                if self._libres:
+                    conn = self._libres.popleft()
+                    break
+                if self._total < self.tamano + self.desborde:
+                    self._total += 1
+                    conn = None
+                    break
+                if not recolecto:
+                    # Conexiones perdidas por excepciones sin close() solo se liberan
+                    # en la recolección de ciclos (sqlite3 mantiene un ciclo interno).
+                    recolecto = True
+                    gc.collect()
+                    continue
+                restante = self.timeout - (time.perf_counter() - inicio)
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolAgotadoError(
+                        f"Sin conexiones disponibles tras {self.timeout}s "
+                        f"({self._total} en uso)"
+                    )
+                espero = True
+                self._disponible.wait(restante)
+
+        if conn is None:
+            try:
+                conn = self._crear()
+            except Exception:
+                with self._lock:
+                    self._total -= 1
+                    self._disponible.notify()
+                raise
+            with self._lock:
+                self._stats["creadas"] += 1
+
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            conn._prestada = True
+            self._prestadas[id(conn)] = weakref.ref(conn, self._recolectada_factory(id(conn)))
+            self._stats["checkouts"] += 1
+            if espero:
+                self._stats["esperas"] += 1
+            self._stats["tiempo_espera_total"] += espera
+            if espera > self._stats["tiempo_espera_max"]:
+                self._stats["tiempo_espera_max"] = espera
+        if self.solo_lectura:
+            # Instantánea WAL por préstamo: todas las consultas del reporte ven el mismo
+            # estado aunque haya commits entre ellas; _devolver() la termina (rollback)
+            conn.execute("BEGIN")
+        return conn
+
+    def _recolectada_factory(self, clave):
+        # Si una función pierde la conexión sin cerrarla, el GC libera el cupo.
+        def _recolectada(_ref):
+            with self._lock:
+                if self._prestadas.pop(clave, None) is not None:
+                    self._total -= 1
+                    self._stats["fugas"] += 1
+                    self._disponible.notify()
+        return _recolectada
+
+    def _devolver(self, conn):
+        if not getattr(conn, "_prestada", False):
+            return  # close() repetido: se ignora
+        conn._prestada = False
+        conn._tareas = None
+
+        reutilizable = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.text_factory = str
+        except sqlite3.Error:
+            reutilizable = False
+
+        with self._lock:
+            self._prestadas.pop(id(conn), None)
+            if reutilizable and not self._cerrado and len(self._libres) < self.tamano:
+                self._libres.append(conn)
+                conn = None
+            else:
+                self._total -= 1
+                self._stats["cerradas"] += 1
+            self._disponible.notify()
+
+        if conn is not None:
+            try:
+                conn.cerrar_real()
+            except sqlite3.Error:
+                pass
+
+    def conexion_dedicada(self):
+        """
+        Conexión configurada como las del pool pero fuera del préstamo (escritor
+        único): no ocupa cupo, close() no la afecta y se cierra con cerrar_real().
+        Sus commits suben la versión de datos igual que los de las prestadas.
+        """
+        return self._crear()
+
+    def _registrar_consulta(self, consultas, filas, segundos):
+        try:
+            medicion = self._medicion_hilo.valores
+        except AttributeError:
+            medicion = self._medicion_hilo.valores = [0, 0, 0.0]
+            with self._lock:
+                self._mediciones.append(medicion)
+        medicion[0] += consultas
+        medicion[1] += filas
+        medicion[2] += segundos
+
+    def _registrar_escritura(self):
+        with self._lock:
+            self._version_datos += 1
+
+    def version_datos(self):
+        """Contador de commits de escritura hechos por conexiones de este pool."""
+        return self._version_datos
+
+    @contextmanager
+    def conexion(self):
+        """Context manager: `with pool.conexion() as conn: ...`"""
+        conn = self.obtener()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def conexion_peticion(self, transaccion=False):
+        """
+        Una conexión para toda una petición (unidad de trabajo): las funciones que
+        la reciben en `conn` la usan y su close() no la devuelve; se devuelve al
+        salir. transaccion=True abre BEGIN al inicio (una sola instantánea; las del
+        pool de lectura ya la tienen). Al salir se confirma si hubo escrituras y
+        se deshace si hubo un error.
+        """
+        conn = self.obtener()
+        conn._retenida = True
+        cambios = conn.total_changes
+        try:
+            if transaccion and not conn.in_transaction:
+                conn.execute("BEGIN")
+            yield conn
+            if conn.in_transaction and conn.total_changes != cambios:
+                conn.commit()
+        finally:
+            conn._retenida = False
+            conn.close()  # _devolver() deshace lo que quedó abierto
+
+    def cerrar(self):
+        """Cierra las conexiones libres y rechaza nuevos préstamos."""
+        with self._lock:
+            self._cerrado = True
+            libres = list(self._libres)
+            self._libres.clear()
+            self._total -= len(libres)
+            self._stats["cerradas"] += len(libres)
+            self._disponible.notify_all()
+        for conn in libres:
+            try:
+                conn.cerrar_real()
+            except sqlite3.Error:
+                pass
+
+    def estadisticas(self):
+        """Retorna dict con contadores de uso, tiempos de espera y consultas del pool."""
+        with self._lock:
+            stats = dict(self._stats)
+            mediciones = list(self._mediciones)
+            stats["en_uso"] = self._total - len(self._libres)
+            stats["libres"] = len(self._libres)
+            stats["abiertas"] = self._total
+            stats["tamano"] = self.tamano
+            stats["desborde"] = self.desborde
+            stats["version_datos"] = self._version_datos
+        checkouts = stats["checkouts"]
+        stats["tiempo_espera_promedio"] = stats["tiempo_espera_total"] / checkouts if checkouts else 0.0
+        stats["consultas"] = sum(m[0] for m in mediciones)
+        stats["filas"] = sum(m[1] for m in mediciones)
+        stats["tiempo_sqlite"] = sum(m[2] for m in mediciones)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **opciones):
+    """
+    Retorna el pool (único por proceso) asociado al archivo de base de datos;
+    solo_lectura=True retorna el de reportes, con su propio tamaño por defecto.
+    """
+    solo_lectura = opciones.get("solo_lectura", False)
+    if solo_lectura:
+        opciones.setdefault("tamano", TAMANO_POOL_LECTURA)
+        opciones.setdefault("desborde", DESBORDE_LECTURA)
+    clave = (os.path.abspath(db_path), solo_lectura)
+    with _pools_lock:
+        pool = _pools.get(clave)
+        if pool is None:
+            pool = PoolConexiones(db_path, **opciones)
+            _pools[clave] = pool
+        return pool
+
+
+def estadisticas_pools():
+    """Retorna estadísticas de todos los pools abiertos, por ruta de archivo."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {f"{ruta} (lectura)" if solo_lectura else ruta: pool.estadisticas()
+            for (ruta, solo_lectura), pool in pools.items()}
@@ -0,0 +1,258 @@
+"""
+Escritor único: serializa las escrituras de documentos y stock en una sola
+conexión, atendida por un hilo dedicado.
+
+Con transacciones diferidas, dos conexiones del pool que leen stock_almacen y
+luego escriben chocan al pasar de lectura a escritura ("database is locked") o
+escriben sobre un stock ya desactualizado. Aquí cada operación corre dentro de
+BEGIN IMMEDIATE: el bloqueo de escritura se toma antes de la primera lectura,
+así que validar el stock y descontarlo es atómico.
+
+Las operaciones que ya esperan en la cola cuando el escritor queda libre se
+agrupan en una transacción (un solo COMMIT); cada una corre en su propio
+SAVEPOINT, de modo que si falla solo se deshacen sus cambios y sus eventos.
+Las operaciones con agrupable=False (cargas masivas) van solas. BEGIN y
+COMMIT se reintentan con backoff si otra conexión tiene la base bloqueada.
+"""
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from src.db_pool import get_pool
+
+# Operaciones por transacción como máximo (solo se agrupan las que ya están en cola)
+MAX_LOTE = 32
+# Reintentos de BEGIN IMMEDIATE / COMMIT con la base bloqueada por otra conexión
+REINTENTOS = 8
+BACKOFF_INICIAL = 0.05
+BACKOFF_MAXIMO = 1.0
+# Espera de SQLite por intento; el resto lo cubre el backoff
+BUSY_TIMEOUT_MS = 250
+
+
+class _Pendiente:
+    """Operación encolada y su resultado."""
+
+    __slots__ = ("nombre", "operacion", "agrupable", "encolada", "inicio", "fin",
+                 "resultado", "error", "listo")
+
+    def __init__(self, nombre, operacion, agrupable):
+        self.nombre = nombre
+        self.operacion = operacion
+        self.agrupable = agrupable
+        self.encolada = time.perf_counter()
+        self.inicio = self.fin = None
+        self.resultado = None
+        self.error = None
+        self.listo = threading.Event()
+
+
+def _bloqueada(error):
+    mensaje = str(error).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+
+class EscritorUnico:
+    """Cola de escrituras sobre una conexión dedicada a un archivo SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._conn = None
+        self._stats = {
+            "lotes": 0,
+            "operaciones": 0,
+            "errores": 0,
+            "reintentos": 0,
+            "lotes_fallidos": 0,
+            "lote_max": 0,
+        }
+        self._por_operacion = {}
+
+    # --- API ---
+
+    def ejecutar(self, nombre, operacion, agrupable=True):
+        """
+        Ejecuta operacion(conn) en la conexión de escritura y retorna su resultado
+        una vez confirmado. Si la operación (o el commit) falla, sus cambios se
+        deshacen y la excepción se relanza aquí. La operación no debe llamar a
+        commit(), rollback() ni close().
+        """
+        if threading.current_thread() is self._hilo:
+            # Llamada anidada desde otra operación: corre dentro de la misma transacción
+            return operacion(self._conn)
+        pendiente = _Pendiente(nombre, operacion, agrupable)
+        self._iniciar()
+        self._cola.put(pendiente)
+        pendiente.listo.wait()
+        if pendiente.error is not None:
+            raise pendiente.error
+        return pendiente.resultado
+
+    def cerrar(self):
+        """Procesa lo encolado, detiene el hilo y cierra la conexión."""
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            self._cola.put(None)
+            hilo.join()
+
+    def estadisticas(self):
+        """Contadores globales y, por operación, espera en cola y latencia de commit (segundos)."""
+        with self._lock:
+            stats = dict(self._stats)
+            por_operacion = {nombre: dict(valores) for nombre, valores in self._por_operacion.items()}
+        stats["en_cola"] = self._cola.qsize()
+        stats["operaciones_por_lote"] = stats["operaciones"] / stats["lotes"] if stats["lotes"] else 0.0
+        for valores in por_operacion.values():
+            n = valores["operaciones"]
+            valores["espera_cola_promedio"] = valores["espera_cola_total"] / n if n else 0.0
+            valores["commit_promedio"] = valores["commit_total"] / n if n else 0.0
+        stats["por_operacion"] = por_operacion
+        return stats
+
+    # --- Hilo escritor ---
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="escritor-sqlite", daemon=True)
+                self._hilo.start()
+
+    def _conexion(self):
+        if self._conn is None:
+            conn = get_pool(self.db_path).conexion_dedicada()
+            conn.isolation_level = None  # transacciones explícitas (BEGIN IMMEDIATE)
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._conn = conn
+        return self._conn
+
+    def _bucle(self):
+        siguiente = None
+        while True:
+            pendiente = siguiente if siguiente is not None else self._cola.get()
+            siguiente = None
+            if pendiente is None:
+                break
+            lote = [pendiente]
+            while pendiente.agrupable and len(lote) < MAX_LOTE:
+                try:
+                    otra = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if otra is None or not otra.agrupable:
+                    siguiente = otra
+                    break
+                lote.append(otra)
+            self._procesar(lote)
+        if self._conn is not None:
+            self._conn.cerrar_real()
+            self._conn = None
+
+    def _reintentar(self, paso):
+        """Ejecuta paso() reintentando con backoff exponencial mientras la base esté bloqueada"""
+        espera = BACKOFF_INICIAL
+        for intento in range(REINTENTOS + 1):
+            try:
+                return paso()
+            except sqlite3.OperationalError as e:
+                if not _bloqueada(e) or intento == REINTENTOS:
+                    raise
+            with self._lock:
+                self._stats["reintentos"] += 1
+            time.sleep(espera * (0.5 + random.random()))
+            espera = min(espera * 2, BACKOFF_MAXIMO)
+
+    def _procesar(self, lote):
+        conn = None
+        duracion_commit = 0.0
+        try:
+            conn = self._conexion()
+            self._reintentar(lambda: conn.execute("BEGIN IMMEDIATE"))
+            tareas = []
+            for pendiente in lote:
+                pendiente.inicio = time.perf_counter()
+                conn._tareas = None
+                conn.execute("SAVEPOINT operacion")
+                try:
+                    pendiente.resultado = pendiente.operacion(conn)
+                except Exception as e:
+                    pendiente.error = e
+                    # Deshace solo esta operación; sus eventos (tareas) se descartan
+                    conn.execute("ROLLBACK TO operacion")
+                else:
+                    tareas.extend(conn._tareas or ())
+                finally:
+                    conn.row_factory = None
+                    pendiente.fin = time.perf_counter()
+                conn.execute("RELEASE operacion")
+            conn._tareas = tareas
+            inicio_commit = time.perf_counter()
+            self._reintentar(conn.commit)
+            duracion_commit = time.perf_counter() - inicio_commit
+        except Exception as e:
+            # Falló BEGIN, COMMIT o la transacción misma: ninguna operación del lote quedó confirmada
+            if conn is not None and conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    conn.cerrar_real()
+                    self._conn = None
+            for pendiente in lote:
+                pendiente.error = pendiente.error or e
+            with self._lock:
+                self._stats["lotes_fallidos"] += 1
+        finally:
+            self._registrar(lote, duracion_commit)
+            for pendiente in lote:
+                pendiente.listo.set()
+
+    def _registrar(self, lote, duracion_commit):
+        with self._lock:
+            self._stats["lotes"] += 1
+            self._stats["operaciones"] += len(lote)
+            self._stats["lote_max"] = max(self._stats["lote_max"], len(lote))
+            for pendiente in lote:
+                valores = self._por_operacion.setdefault(pendiente.nombre, {
+                    "operaciones": 0, "errores": 0,
+                    "espera_cola_total": 0.0, "espera_cola_max": 0.0,
+                    "commit_total": 0.0, "commit_max": 0.0,
+                })
+                espera = (pendiente.inicio or time.perf_counter()) - pendiente.encolada
+                valores["operaciones"] += 1
+                valores["espera_cola_total"] += espera
+                valores["espera_cola_max"] = max(valores["espera_cola_max"], espera)
+                valores["commit_total"] += duracion_commit
+                valores["commit_max"] = max(valores["commit_max"], duracion_commit)
+                if pendiente.error is not None:
+                    valores["errores"] += 1
+                    self._stats["errores"] += 1
+
+
+_escritores = {}
+_escritores_lock = threading.Lock()
+
+
+def get_escritor(db_path):
+    """Retorna el escritor (único por proceso) asociado al archivo de base de datos."""
+    clave = os.path.abspath(db_path)
+    with _escritores_lock:
+        escritor = _escritores.get(clave)
+        if escritor is None:
+            escritor = EscritorUnico(db_path)
+            _escritores[clave] = escritor
+        return escritor
+
+
+def cerrar_escritores():
+    """Detiene todos los escritores (shutdown de la app)."""
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+    for escritor in escritores:
+        escritor.cerrar()
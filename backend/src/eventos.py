@@ -0,0 +1,194 @@
+"""
+Eventos en vivo para los clientes (Server-Sent Events, /api/events).
+Las escrituras de backend.py anotan deltas compactos en su conexión:
+stock por (producto, almacén), documentos nuevos o cambiados y altas/bajas
+de alertas. Se publican solo si la transacción se confirma (tareas del pool
+tras el commit) y el broker los reparte a cada suscriptor por su event loop.
+
+Cada evento tiene un id creciente. El broker guarda los últimos HISTORIAL
+eventos para que un cliente que se reconecta con Last-Event-ID reciba lo que
+se perdió; si ya no están (o su cola se llenó) recibe 'resync' y recarga.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+# Tipos de evento
+STOCK = 'stock'
+DOCUMENTO = 'documento'
+ALERTA = 'alerta'
+PRODUCTO_ELIMINADO = 'producto_eliminado'
+RESYNC = 'resync'
+
+# Eventos recientes que se conservan para reconexiones (Last-Event-ID)
+HISTORIAL = 1000
+# Eventos pendientes por cliente; si un cliente lento la llena, recibe 'resync'
+MAX_COLA = 500
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente, consumida desde su event loop."""
+
+    def __init__(self, loop, max_cola=MAX_COLA):
+        self.loop = loop
+        self._cola = asyncio.Queue(max_cola)
+        self.desbordes = 0
+
+    def _entregar(self, evento):
+        # Corre en self.loop
+        if self._cola.full():
+            # Cliente atrasado: se descarta lo pendiente y se le pide recargar
+            while not self._cola.empty():
+                self._cola.get_nowait()
+            self.desbordes += 1
+            evento = {"id": evento["id"], "tipo": RESYNC, "datos": {"motivo": "cola_llena"}}
+        self._cola.put_nowait(evento)
+
+    async def siguiente(self, timeout=None):
+        """Próximo evento, o None si no llega ninguno en `timeout` segundos."""
+        try:
+            return await asyncio.wait_for(self._cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BrokerEventos:
+    """Reparte eventos del proceso a los suscriptores SSE, con historial acotado."""
+
+    def __init__(self, historial=HISTORIAL, max_cola=MAX_COLA):
+        self.max_cola = max_cola
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._historial = deque(maxlen=historial)
+        # Ids a partir del arranque en ms: un Last-Event-ID de un proceso anterior no coincide
+        self._ultimo_id = int(time.time() * 1000)
+        self._stats = {"publicados": 0, "entregas": 0, "suscripciones_totales": 0, "reenviados": 0, "resyncs": 0}
+
+    def suscribir(self, loop, ultimo_id=None):
+        """
+        Registra un cliente. Con `ultimo_id` (Last-Event-ID) se le reenvían los
+        eventos posteriores del historial, o un 'resync' si ya no están.
+        Se llama desde el event loop `loop` del cliente.
+        """
+        sus = Suscripcion(loop, self.max_cola)
+        with self._lock:
+            if ultimo_id is not None and ultimo_id != self._ultimo_id:
+                if ultimo_id < self._ultimo_id and self._historial and self._historial[0]["id"] <= ultimo_id + 1:
+                    pendientes = [e for e in self._historial if e["id"] > ultimo_id]
+                    self._stats["reenviados"] += len(pendientes)
+                else:
+                    pendientes = [{"id": self._ultimo_id, "tipo": RESYNC, "datos": {"motivo": "historial"}}]
+                    self._stats["resyncs"] += 1
+                for evento in pendientes:
+                    sus._entregar(evento)
+            self._suscripciones.add(sus)
+            self._stats["suscripciones_totales"] += 1
+        return sus
+
+    def cancelar(self, sus):
+        with self._lock:
+            self._suscripciones.discard(sus)
+
+    def publicar(self, tipo, datos):
+        """Publica un evento a todos los suscriptores (desde cualquier hilo). Retorna el evento."""
+        with self._lock:
+            self._ultimo_id += 1
+            evento = {"id": self._ultimo_id, "tipo": tipo, "datos": datos}
+            self._historial.append(evento)
+            suscripciones = list(self._suscripciones)
+            self._stats["publicados"] += 1
+        for sus in suscripciones:
+            try:
+                sus.loop.call_soon_threadsafe(sus._entregar, evento)
+            except RuntimeError:
+                # Event loop cerrado: el cliente ya no existe
+                self.cancelar(sus)
+                continue
+            with self._lock:
+                self._stats["entregas"] += 1
+        return evento
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["suscriptores"] = len(self._suscripciones)
+            stats["ultimo_id"] = self._ultimo_id
+            stats["historial"] = len(self._historial)
+            stats["desbordes"] = sum(s.desbordes for s in self._suscripciones)
+        return stats
+
+
+broker = BrokerEventos()
+
+
+def formatear_sse(evento):
+    """Evento -> texto SSE (id, event, data en una línea JSON)"""
+    datos = json.dumps(evento["datos"], ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+# --- Deltas anotados por las escrituras ---
+
+class _Lote:
+    """Eventos de una transacción; se publican al ejecutarse como tarea posterior al commit."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.stock = {}      # (producto_id, almacen_id) -> None, en orden de llegada
+        self.eventos = []    # (tipo, datos)
+
+    def __call__(self):
+        # Stock: valor vigente leído tras el commit (idempotente para el cliente)
+        for producto_id, almacen_id in self.stock:
+            fila = self.conn.execute("""
+                SELECT COALESCE(sa.stock_actual, 0), p.stock_actual, p.costo_promedio
+                FROM productos p
+                LEFT JOIN stock_almacen sa ON sa.producto_id = p.id AND sa.almacen_id = ?
+                WHERE p.id = ?
+            """, (almacen_id, producto_id)).fetchone()
+            if fila:
+                broker.publicar(STOCK, {"producto_id": producto_id, "almacen_id": almacen_id,
+                                        "stock": fila[0], "stock_total": fila[1], "costo_promedio": fila[2]})
+        for tipo, datos in self.eventos:
+            broker.publicar(tipo, datos)
+
+
+def _lote(conn):
+    """Lote de la transacción en curso de `conn`, o None si no es una conexión del pool"""
+    tareas_al_confirmar = getattr(conn, "tareas_al_confirmar", None)
+    if tareas_al_confirmar is None:
+        return None  # conexión directa (scripts, migraciones): no hay clientes en este proceso
+    tareas = tareas_al_confirmar()
+    for tarea in tareas:
+        if isinstance(tarea, _Lote):
+            return tarea
+    lote = _Lote(conn)
+    tareas.append(lote)
+    return lote
+
+
+def activo(conn):
+    """True si lo que se anote en `conn` se publicará (conexión del pool)"""
+    return hasattr(conn, "tareas_al_confirmar")
+
+
+def emitir(conn, tipo, datos):
+    """Anota un evento a publicar cuando la transacción de `conn` se confirme"""
+    lote = _lote(conn)
+    if lote is not None:
+        lote.eventos.append((tipo, datos))
+
+
+def stock(conn, producto_id, almacen_id):
+    """Anota un cambio de stock; el evento lleva el stock vigente tras el commit"""
+    lote = _lote(conn)
+    if lote is not None:
+        lote.stock[(int(producto_id), int(almacen_id))] = None
+
+
+def documento(conn, tipo_documento, documento_id, **datos):
+    """Anota un documento nuevo o cambiado (compra, salida, traslado, guia, orden_compra)"""
+    emitir(conn, DOCUMENTO, dict(documento=tipo_documento, id=documento_id, **datos))
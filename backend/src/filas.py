@@ -0,0 +1,35 @@
+"""
+Consultas a filas planas (lista de dicts) sin pandas, y serialización JSON.
+Para los listados de la API: el cursor SQLite arma cada dict con su
+row_factory y la lista va directo al codificador JSON, sin construir un
+DataFrame, copiarlo en fillna() ni convertir celda por celda en to_dict().
+
+Los NULL se reemplazan explícitamente con `nulo` ("" por defecto, como el
+fillna("") de los endpoints); nulo=None los deja como null.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def consultar(conn, sql, params=(), nulo=""):
+    """Ejecuta `sql` y retorna [{columna: valor}] con los NULL reemplazados por `nulo`"""
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    columnas = tuple(d[0] for d in cursor.description)
+    if nulo is None:
+        cursor.row_factory = lambda _cur, fila: dict(zip(columnas, fila))
+    else:
+        cursor.row_factory = lambda _cur, fila: dict(zip(columnas, [nulo if v is None else v for v in fila]))
+    return cursor.fetchall()
+
+
+def a_json(datos):
+    """Serializa a JSON (bytes UTF-8): orjson si está instalado, si no json compacto"""
+    if orjson is not None:
+        return orjson.dumps(datos, default=str)
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
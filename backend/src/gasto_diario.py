@@ -0,0 +1,93 @@
+"""
+Hechos diarios de gasto en compras (gasto_diario_proveedor, gasto_diario_categoria).
+Acumulan por día el monto en PEN (total_pen / subtotal_pen ya estampados) por
+proveedor y por categoría, para que los gráficos del dashboard sumen una fila
+por día del rango en vez de cada factura y cada línea.
+
+Se mantienen al registrar: aplicar_compra(cursor, compra_id) suma la compra;
+con signo=-1 la resta (antes de editar o anular un documento). recalcular()
+regenera un rango (o todo) desde compras_cabecera / compras_detalle, necesario
+cuando cambian los montos PEN de muchas compras (carga de tipos de cambio).
+"""
+
+DDL_GASTO_DIARIO = [
+    # proveedor_id 0: compras sin proveedor (cuentan en la evolución diaria)
+    """CREATE TABLE IF NOT EXISTS gasto_diario_proveedor (
+        fecha TEXT NOT NULL,
+        proveedor_id INTEGER NOT NULL,
+        monto_pen REAL NOT NULL DEFAULT 0,
+        docs INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, proveedor_id)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS gasto_diario_categoria (
+        fecha TEXT NOT NULL,
+        categoria_id INTEGER NOT NULL,
+        monto_pen REAL NOT NULL DEFAULT 0,
+        lineas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, categoria_id)
+    ) WITHOUT ROWID""",
+]
+
+
+def crear_tabla(cursor):
+    for ddl in DDL_GASTO_DIARIO:
+        cursor.execute(ddl)
+
+
+def aplicar_compra(cursor, compra_id, signo=1):
+    """Suma (signo=1) o resta (signo=-1) una compra de los hechos diarios"""
+    cursor.execute("""
+        INSERT INTO gasto_diario_proveedor (fecha, proveedor_id, monto_pen, docs)
+        SELECT fecha_emision, COALESCE(proveedor_id, 0), ? * TOTAL(total_pen), ? * COUNT(*)
+        FROM compras_cabecera
+        WHERE id = ? AND fecha_emision IS NOT NULL
+        GROUP BY fecha_emision, COALESCE(proveedor_id, 0)
+        ON CONFLICT (fecha, proveedor_id) DO UPDATE SET
+            monto_pen = monto_pen + excluded.monto_pen,
+            docs = docs + excluded.docs
+    """, (signo, signo, compra_id))
+    cursor.execute("""
+        INSERT INTO gasto_diario_categoria (fecha, categoria_id, monto_pen, lineas)
+        SELECT cc.fecha_emision, p.categoria_id, ? * TOTAL(cd.subtotal_pen), ? * COUNT(*)
+        FROM compras_detalle cd
+        JOIN compras_cabecera cc ON cd.compra_id = cc.id
+        JOIN productos p ON cd.producto_id = p.id
+        WHERE cd.compra_id = ? AND cc.fecha_emision IS NOT NULL AND p.categoria_id IS NOT NULL
+        GROUP BY cc.fecha_emision, p.categoria_id
+        ON CONFLICT (fecha, categoria_id) DO UPDATE SET
+            monto_pen = monto_pen + excluded.monto_pen,
+            lineas = lineas + excluded.lineas
+    """, (signo, signo, compra_id))
+    if signo < 0:
+        cursor.execute("DELETE FROM gasto_diario_proveedor WHERE docs <= 0")
+        cursor.execute("DELETE FROM gasto_diario_categoria WHERE lineas <= 0")
+
+
+def recalcular(cursor, desde=None, hasta=None):
+    """
+    Regenera los hechos de las fechas entre desde y hasta (todas si no se indican).
+    Retorna el número de filas (día, proveedor) generadas.
+    """
+    filtro = "BETWEEN ? AND ?" if desde is not None and hasta is not None else "IS NOT NULL"
+    params = (str(desde), str(hasta)) if desde is not None and hasta is not None else ()
+    crear_tabla(cursor)
+    cursor.execute(f"DELETE FROM gasto_diario_proveedor WHERE fecha {filtro}", params)
+    cursor.execute(f"DELETE FROM gasto_diario_categoria WHERE fecha {filtro}", params)
+    cursor.execute(f"""
+        INSERT INTO gasto_diario_proveedor (fecha, proveedor_id, monto_pen, docs)
+        SELECT fecha_emision, COALESCE(proveedor_id, 0), TOTAL(total_pen), COUNT(*)
+        FROM compras_cabecera
+        WHERE fecha_emision {filtro}
+        GROUP BY fecha_emision, COALESCE(proveedor_id, 0)
+    """, params)
+    n = cursor.rowcount
+    cursor.execute(f"""
+        INSERT INTO gasto_diario_categoria (fecha, categoria_id, monto_pen, lineas)
+        SELECT cc.fecha_emision, p.categoria_id, TOTAL(cd.subtotal_pen), COUNT(*)
+        FROM compras_detalle cd
+        JOIN compras_cabecera cc ON cd.compra_id = cc.id
+        JOIN productos p ON cd.producto_id = p.id
+        WHERE cc.fecha_emision {filtro} AND p.categoria_id IS NOT NULL
+        GROUP BY cc.fecha_emision, p.categoria_id
+    """, params)
+    return n
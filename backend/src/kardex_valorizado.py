@@ -0,0 +1,243 @@
+"""
+Kardex valorizado (Registro de Inventario Permanente Valorizado, formato 13.1 SUNAT).
+Recorre movimientos_inventario una sola vez en orden (producto, fecha, id) y
+lleva por producto el saldo en cantidad y valor, con costo FIFO (PEPS) o
+promedio ponderado. Las filas se producen a medida que se leen, para poder
+exportar un ejercicio completo sin armar el resultado en memoria.
+"""
+
+from collections import deque
+
+from src import movimientos
+from src.capas_fifo import IGV_FACTOR
+
+METODO_FIFO = 'fifo'
+METODO_PROMEDIO = 'promedio'
+
+# Tabla 12 SUNAT (tipo de operación)
+OPERACIONES = {
+    movimientos.COMPRA: '02',
+    movimientos.SALIDA: '10',
+    movimientos.TRASLADO_SALIDA: '11',
+    movimientos.TRASLADO_ENTRADA: '11',
+    movimientos.STOCK_INICIAL: '16',
+}
+OPERACION_SALDO_INICIAL = '16'
+
+DECIMALES = 6
+
+# Tabla 10 SUNAT (tipo de comprobante): compras con factura, el resto documento interno
+TIPO_DOC_FACTURA = '01'
+TIPO_DOC_OTROS = '00'
+
+COLUMNAS = [
+    'Fecha', 'CodigoSKU', 'Producto', 'UM', 'TipoDoc', 'Documento', 'TipoOperacion', 'Movimiento',
+    'EntradaCantidad', 'EntradaCostoUnitario', 'EntradaCostoTotal',
+    'SalidaCantidad', 'SalidaCostoUnitario', 'SalidaCostoTotal',
+    'SaldoCantidad', 'SaldoCostoUnitario', 'SaldoCostoTotal',
+]
+
+
+class _Saldo:
+    """
+    Saldo en cantidad y valor de un producto. Una salida sin stock deja saldo
+    negativo valorizado al último costo; la siguiente entrada repone primero
+    ese faltante al mismo costo con que salió.
+    """
+
+    def __init__(self):
+        self.cantidad = 0.0
+        self.valor = 0.0
+        self.ultimo_costo = 0.0
+
+    def costo_unitario(self):
+        if self.cantidad:
+            return self.valor / self.cantidad
+        return self.ultimo_costo
+
+    def entrada(self, cantidad, costo):
+        resto = cantidad
+        if self.cantidad < 0:
+            cubre = min(cantidad, -self.cantidad)
+            self.valor += cubre * self.costo_unitario()
+            self.cantidad += cubre
+            resto -= cubre
+            if abs(self.cantidad) < 1e-9:
+                self.cantidad, self.valor = 0.0, 0.0
+        if resto > 0:
+            self._agregar(resto, costo)
+            self.cantidad += resto
+            self.valor += resto * costo
+        self.ultimo_costo = costo
+        return cantidad * costo
+
+    def salida(self, cantidad):
+        valor = self._consumir(cantidad)
+        self.cantidad -= cantidad
+        self.valor = 0.0 if abs(self.cantidad) < 1e-9 else self.valor - valor
+        return valor
+
+
+class _SaldoPromedio(_Saldo):
+    """Costo promedio ponderado móvil"""
+
+    def _agregar(self, cantidad, costo):
+        pass
+
+    def costo_salida(self, cantidad):
+        if self.cantidad > 0:
+            return cantidad * self.valor / self.cantidad
+        return cantidad * self.ultimo_costo
+
+    _consumir = costo_salida
+
+
+class _SaldoFIFO(_Saldo):
+    """Capas de costo del producto; las salidas consumen las más antiguas"""
+
+    def __init__(self):
+        super().__init__()
+        self.capas = deque()
+
+    def _agregar(self, cantidad, costo):
+        self.capas.append([cantidad, costo])
+
+    def costo_salida(self, cantidad):
+        """Valor de una salida sin consumir las capas (traslados entre almacenes)"""
+        valor = 0.0
+        pendiente = cantidad
+        for disponible, costo in self.capas:
+            if pendiente <= 0:
+                break
+            tomado = min(disponible, pendiente)
+            valor += tomado * costo
+            pendiente -= tomado
+        # Lo que no tenía capa se valoriza al último costo conocido
+        return valor + max(pendiente, 0.0) * self.ultimo_costo
+
+    def _consumir(self, cantidad):
+        valor = 0.0
+        pendiente = cantidad
+        capas = self.capas
+        while pendiente > 0 and capas:
+            capa = capas[0]
+            if capa[0] <= pendiente:
+                valor += capa[0] * capa[1]
+                pendiente -= capa[0]
+                capas.popleft()
+            else:
+                valor += pendiente * capa[1]
+                capa[0] -= pendiente
+                pendiente = 0.0
+        return valor + max(pendiente, 0.0) * self.ultimo_costo
+
+
+def _fila(fecha, producto, tipo_doc, documento, operacion, movimiento,
+          entrada, salida, saldo_cantidad, saldo_valor):
+    """entrada/salida: (cantidad, valor) o None"""
+    sku, nombre, um = producto
+    e_cant, e_val = entrada or (0.0, 0.0)
+    s_cant, s_val = salida or (0.0, 0.0)
+    numeros = (
+        e_cant, e_val / e_cant if e_cant else 0.0, e_val,
+        s_cant, s_val / s_cant if s_cant else 0.0, s_val,
+        saldo_cantidad, saldo_valor / saldo_cantidad if saldo_cantidad else 0.0, saldo_valor,
+    )
+    return dict(zip(COLUMNAS, (fecha, sku, nombre, um, tipo_doc, documento, operacion, movimiento)
+                    + tuple(round(n, DECIMALES) for n in numeros)))
+
+
+def generar(cursor, start_date, end_date, metodo=METODO_FIFO, producto_id=None, incluir_igv=True):
+    """
+    Produce las filas del kardex valorizado entre start_date y end_date.
+    Por cada producto, una fila 'SALDO INICIAL' (si tiene saldo previo) y una
+    por movimiento, con entrada, salida y saldo en cantidad, costo unitario y total.
+    El historial anterior a start_date solo se usa para llegar al saldo inicial.
+    Las compras se valorizan a su costo en PEN (sin IGV si incluir_igv=False).
+    """
+    if metodo not in (METODO_FIFO, METODO_PROMEDIO):
+        raise ValueError(f"Método de costeo inválido: {metodo}")
+    clase_saldo = _SaldoFIFO if metodo == METODO_FIFO else _SaldoPromedio
+    divisor_compra = 1.0 if incluir_igv else IGV_FACTOR
+
+    cursor.execute("SELECT id, codigo_sku, nombre, unidad_medida FROM productos")
+    productos = {pid: (sku, nombre, um) for pid, sku, nombre, um in cursor.fetchall()}
+
+    filtro = ""
+    params = [end_date]
+    if producto_id is not None:
+        filtro = "AND producto_id = ?"
+        params.append(producto_id)
+    cursor.execute(f"""
+        SELECT producto_id, fecha, cantidad, costo_unitario, tipo, documento, ref_id
+        FROM movimientos_inventario
+        WHERE fecha <= ? {filtro}
+        ORDER BY producto_id, fecha, id
+    """, params)
+
+    actual = None
+    saldo = None
+    abierto = False  # ya se emitió el saldo inicial del producto actual
+    traslados = {}   # valor de la salida de cada traslado, para su entrada
+
+    def saldo_inicial():
+        if saldo.cantidad or saldo.valor:
+            return _fila(start_date, productos.get(actual, ('', '', '')), TIPO_DOC_OTROS, 'SALDO INICIAL',
+                         OPERACION_SALDO_INICIAL, 'SALDO INICIAL', None, None, saldo.cantidad, saldo.valor)
+        return None
+
+    while True:
+        lote = cursor.fetchmany(1000)
+        if not lote:
+            break
+        for pid, fecha, cantidad, costo, tipo, documento, ref_id in lote:
+            if pid != actual:
+                if actual is not None and not abierto:
+                    fila = saldo_inicial()
+                    if fila:
+                        yield fila
+                actual, saldo, abierto = pid, clase_saldo(), False
+                traslados.clear()
+
+            en_rango = fecha >= start_date
+            if en_rango and not abierto:
+                fila = saldo_inicial()
+                if fila:
+                    yield fila
+                abierto = True
+
+            costo = costo or 0.0
+            if tipo == movimientos.COMPRA:
+                costo = costo / divisor_compra
+
+            if tipo in (movimientos.TRASLADO_SALIDA, movimientos.TRASLADO_ENTRADA):
+                # Movimiento interno: no altera el costo del producto
+                if cantidad < 0:
+                    valor = saldo.costo_salida(-cantidad)
+                    traslados[ref_id] = valor
+                    saldo.cantidad += cantidad
+                    saldo.valor -= valor
+                else:
+                    valor = traslados.pop(ref_id, cantidad * saldo.costo_unitario())
+                    saldo.cantidad += cantidad
+                    saldo.valor += valor
+            elif cantidad >= 0:
+                valor = saldo.entrada(cantidad, costo if costo > 0 else saldo.costo_unitario())
+            else:
+                valor = saldo.salida(-cantidad)
+
+            if not en_rango:
+                continue
+            movimiento = (cantidad, valor) if cantidad >= 0 else None
+            salida = (-cantidad, valor) if cantidad < 0 else None
+            yield _fila(
+                fecha, productos.get(pid, ('', '', '')),
+                TIPO_DOC_FACTURA if tipo == movimientos.COMPRA else TIPO_DOC_OTROS,
+                documento, OPERACIONES.get(tipo, '99'), tipo,
+                movimiento, salida, saldo.cantidad, saldo.valor
+            )
+
+    if actual is not None and not abierto:
+        fila = saldo_inicial()
+        if fila:
+            yield fila
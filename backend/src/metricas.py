@@ -0,0 +1,246 @@
+"""
+Métricas de la API en el formato de texto de Prometheus (GET /metrics).
+
+MiddlewareMetricas (ASGI) mide cada petición por método y plantilla de ruta
+(/api/orders/{oid}, no la URL, para no crear una serie por id): cantidad y
+histograma de latencia por código de estado, y peticiones en curso.
+
+Exposicion arma el texto: cada familia (HELP, TYPE y sus muestras) sale una
+sola vez y contigua aunque se agregue desde varias fuentes. Las funciones
+exportar_* traducen a familias las estadísticas que ya llevan los pools
+SQLite (conexiones, consultas, filas, tiempo en SQLite), la caché del
+dashboard, el escritor único y los ejecutores async.
+"""
+
+import bisect
+import math
+import threading
+import time
+
+from starlette.routing import WebSocketRoute
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites superiores (segundos) de los buckets de latencia: los por defecto de Prometheus
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Ruta de las peticiones que no coinciden con ninguna (404): una sola serie para todas
+SIN_RUTA = "<sin ruta>"
+# (método, path) ya resueltos a su plantilla; se vacía al llenarse (paths con ids)
+MAX_RUTAS_RESUELTAS = 2048
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        if math.isnan(valor):
+            return "NaN"
+        if math.isinf(valor):
+            return "+Inf" if valor > 0 else "-Inf"
+        return repr(valor)
+    return str(int(valor))
+
+
+class Exposicion:
+    """Texto de exposición de Prometheus; las familias salen en el orden en que se agregaron."""
+
+    def __init__(self):
+        self._familias = {}  # nombre -> (tipo, ayuda, [líneas])
+
+    def agregar(self, nombre, tipo, ayuda, valor, etiquetas=None, sufijo=""):
+        """Muestra `valor` de la familia `nombre` (counter, gauge o histogram)"""
+        lineas = self._familias.setdefault(nombre, (tipo, ayuda, []))[2]
+        if etiquetas:
+            texto = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas.items())
+            lineas.append(f"{nombre}{sufijo}{{{texto}}} {_numero(valor)}")
+        else:
+            lineas.append(f"{nombre}{sufijo} {_numero(valor)}")
+
+    def histograma(self, nombre, ayuda, etiquetas, buckets, conteos, suma):
+        """conteos: observaciones por bucket (no acumuladas), con el de +Inf al final"""
+        acumulado = 0
+        for limite, conteo in zip(buckets + (math.inf,), conteos):
+            acumulado += conteo
+            self.agregar(nombre, "histogram", ayuda, acumulado,
+                         {**etiquetas, "le": _numero(float(limite))}, "_bucket")
+        self.agregar(nombre, "histogram", ayuda, suma, etiquetas, "_sum")
+        self.agregar(nombre, "histogram", ayuda, acumulado, etiquetas, "_count")
+
+    def texto(self):
+        partes = []
+        for nombre, (tipo, ayuda, lineas) in self._familias.items():
+            partes.append(f"# HELP {nombre} {ayuda}")
+            partes.append(f"# TYPE {nombre} {tipo}")
+            partes.extend(lineas)
+        return "\n".join(partes) + "\n"
+
+
+class RegistroHTTP:
+    """Peticiones por (método, ruta, estado) con su histograma de latencia, y peticiones en curso."""
+
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._en_curso = {}    # (metodo, ruta) -> peticiones
+        self._latencias = {}   # (metodo, ruta, estado) -> [conteos por bucket + Inf, suma]
+
+    def iniciar(self, metodo, ruta):
+        with self._lock:
+            self._en_curso[(metodo, ruta)] = self._en_curso.get((metodo, ruta), 0) + 1
+
+    def terminar(self, metodo, ruta, estado, segundos):
+        # bisect_left: un valor igual al límite cae en ese bucket (le = "menor o igual")
+        indice = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            self._en_curso[(metodo, ruta)] -= 1
+            valores = self._latencias.get((metodo, ruta, estado))
+            if valores is None:
+                valores = self._latencias[(metodo, ruta, estado)] = [[0] * (len(self.buckets) + 1), 0.0]
+            valores[0][indice] += 1
+            valores[1] += segundos
+
+    def exportar(self, expo):
+        with self._lock:
+            en_curso = dict(self._en_curso)
+            latencias = {clave: (list(conteos), suma) for clave, (conteos, suma) in self._latencias.items()}
+        for (metodo, ruta, estado), (conteos, _) in sorted(latencias.items()):
+            expo.agregar("erp_http_requests_total", "counter", "Peticiones HTTP atendidas",
+                         sum(conteos), {"method": metodo, "route": ruta, "status": estado})
+        for (metodo, ruta, estado), (conteos, suma) in sorted(latencias.items()):
+            expo.histograma("erp_http_request_duration_seconds",
+                            "Latencia de las peticiones HTTP hasta enviar la respuesta completa",
+                            {"method": metodo, "route": ruta, "status": estado}, self.buckets, conteos, suma)
+        for (metodo, ruta), cantidad in sorted(en_curso.items()):
+            expo.agregar("erp_http_requests_in_flight", "gauge", "Peticiones HTTP en curso",
+                         cantidad, {"method": metodo, "route": ruta})
+
+
+def plantilla_ruta(router, scope):
+    """
+    Plantilla de la ruta que atenderá la petición: la primera cuyo patrón y método
+    coinciden, como en el router (solo el patrón compilado, sin Route.matches(),
+    que además arma el scope del endpoint y convierte los parámetros).
+    """
+    metodo = scope["method"]
+    path = scope["path"]
+    raiz = scope.get("root_path", "")
+    if raiz and path.startswith(raiz):
+        path = path[len(raiz):] or "/"
+    parcial = None
+    for ruta in router.routes:
+        if isinstance(ruta, WebSocketRoute) or not ruta.path_regex.match(path):
+            continue
+        metodos = getattr(ruta, "methods", None)
+        if metodos is None or metodo in metodos:
+            return ruta.path
+        if parcial is None:
+            parcial = ruta.path  # la ruta existe con otro método (405)
+    return parcial or SIN_RUTA
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI que registra cada petición HTTP en `registro`. Mide hasta
+    enviar la respuesta completa (en un streaming, hasta el último fragmento).
+    La ruta se resuelve antes de atender la petición para contarla en curso.
+    """
+
+    def __init__(self, app, registro, router):
+        self.app = app
+        self.registro = registro
+        self.router = router
+        self._resueltas = {}
+
+    def _ruta(self, scope):
+        clave = (scope["method"], scope["path"])
+        ruta = self._resueltas.get(clave)
+        if ruta is None:
+            if len(self._resueltas) >= MAX_RUTAS_RESUELTAS:
+                self._resueltas.clear()
+            ruta = self._resueltas[clave] = plantilla_ruta(self.router, scope)
+        return ruta
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metodo = scope["method"]
+        ruta = self._ruta(scope)
+        estado = 500  # excepción sin respuesta: ServerErrorMiddleware responde 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        self.registro.iniciar(metodo, ruta)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            self.registro.terminar(metodo, ruta, estado, time.perf_counter() - inicio)
+
+
+# --- Estadísticas existentes -> familias de Prometheus ---
+
+def exportar_pool(expo, nombre, stats):
+    """Estadísticas de un PoolConexiones (db_pool.estadisticas())"""
+    etiquetas = {"pool": nombre}
+    for familia, tipo, ayuda, clave in (
+        ("erp_db_connections_opened_total", "counter", "Conexiones SQLite abiertas", "creadas"),
+        ("erp_db_connections_closed_total", "counter", "Conexiones SQLite cerradas", "cerradas"),
+        ("erp_db_connections_open", "gauge", "Conexiones SQLite abiertas ahora", "abiertas"),
+        ("erp_db_connections_in_use", "gauge", "Conexiones prestadas ahora", "en_uso"),
+        ("erp_db_pool_checkouts_total", "counter", "Préstamos de conexión", "checkouts"),
+        ("erp_db_pool_waits_total", "counter", "Préstamos que esperaron una conexión libre", "esperas"),
+        ("erp_db_pool_wait_seconds_total", "counter", "Tiempo esperando conexiones", "tiempo_espera_total"),
+        ("erp_db_pool_timeouts_total", "counter", "Préstamos fallidos por pool agotado", "timeouts"),
+        ("erp_db_connection_leaks_total", "counter", "Conexiones perdidas sin close() (liberadas por el GC)", "fugas"),
+        ("erp_db_queries_total", "counter", "Sentencias SQL ejecutadas", "consultas"),
+        ("erp_db_rows_returned_total", "counter", "Filas leídas de los cursores", "filas"),
+        ("erp_db_query_seconds_total", "counter", "Tiempo dentro de SQLite (execute y fetch)", "tiempo_sqlite"),
+    ):
+        expo.agregar(familia, tipo, ayuda, stats[clave], etiquetas)
+
+
+def exportar_cache(expo, nombre, stats):
+    """Estadísticas de una CacheResultados"""
+    etiquetas = {"cache": nombre}
+    expo.agregar("erp_cache_hits_total", "counter", "Aciertos de caché", stats["hits"], etiquetas)
+    expo.agregar("erp_cache_misses_total", "counter", "Fallos de caché", stats["misses"], etiquetas)
+    expo.agregar("erp_cache_invalidations_total", "counter", "Entradas descartadas por escrituras",
+                 stats["invalidadas"], etiquetas)
+    expo.agregar("erp_cache_entries", "gauge", "Entradas en caché", stats["entradas"], etiquetas)
+    expo.agregar("erp_cache_hit_ratio", "gauge", "Tasa de aciertos desde el arranque",
+                 stats["tasa_aciertos"], etiquetas)
+
+
+def exportar_escritor(expo, stats):
+    """Estadísticas del escritor único"""
+    for familia, tipo, ayuda, clave in (
+        ("erp_writer_batches_total", "counter", "Transacciones del escritor único", "lotes"),
+        ("erp_writer_operations_total", "counter", "Operaciones de escritura", "operaciones"),
+        ("erp_writer_errors_total", "counter", "Operaciones de escritura fallidas", "errores"),
+        ("erp_writer_retries_total", "counter", "Reintentos por base bloqueada", "reintentos"),
+        ("erp_writer_failed_batches_total", "counter", "Transacciones fallidas completas", "lotes_fallidos"),
+        ("erp_writer_queue_depth", "gauge", "Operaciones esperando al escritor", "en_cola"),
+    ):
+        expo.agregar(familia, tipo, ayuda, stats[clave])
+
+
+def exportar_ejecutores(expo, stats):
+    """Estadísticas de los ejecutores async ({nombre: estadisticas()})"""
+    for nombre, valores in stats.items():
+        etiquetas = {"executor": nombre}
+        for familia, tipo, ayuda, clave in (
+            ("erp_executor_tasks_total", "counter", "Tareas enviadas al ejecutor", "enviadas"),
+            ("erp_executor_errors_total", "counter", "Tareas terminadas con error", "errores"),
+            ("erp_executor_in_progress", "gauge", "Tareas ejecutándose", "en_curso"),
+            ("erp_executor_queued", "gauge", "Tareas esperando un hilo", "en_cola"),
+            ("erp_executor_queue_seconds_total", "counter", "Tiempo de espera en cola", "tiempo_cola_total"),
+        ):
+            expo.agregar(familia, tipo, ayuda, valores[clave], etiquetas)
@@ -0,0 +1,244 @@
+"""
+Migraciones versionadas del esquema SQLite.
+La versión aplicada se guarda en PRAGMA user_version; cada migración se
+ejecuta una sola vez, dentro de una transacción, y es idempotente
+(IF NOT EXISTS) para que pueda aplicarse sobre bases existentes.
+"""
+
+import sqlite3
+
+from src import alertas, capas_fifo, gasto_diario, movimientos, saldos, tipo_cambio, versiones
+
+
+# --- v1: Índices para joins y rangos de fecha ---
+
+INDICES_V1 = [
+    # Compras
+    "CREATE INDEX IF NOT EXISTS idx_compras_cab_fecha ON compras_cabecera(fecha_emision)",
+    "CREATE INDEX IF NOT EXISTS idx_compras_cab_proveedor ON compras_cabecera(proveedor_id, fecha_emision)",
+    "CREATE INDEX IF NOT EXISTS idx_compras_cab_oc ON compras_cabecera(orden_compra_id)",
+    "CREATE INDEX IF NOT EXISTS idx_compras_det_compra ON compras_detalle(compra_id)",
+    "CREATE INDEX IF NOT EXISTS idx_compras_det_producto ON compras_detalle(producto_id, compra_id)",
+    # Salidas
+    "CREATE INDEX IF NOT EXISTS idx_salidas_cab_fecha ON salidas_cabecera(fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_det_salida ON salidas_detalle(salida_id)",
+    "CREATE INDEX IF NOT EXISTS idx_salidas_det_producto ON salidas_detalle(producto_id, salida_id)",
+    # Traslados
+    "CREATE INDEX IF NOT EXISTS idx_traslados_cab_fecha ON traslados_cabecera(fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_traslados_det_traslado ON traslados_detalle(traslado_id)",
+    "CREATE INDEX IF NOT EXISTS idx_traslados_det_producto ON traslados_detalle(producto_id, traslado_id)",
+    # Guías y Órdenes de Compra
+    "CREATE INDEX IF NOT EXISTS idx_guias_oc ON guias_remision(oc_id)",
+    "CREATE INDEX IF NOT EXISTS idx_guias_fecha ON guias_remision(fecha_recepcion)",
+    "CREATE INDEX IF NOT EXISTS idx_guias_proveedor ON guias_remision(proveedor_id, numero_guia)",
+    "CREATE INDEX IF NOT EXISTS idx_guias_det_guia ON guias_remision_det(guia_id)",
+    "CREATE INDEX IF NOT EXISTS idx_guias_det_producto ON guias_remision_det(producto_id)",
+    "CREATE INDEX IF NOT EXISTS idx_oc_fecha ON ordenes_compra(fecha_emision)",
+    "CREATE INDEX IF NOT EXISTS idx_oc_det_oc ON ordenes_compra_det(oc_id, producto_id)",
+]
+
+
+def _v1_indices(cursor):
+    """Índices de joins/fechas y UNIQUE(producto_id, almacen_id) en stock_almacen"""
+    # Consolidar filas duplicadas de stock_almacen antes del índice único.
+    # Se suman las cantidades (es lo que ya mostraban los reportes con SUM)
+    # y se conserva la fila de menor id, que es la que actualizan las escrituras.
+    cursor.execute("""
+        SELECT producto_id, almacen_id, MIN(id), TOTAL(stock_actual), COUNT(*)
+        FROM stock_almacen
+        GROUP BY producto_id, almacen_id
+        HAVING COUNT(*) > 1
+    """)
+    duplicados = cursor.fetchall()
+    for pid, alm_id, keep_id, total, cnt in duplicados:
+        cursor.execute("UPDATE stock_almacen SET stock_actual = ? WHERE id = ?", (total, keep_id))
+        cursor.execute(
+            "DELETE FROM stock_almacen WHERE producto_id IS ? AND almacen_id IS ? AND id <> ?",
+            (pid, alm_id, keep_id)
+        )
+    if duplicados:
+        print(f"Migración v1: {len(duplicados)} pares producto/almacén duplicados consolidados en stock_almacen.")
+
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_stock_almacen_prod_alm ON stock_almacen(producto_id, almacen_id)"
+    )
+    for ddl in INDICES_V1:
+        cursor.execute(ddl)
+
+
+# --- v2: Capas de costo FIFO ---
+
+def _v2_capas_fifo(cursor):
+    """Tabla capas_fifo, poblada desde el historial de compras y salidas"""
+    capas_fifo.crear_tabla(cursor)
+    n = capas_fifo.reconstruir_capas(cursor)
+    print(f"Migración v2: {n} capas FIFO generadas desde el historial.")
+
+
+# --- v3: Costo FIFO estampado en salidas ---
+
+def _v3_costo_salidas(cursor):
+    """Columna salidas_detalle.costo_total y costo FIFO de las salidas existentes"""
+    cursor.execute("PRAGMA table_info(salidas_detalle)")
+    if 'costo_total' not in [c[1] for c in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE salidas_detalle ADD COLUMN costo_total REAL DEFAULT 0")
+    n = capas_fifo.estampar_costos_salidas(cursor)
+    print(f"Migración v3: costo FIFO estampado en {n} líneas de salida.")
+
+
+# --- v4: Libro de movimientos de inventario ---
+
+def _v4_movimientos(cursor):
+    """Tabla movimientos_inventario, poblada desde compras, salidas y traslados"""
+    movimientos.crear_tabla(cursor)
+    n = movimientos.reconstruir_movimientos(cursor)
+    print(f"Migración v4: {n} movimientos de inventario generados desde el historial.")
+
+
+# --- v5: Cierres mensuales de stock ---
+
+def _v5_saldos_mensuales(cursor):
+    """Tablas saldos_mensuales / saldos_periodos con los meses cerrados del libro"""
+    saldos.crear_tabla(cursor)
+    periodos = saldos.generar_saldos(cursor)
+    print(f"Migración v5: {len(periodos)} cierres mensuales generados.")
+
+
+# --- v6: Conversión a PEN por fecha de documento ---
+
+def _v6_tipo_cambio(cursor):
+    """Tabla tipo_cambio (si falta) y vista compras_cabecera_pen con el factor a PEN por fecha"""
+    tipo_cambio.crear_objetos(cursor)
+    cursor.execute("SELECT COUNT(*), MIN(fecha), MAX(fecha) FROM tipo_cambio")
+    n, desde, hasta = cursor.fetchone()
+    print(f"Migración v6: vista compras_cabecera_pen creada ({n} tasas registradas, {desde} a {hasta}).")
+
+
+# --- v7: Montos normalizados PEN/USD en compras ---
+
+def _v7_montos_pen(cursor):
+    """Columnas total_pen/total_usd (cabecera) y subtotal_pen/subtotal_usd (detalle), pobladas"""
+    tipo_cambio.crear_objetos(cursor)
+    tipo_cambio.crear_columnas_montos(cursor)
+    n = tipo_cambio.normalizar_compras(cursor)
+    print(f"Migración v7: montos PEN/USD estampados en {n} compras.")
+
+
+# --- v8: Hechos diarios de gasto para el dashboard ---
+
+def _v8_gasto_diario(cursor):
+    """Tablas gasto_diario_proveedor / gasto_diario_categoria, pobladas desde las compras"""
+    n = gasto_diario.recalcular(cursor)
+    print(f"Migración v8: {n} días/proveedor de gasto generados.")
+
+
+# --- v9: Alertas materializadas ---
+
+def _v9_alertas(cursor):
+    """Tabla alertas con el estado actual de las alertas del dashboard"""
+    n = alertas.recalcular(cursor)
+    print(f"Migración v9: {n} alertas evaluadas.")
+
+
+# --- v10: Estadísticas del planificador ---
+
+def _v10_estadisticas(cursor):
+    """
+    ANALYZE (sqlite_stat1): con estadísticas el planificador recorre el índice
+    de fecha de la cabecera en los listados paginados por (fecha, id) y corta
+    en LIMIT, en vez de ordenar todas las líneas de detalle.
+    """
+    cursor.execute("ANALYZE")
+
+
+# --- v11: Versiones de tablas maestras (ETags) ---
+
+def _v11_versiones_tabla(cursor):
+    """Tabla versiones_tabla con una fila por tabla maestra"""
+    versiones.crear_tabla(cursor)
+
+
+# Lista ordenada: (versión, descripción, función(cursor))
+MIGRACIONES = [
+    (1, "Índices de joins y fechas; UNIQUE stock_almacen(producto_id, almacen_id)", _v1_indices),
+    (2, "Tabla capas_fifo (capas de costo FIFO por línea de compra)", _v2_capas_fifo),
+    (3, "Costo FIFO estampado en salidas_detalle (costo_unitario, costo_total)", _v3_costo_salidas),
+    (4, "Libro movimientos_inventario (kardex)", _v4_movimientos),
+    (5, "Cierres mensuales de stock por producto y almacén (saldos_mensuales)", _v5_saldos_mensuales),
+    (6, "Vista compras_cabecera_pen: conversión USD -> PEN con el T.C. de la fecha", _v6_tipo_cambio),
+    (7, "Montos normalizados en compras (total_pen/total_usd, subtotal_pen/subtotal_usd)", _v7_montos_pen),
+    (8, "Hechos diarios de gasto por proveedor y por categoría (gasto_diario_*)", _v8_gasto_diario),
+    (9, "Tabla alertas (sin stock, sin movimiento, compras grandes, duplicadas)", _v9_alertas),
+    (10, "Estadísticas del planificador de consultas (ANALYZE)", _v10_estadisticas),
+    (11, "Versiones de tablas maestras para ETags (versiones_tabla)", _v11_versiones_tabla),
+]
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(conn, hasta=None):
+    """
+    Aplica en orden las migraciones pendientes.
+    Retorna lista de versiones aplicadas. Si una falla, se revierte y se detiene.
+    """
+    aplicadas = []
+    actual = version_actual(conn)
+    for version, descripcion, funcion in MIGRACIONES:
+        if version <= actual or (hasta is not None and version > hasta):
+            continue
+        cursor = conn.cursor()
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            cursor.execute("BEGIN IMMEDIATE")
+            funcion(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            aplicadas.append(version)
+            print(f"Migración v{version} aplicada: {descripcion}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"❌ Error aplicando migración v{version}: {e}")
+            break
+    return aplicadas
+
+
+# Tablas derivadas del historial: (nombre, función(cursor) que la regenera).
+# En orden de dependencia: cada una puede leer las anteriores.
+DERIVADAS = [
+    ("capas_fifo", capas_fifo.reconstruir_capas),
+    ("costos_salidas", capas_fifo.estampar_costos_salidas),
+    ("movimientos_inventario", movimientos.reconstruir_movimientos),
+    ("saldos_mensuales", saldos.reconstruir_saldos),
+    ("montos_pen", tipo_cambio.normalizar_compras),
+    ("gasto_diario", gasto_diario.recalcular),
+    ("alertas", alertas.recalcular),
+]
+
+
+def reconstruir_derivadas(conn, nombres=None):
+    """
+    Regenera desde el historial las tablas derivadas: todas, o las indicadas
+    y las que dependen de ellas (las siguientes en DERIVADAS).
+    Necesario tras cargar datos con SQL directo (seeds, restauraciones).
+    Retorna {nombre: filas_generadas}.
+    """
+    resultado = {}
+    cursor = conn.cursor()
+    incluir = not nombres
+    try:
+        if conn.in_transaction:
+            conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+        for nombre, funcion in DERIVADAS:
+            incluir = incluir or nombre in nombres
+            if not incluir:
+                continue
+            resultado[nombre] = funcion(cursor)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return resultado
@@ -0,0 +1,157 @@
+"""
+Motor FIFO vectorizado (NumPy).
+Calcula el consumo FIFO de todos los productos a la vez a partir de dos
+consultas ordenadas (líneas de compra y líneas de salida).
+
+Las entradas de cada producto forman un tramo contiguo de una recta global
+(suma acumulada de cantidades, tramos en orden de producto). La salida k de
+un producto consume el intervalo [base + S(k-1), base + S(k)] de su tramo,
+recortado a lo comprado, y su costo es F(fin) - F(inicio), donde F es el
+costo acumulado (lineal por tramos) de las entradas. Las posiciones se
+ubican con searchsorted, sin bucles por producto ni por lote.
+"""
+
+import numpy as np
+
+TC_DEFECTO = 3.75
+
+
+def _filtro_productos(columna, desde, hasta, producto_id=None):
+    """Restringe a un producto, o a productos con salidas en el rango (si se indica)"""
+    if producto_id is not None:
+        return f"WHERE {columna} = ?", (producto_id,)
+    if desde is None and hasta is None:
+        return "", ()
+    return f"""
+        WHERE {columna} IN (
+            SELECT sd2.producto_id FROM salidas_detalle sd2
+            JOIN salidas_cabecera sc2 ON sd2.salida_id = sc2.id
+            WHERE sc2.fecha BETWEEN ? AND ?
+        )""", (desde, hasta)
+
+
+def cargar_entradas(cursor, desde=None, hasta=None, producto_id=None):
+    """Líneas de compra en orden FIFO: producto, fecha_emision, compra, línea"""
+    filtro, params = _filtro_productos("cd.producto_id", desde, hasta, producto_id)
+    cursor.execute(f"""
+        SELECT cd.id, cd.producto_id, cc.fecha_emision, cd.cantidad,
+               cd.precio_unitario, cc.moneda, cc.tipo_cambio
+        FROM compras_detalle cd
+        JOIN compras_cabecera cc ON cd.compra_id = cc.id
+        {filtro}
+        ORDER BY cd.producto_id, cc.fecha_emision ASC, cc.id ASC, cd.id ASC
+    """, params)
+    filas = cursor.fetchall()
+
+    ids, pids, fechas, qty, precio, moneda, tc = (list(c) for c in zip(*filas)) if filas else ([],) * 7
+    precio = np.array(precio, dtype=float)
+    tc = np.array([t if t else TC_DEFECTO for t in tc], dtype=float)
+    es_usd = np.array([m == 'USD' for m in moneda], dtype=bool)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'producto_id': np.array(pids, dtype=np.int64),
+        'fecha': fechas,
+        'cantidad': np.array(qty, dtype=float),
+        'costo_pen': np.where(es_usd, precio * tc, precio),
+    }
+
+
+def cargar_salidas(cursor, desde=None, hasta=None, producto_id=None):
+    """Líneas de salida en orden cronológico: producto, fecha, salida, línea"""
+    filtro, params = _filtro_productos("sd.producto_id", desde, hasta, producto_id)
+    cursor.execute(f"""
+        SELECT sd.id, sd.producto_id, sc.fecha, sd.cantidad
+        FROM salidas_detalle sd
+        JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+        {filtro}
+        ORDER BY sd.producto_id, sc.fecha ASC, sc.id ASC, sd.id ASC
+    """, params)
+    filas = cursor.fetchall()
+
+    ids, pids, fechas, qty = (list(c) for c in zip(*filas)) if filas else ([],) * 4
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'producto_id': np.array(pids, dtype=np.int64),
+        'fecha': np.array([str(f) for f in fechas], dtype=object),
+        'cantidad': np.array(qty, dtype=float),
+    }
+
+
+def _tramos(pids, valores):
+    """Suma acumulada por producto (pids ordenado). Retorna (acumulado, inicio_de_grupo, productos, idx_grupo)"""
+    acumulado = np.cumsum(valores)
+    productos, primero, idx_grupo = np.unique(pids, return_index=True, return_inverse=True)
+    inicio = (acumulado - valores)[primero]
+    return acumulado, inicio, productos, idx_grupo
+
+
+def calcular(entradas, salidas):
+    """
+    Consumo FIFO de todos los productos.
+    Retorna {
+        'restante':     cantidad restante por línea de compra (orden de `entradas`),
+        'valor_salida': costo PEN consumido por cada línea de salida (orden de `salidas`),
+    }
+    Las salidas que exceden lo comprado solo valorizan lo disponible.
+    """
+    qty_e = entradas['cantidad']
+    costo_e = entradas['costo_pen']
+    qty_s = salidas['cantidad']
+
+    if qty_e.size == 0:
+        return {'restante': qty_e.copy(), 'valor_salida': np.zeros(qty_s.size)}
+
+    # Recta global de entradas y costo acumulado F en cada quiebre
+    acum_e, base_prod, prod_e, grupo_e = _tramos(entradas['producto_id'], qty_e)
+    previo_e = acum_e - qty_e
+    costo_acum = np.cumsum(qty_e * costo_e)
+    costo_previo = costo_acum - qty_e * costo_e
+    comprado_prod = np.add.reduceat(qty_e, np.r_[0, np.flatnonzero(np.diff(grupo_e)) + 1])
+
+    def costo_hasta(x):
+        i = np.minimum(np.searchsorted(acum_e, x, side='left'), acum_e.size - 1)
+        return costo_previo[i] + (x - previo_e[i]) * costo_e[i]
+
+    # Total de salidas por producto (para el saldo de cada lote)
+    total_sal = np.zeros(prod_e.size)
+    valor_salida = np.zeros(qty_s.size)
+    if qty_s.size:
+        pids_s = salidas['producto_id']
+        acum_s, inicio_s, prod_s, grupo_s = _tramos(pids_s, qty_s)
+        hasta_s = acum_s - inicio_s[grupo_s]
+        desde_s = hasta_s - qty_s
+
+        # Tramo de entradas de cada salida (si el producto tiene compras)
+        pos = np.searchsorted(prod_e, pids_s)
+        pos_c = np.minimum(pos, prod_e.size - 1)
+        tiene = prod_e[pos_c] == pids_s
+        base = base_prod[pos_c]
+        tope = np.where(tiene, comprado_prod[pos_c], 0.0)
+
+        a = base + np.minimum(desde_s, tope)
+        b = base + np.minimum(hasta_s, tope)
+        valor_salida = np.where(tiene & (b > a), costo_hasta(b) - costo_hasta(a), 0.0)
+
+        total_por_prod_s = np.bincount(grupo_s, weights=qty_s)
+        pos_p = np.searchsorted(prod_s, prod_e)
+        pos_pc = np.minimum(pos_p, prod_s.size - 1)
+        total_sal = np.where(prod_s[pos_pc] == prod_e, total_por_prod_s[pos_pc], 0.0)
+
+    # Saldo por lote: lo consumido es el solape de [0, total_salidas] con el lote
+    consumido_hasta = base_prod[grupo_e] + total_sal[grupo_e]
+    consumido = np.clip(consumido_hasta - previo_e, 0.0, qty_e)
+    restante = np.where(consumido >= qty_e, 0.0, qty_e - consumido)
+
+    return {'restante': restante, 'valor_salida': valor_salida}
+
+
+def valor_salidas_periodo(cursor, start_date, end_date):
+    """Costo FIFO (PEN) de las salidas con fecha en [start_date, end_date]"""
+    entradas = cargar_entradas(cursor, start_date, end_date)
+    salidas = cargar_salidas(cursor, start_date, end_date)
+    if salidas['cantidad'].size == 0:
+        return 0.0
+    valores = calcular(entradas, salidas)['valor_salida']
+    fechas = salidas['fecha']
+    en_rango = (fechas >= str(start_date)) & (fechas <= str(end_date))
+    return float(valores[en_rango.astype(bool)].sum())
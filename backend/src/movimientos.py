@@ -0,0 +1,147 @@
+"""
+Libro de movimientos de inventario (movimientos_inventario).
+Cada operación que cambia stock agrega aquí una fila por producto y almacén,
+con cantidad con signo (+ entrada, - salida), costo unitario y la referencia
+al documento. El kardex se lee de esta tabla con un solo rango indexado.
+"""
+
+from src import saldos
+from src.motor_fifo import TC_DEFECTO
+
+DDL_MOVIMIENTOS = [
+    """CREATE TABLE IF NOT EXISTS movimientos_inventario (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha DATE NOT NULL,
+        producto_id INTEGER NOT NULL,
+        almacen_id INTEGER,
+        cantidad REAL NOT NULL,
+        costo_unitario REAL DEFAULT 0,
+        tipo TEXT NOT NULL,
+        documento TEXT,
+        origen_destino TEXT,
+        ref_tabla TEXT,
+        ref_id INTEGER,
+        fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_mov_fecha ON movimientos_inventario(fecha, id)",
+    "CREATE INDEX IF NOT EXISTS idx_mov_producto_fecha ON movimientos_inventario(producto_id, fecha, id)",
+    "CREATE INDEX IF NOT EXISTS idx_mov_ref ON movimientos_inventario(ref_tabla, ref_id)",
+]
+
+# Tipos de movimiento (mismos rótulos que mostraba el kardex)
+COMPRA = 'COMPRA'
+SALIDA = 'SALIDA'
+TRASLADO_SALIDA = 'TRASLADO SALIDA'
+TRASLADO_ENTRADA = 'TRASLADO ENTRADA'
+STOCK_INICIAL = 'STOCK INICIAL'
+
+# Filas que se regeneran desde los documentos (las de carga inicial no tienen documento)
+TABLAS_ORIGEN = ('compras_detalle', 'salidas_detalle', 'traslados_detalle')
+
+
+def crear_tabla(cursor):
+    for ddl in DDL_MOVIMIENTOS:
+        cursor.execute(ddl)
+
+
+def registrar_movimiento(cursor, fecha, producto_id, almacen_id, cantidad, costo_unitario,
+                         tipo, documento, origen_destino, ref_tabla=None, ref_id=None):
+    """Agrega una fila al libro. `cantidad` positiva = entrada, negativa = salida."""
+    cursor.execute("""
+        INSERT INTO movimientos_inventario (
+            fecha, producto_id, almacen_id, cantidad, costo_unitario,
+            tipo, documento, origen_destino, ref_tabla, ref_id
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (fecha, producto_id, almacen_id, cantidad, costo_unitario or 0.0,
+          tipo, documento, origen_destino, ref_tabla, ref_id))
+    mov_id = cursor.lastrowid
+    # Si la fecha cae en un mes ya cerrado, ajustar esos cierres
+    if almacen_id is not None:
+        saldos.aplicar_movimiento(cursor, fecha, producto_id, almacen_id, cantidad)
+    return mov_id
+
+
+def registrar_traslado(cursor, fecha, traslado_id, traslado_detalle_id, producto_id, cantidad,
+                       costo_unitario, origen_id, origen_nombre, destino_id, destino_nombre):
+    """Un traslado son dos filas: salida en el almacén origen y entrada en el destino"""
+    documento = f"Traslado #{traslado_id}"
+    registrar_movimiento(cursor, fecha, producto_id, origen_id, -cantidad, costo_unitario,
+                         TRASLADO_SALIDA, documento, f"A: {destino_nombre}", 'traslados_detalle', traslado_detalle_id)
+    registrar_movimiento(cursor, fecha, producto_id, destino_id, cantidad, costo_unitario,
+                         TRASLADO_ENTRADA, documento, f"De: {origen_nombre}", 'traslados_detalle', traslado_detalle_id)
+
+
+def actualizar_costos_salidas(cursor, costos):
+    """Sincroniza el costo de las filas SALIDA tras re-estampar salidas_detalle. costos: [(costo_unitario, sd_id)]"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movimientos_inventario'")
+    if not cursor.fetchone():
+        return  # Migraciones previas a la del libro
+    cursor.executemany("""
+        UPDATE movimientos_inventario SET costo_unitario = ?
+        WHERE ref_tabla = 'salidas_detalle' AND ref_id = ?
+    """, costos)
+
+
+def reconstruir_movimientos(cursor):
+    """
+    Regenera las filas del libro que provienen de compras, salidas y traslados
+    (en orden cronológico). Las filas de carga de stock inicial se conservan.
+    Retorna el número de filas generadas.
+    """
+    cursor.execute(
+        f"DELETE FROM movimientos_inventario WHERE ref_tabla IN ({', '.join('?' * len(TABLAS_ORIGEN))})",
+        TABLAS_ORIGEN
+    )
+    cursor.execute(f"""
+        INSERT INTO movimientos_inventario (
+            fecha, producto_id, almacen_id, cantidad, costo_unitario,
+            tipo, documento, origen_destino, ref_tabla, ref_id
+        )
+        SELECT fecha, producto_id, almacen_id, cantidad, costo_unitario,
+               tipo, documento, origen_destino, ref_tabla, ref_id
+        FROM (
+            SELECT cc.fecha_emision as fecha, cd.producto_id, COALESCE(cd.almacen_id, 1) as almacen_id,
+                   cd.cantidad,
+                   CASE WHEN cc.moneda = 'USD'
+                        THEN cd.precio_unitario * COALESCE(NULLIF(cc.tipo_cambio, 0), {TC_DEFECTO})
+                        ELSE cd.precio_unitario END as costo_unitario,
+                   '{COMPRA}' as tipo, cc.numero as documento, 'Proveedor' as origen_destino,
+                   'compras_detalle' as ref_tabla, cd.id as ref_id, 1 as orden, cc.id as doc_id, 0 as sub
+            FROM compras_detalle cd
+            JOIN compras_cabecera cc ON cd.compra_id = cc.id
+
+            UNION ALL
+
+            SELECT sc.fecha, sd.producto_id, COALESCE(sd.almacen_id, 1), -sd.cantidad,
+                   COALESCE(sd.costo_unitario, 0),
+                   '{SALIDA}', 'Salida #' || sc.id, sc.destino,
+                   'salidas_detalle', sd.id, 2, sc.id, 0
+            FROM salidas_detalle sd
+            JOIN salidas_cabecera sc ON sd.salida_id = sc.id
+
+            UNION ALL
+
+            SELECT tc.fecha, td.producto_id, tc.origen_id, -td.cantidad,
+                   COALESCE(td.costo_unitario, p.costo_promedio, 0),
+                   '{TRASLADO_SALIDA}', 'Traslado #' || tc.id, 'A: ' || COALESCE(ad.nombre, tc.destino_id),
+                   'traslados_detalle', td.id, 3, tc.id, 0
+            FROM traslados_detalle td
+            JOIN traslados_cabecera tc ON td.traslado_id = tc.id
+            LEFT JOIN almacenes ad ON tc.destino_id = ad.id
+            LEFT JOIN productos p ON td.producto_id = p.id
+
+            UNION ALL
+
+            SELECT tc.fecha, td.producto_id, tc.destino_id, td.cantidad,
+                   COALESCE(td.costo_unitario, p.costo_promedio, 0),
+                   '{TRASLADO_ENTRADA}', 'Traslado #' || tc.id, 'De: ' || COALESCE(ao.nombre, tc.origen_id),
+                   'traslados_detalle', td.id, 3, tc.id, 1
+            FROM traslados_detalle td
+            JOIN traslados_cabecera tc ON td.traslado_id = tc.id
+            LEFT JOIN almacenes ao ON tc.origen_id = ao.id
+            LEFT JOIN productos p ON td.producto_id = p.id
+        )
+        ORDER BY fecha, orden, doc_id, ref_id, sub
+    """)
+    return cursor.rowcount
@@ -0,0 +1,145 @@
+"""
+Paginación keyset, filtros y orden del lado del servidor para los listados de la API.
+Cada listado se declara con un Listado (columnas, FROM, campos ordenables y
+filtros); pagina() arma el SQL con los filtros en el WHERE y el orden
+(campo, claves únicas) para que SQLite recorra un índice y corte en LIMIT.
+
+El cursor es opaco (base64) y guarda el orden y la posición (valor del campo,
+claves) de la última fila entregada: la página siguiente continúa con una
+comparación de row values, sin OFFSET. El total se cuenta una vez, en la
+primera página, con los mismos filtros sobre el FROM del listado (los LEFT
+JOIN sin uso los omite SQLite), y viaja en el cursor a las siguientes.
+"""
+
+import base64
+import json
+
+from src import filas
+
+LIMITE_DEFECTO = 100
+
+
+class Listado:
+    """Definición de un listado paginable."""
+
+    def __init__(self, columnas, desde, claves, orden, orden_defecto, filtros, nulo=""):
+        self.columnas = columnas            # lista SELECT (sin la palabra SELECT)
+        self.desde = desde                  # FROM y JOINs
+        self.claves = tuple(claves)         # expresiones que hacen única cada fila (desempate)
+        self.orden = orden                  # {campo: expresión SQL}
+        self.orden_defecto = orden_defecto  # 'campo' ascendente, '-campo' descendente
+        self.filtros = filtros              # {parámetro: condición SQL con ?}
+        self.nulo = nulo                    # reemplazo de NULL en los items
+
+
+def _orden(listado, sort):
+    """'-campo' / 'campo' -> (sort normalizado, expresión, descendente)"""
+    sort = sort or listado.orden_defecto
+    campo = sort.lstrip("-")
+    if campo not in listado.orden:
+        raise ValueError(f"Orden no soportado: {campo}. Campos: {', '.join(listado.orden)}")
+    return sort, listado.orden[campo], sort.startswith("-")
+
+
+def codificar_cursor(sort, valor, claves, total):
+    """Cursor opaco (base64) con el orden, la posición de la última fila entregada y el total"""
+    return base64.urlsafe_b64encode(json.dumps([sort, valor, list(claves), total]).encode()).decode()
+
+
+def decodificar_cursor(token, sort):
+    try:
+        sort_cursor, valor, claves, total = json.loads(base64.urlsafe_b64decode(token.encode()))
+        total = int(total)
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if sort_cursor != sort:
+        raise ValueError("El cursor no corresponde al orden solicitado")
+    return valor, claves, total
+
+
+def _condicion_cursor(expresion, claves, descendente, valor, valores_claves):
+    """
+    Filas posteriores a la posición (valor, claves) en el orden (expresion, claves).
+    SQLite ordena los NULL primero en ASC y al final en DESC; se tratan aparte
+    porque una comparación con NULL nunca es verdadera.
+    """
+    op = "<" if descendente else ">"
+    if valor is None:
+        despues_de_nulos = "0"
+        if claves:
+            despues_de_nulos = f"({expresion} IS NULL AND ({', '.join(claves)}) {op} ({', '.join('?' * len(claves))}))"
+        if descendente:
+            return despues_de_nulos, list(valores_claves)
+        return f"({expresion} IS NOT NULL OR {despues_de_nulos})", list(valores_claves)
+    tupla = f"({', '.join((expresion,) + claves)})"
+    marcas = f"({', '.join('?' * (len(claves) + 1))})"
+    if descendente:
+        return f"({tupla} {op} {marcas} OR {expresion} IS NULL)", [valor] + list(valores_claves)
+    return f"{tupla} {op} {marcas}", [valor] + list(valores_claves)
+
+
+def _where(listado, filtros):
+    """(condiciones, params) de los filtros con valor"""
+    condiciones, params = [], []
+    for nombre, valor in (filtros or {}).items():
+        if valor is None or valor == "":
+            continue
+        if nombre not in listado.filtros:
+            raise ValueError(f"Filtro no soportado: {nombre}")
+        condicion = listado.filtros[nombre]
+        condiciones.append(condicion)
+        params.extend([valor] * condicion.count("?"))
+    return condiciones, params
+
+
+def pagina(conn, listado, filtros=None, sort=None, limit=None, cursor=None):
+    """
+    Página de un listado. Retorna (items, total, next_cursor); next_cursor es
+    None en la última página. `total` cuenta todas las filas que cumplen los
+    filtros (al pedir la primera página; las siguientes lo toman del cursor).
+    """
+    if limit is None:
+        limit = LIMITE_DEFECTO
+    if limit <= 0:
+        raise ValueError("limit debe ser mayor a 0")
+    sort, expresion, descendente = _orden(listado, sort)
+    claves = tuple(c for c in listado.claves if c != expresion)
+    condiciones, params = _where(listado, filtros)
+
+    if cursor:
+        valor, valores_claves, total = decodificar_cursor(cursor, sort)
+        if len(valores_claves) != len(claves):
+            raise ValueError("Cursor inválido")
+        condicion, params_cursor = _condicion_cursor(expresion, claves, descendente, valor, valores_claves)
+        condiciones = condiciones + [condicion]
+        params = params + params_cursor
+    else:
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM {listado.desde} WHERE {' AND '.join(condiciones) or '1 = 1'}", params
+        ).fetchone()[0]
+
+    direccion = " DESC" if descendente else ""
+    orden_sql = ", ".join(f"{e}{direccion}" for e in (expresion,) + claves)
+    columnas_clave = "".join(f", {c} AS _clave{i}" for i, c in enumerate(claves))
+    items = filas.consultar(conn, f"""
+        SELECT {listado.columnas}, {expresion} AS _orden{columnas_clave}
+        FROM {listado.desde}
+        WHERE {' AND '.join(condiciones) or '1 = 1'}
+        ORDER BY {orden_sql}
+        LIMIT ?
+    """, params + [limit + 1], nulo=None)
+
+    next_cursor = None
+    if len(items) > limit:
+        items.pop()
+        ultimo = items[-1]
+        next_cursor = codificar_cursor(sort, ultimo["_orden"], [ultimo[f"_clave{i}"] for i in range(len(claves))], total)
+    for item in items:
+        del item["_orden"]
+        for i in range(len(claves)):
+            del item[f"_clave{i}"]
+        if listado.nulo is not None:
+            for columna, v in item.items():
+                if v is None:
+                    item[columna] = listado.nulo
+    return items, total, next_cursor
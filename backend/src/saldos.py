@@ -0,0 +1,237 @@
+"""
+Saldos mensuales de inventario (saldos_mensuales).
+Guarda el saldo de cierre por producto y almacén de cada mes cerrado,
+calculado desde movimientos_inventario. Un saldo a una fecha se obtiene del
+cierre más cercano anterior más los movimientos desde entonces, sin recorrer
+todo el historial.
+
+saldos_periodos registra los meses generados: dentro de un periodo generado,
+un par producto/almacén sin fila tiene saldo 0. Los movimientos con fecha en
+un mes ya cerrado ajustan los cierres de ese mes en adelante.
+
+CierreMensual genera en segundo plano los cierres de los meses que terminan
+mientras el servidor sigue corriendo.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+# Cada cuánto (s) el cierre en segundo plano revisa si terminó un mes
+CIERRE_INTERVALO = float(os.environ.get("ERP_CIERRE_INTERVALO", "600"))
+
+DDL_SALDOS = [
+    """CREATE TABLE IF NOT EXISTS saldos_mensuales (
+        producto_id INTEGER NOT NULL,
+        almacen_id INTEGER NOT NULL,
+        periodo TEXT NOT NULL,
+        saldo REAL NOT NULL,
+        PRIMARY KEY (producto_id, almacen_id, periodo)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_saldos_periodo ON saldos_mensuales(periodo, producto_id)",
+    """CREATE TABLE IF NOT EXISTS saldos_periodos (
+        periodo TEXT PRIMARY KEY,
+        generado_en DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+
+def crear_tabla(cursor):
+    for ddl in DDL_SALDOS:
+        cursor.execute(ddl)
+
+
+def periodo_de(fecha):
+    """'YYYY-MM-DD...' -> 'YYYY-MM'"""
+    return str(fecha)[:7]
+
+
+def periodo_siguiente(periodo):
+    anio, mes = int(periodo[:4]), int(periodo[5:7])
+    return f"{anio + 1}-01" if mes == 12 else f"{anio}-{mes + 1:02d}"
+
+
+def inicio_periodo(periodo):
+    return f"{periodo}-01"
+
+
+def ultimo_periodo_cerrado(hoy=None):
+    """Mes anterior al actual"""
+    hoy = hoy or datetime.now()
+    return f"{hoy.year - 1}-12" if hoy.month == 1 else f"{hoy.year}-{hoy.month - 1:02d}"
+
+
+def aplicar_movimiento(cursor, fecha, producto_id, almacen_id, cantidad):
+    """Ajusta los cierres ya generados de meses >= al del movimiento (registro retroactivo)"""
+    cursor.execute("""
+        INSERT INTO saldos_mensuales (producto_id, almacen_id, periodo, saldo)
+        SELECT ?, ?, periodo, ? FROM saldos_periodos WHERE periodo >= ?
+        ON CONFLICT(producto_id, almacen_id, periodo) DO UPDATE SET saldo = saldo + excluded.saldo
+    """, (producto_id, almacen_id, cantidad, periodo_de(fecha)))
+
+
+def eliminar_producto(cursor, producto_id):
+    cursor.execute("DELETE FROM saldos_mensuales WHERE producto_id = ?", (producto_id,))
+
+
+def generar_saldos(cursor, hasta_periodo=None):
+    """
+    Genera los cierres pendientes hasta `hasta_periodo` (por defecto el último mes
+    cerrado), cada uno desde el cierre anterior más los movimientos del mes.
+    Retorna la lista de periodos generados.
+    """
+    hasta_periodo = hasta_periodo or ultimo_periodo_cerrado()
+
+    cursor.execute("SELECT MAX(periodo) FROM saldos_periodos")
+    anterior = cursor.fetchone()[0]
+    if anterior:
+        periodo = periodo_siguiente(anterior)
+    else:
+        cursor.execute("SELECT MIN(fecha) FROM movimientos_inventario")
+        primera = cursor.fetchone()[0]
+        if not primera:
+            return []
+        periodo = periodo_de(primera)
+
+    generados = []
+    while periodo <= hasta_periodo:
+        siguiente = periodo_siguiente(periodo)
+        cursor.execute("""
+            INSERT INTO saldos_mensuales (producto_id, almacen_id, periodo, saldo)
+            SELECT producto_id, almacen_id, ?, TOTAL(cantidad)
+            FROM (
+                SELECT producto_id, almacen_id, saldo as cantidad
+                FROM saldos_mensuales WHERE periodo = ?
+                UNION ALL
+                SELECT producto_id, almacen_id, cantidad
+                FROM movimientos_inventario
+                WHERE fecha >= ? AND fecha < ? AND almacen_id IS NOT NULL
+            )
+            GROUP BY producto_id, almacen_id
+            HAVING TOTAL(cantidad) <> 0
+        """, (periodo, anterior, inicio_periodo(periodo), inicio_periodo(siguiente)))
+        cursor.execute("INSERT INTO saldos_periodos (periodo) VALUES (?)", (periodo,))
+        generados.append(periodo)
+        anterior, periodo = periodo, siguiente
+    return generados
+
+
+def reconstruir_saldos(cursor):
+    """Borra y regenera todos los cierres mensuales desde el libro. Retorna filas generadas."""
+    cursor.execute("DELETE FROM saldos_mensuales")
+    cursor.execute("DELETE FROM saldos_periodos")
+    generar_saldos(cursor)
+    cursor.execute("SELECT COUNT(*) FROM saldos_mensuales")
+    return cursor.fetchone()[0]
+
+
+def _cierre_anterior(cursor, fecha):
+    """Último periodo generado que termina antes de `fecha` (o None)"""
+    cursor.execute("SELECT MAX(periodo) FROM saldos_periodos WHERE periodo < ?", (periodo_de(fecha),))
+    return cursor.fetchone()[0]
+
+
+def saldo_apertura(cursor, producto_id, fecha):
+    """Saldo total del producto (todos los almacenes) antes de `fecha`"""
+    cierre = _cierre_anterior(cursor, fecha)
+    base = 0.0
+    desde = ''
+    if cierre:
+        cursor.execute(
+            "SELECT TOTAL(saldo) FROM saldos_mensuales WHERE producto_id = ? AND periodo = ?",
+            (producto_id, cierre)
+        )
+        base = cursor.fetchone()[0]
+        desde = inicio_periodo(periodo_siguiente(cierre))
+    cursor.execute("""
+        SELECT TOTAL(cantidad) FROM movimientos_inventario
+        WHERE producto_id = ? AND fecha >= ? AND fecha < ?
+    """, (producto_id, desde, fecha))
+    return base + cursor.fetchone()[0]
+
+
+def stock_a_fecha(cursor, fecha, producto_id=None, almacen_id=None):
+    """
+    Stock por producto y almacén al cierre del día `fecha` (incluye movimientos de ese día).
+    Retorna lista de (producto_id, almacen_id, stock) con stock distinto de 0.
+    """
+    siguiente_dia = f"{str(fecha)[:10]}~"  # > cualquier 'YYYY-MM-DD...' del mismo día
+    cierre = _cierre_anterior(cursor, fecha)
+    desde = inicio_periodo(periodo_siguiente(cierre)) if cierre else ''
+
+    filtros_s, filtros_m, params_s, params_m = "", "", [], []
+    if producto_id is not None:
+        filtros_s += " AND producto_id = ?"
+        filtros_m += " AND producto_id = ?"
+        params_s.append(producto_id)
+        params_m.append(producto_id)
+    if almacen_id is not None:
+        filtros_s += " AND almacen_id = ?"
+        filtros_m += " AND almacen_id = ?"
+        params_s.append(almacen_id)
+        params_m.append(almacen_id)
+
+    cursor.execute(f"""
+        SELECT producto_id, almacen_id, TOTAL(cantidad) as stock
+        FROM (
+            SELECT producto_id, almacen_id, saldo as cantidad
+            FROM saldos_mensuales WHERE periodo = ? {filtros_s}
+            UNION ALL
+            SELECT producto_id, almacen_id, cantidad
+            FROM movimientos_inventario
+            WHERE fecha >= ? AND fecha < ? AND almacen_id IS NOT NULL {filtros_m}
+        )
+        GROUP BY producto_id, almacen_id
+        HAVING TOTAL(cantidad) <> 0
+        ORDER BY producto_id, almacen_id
+    """, [cierre] + params_s + [desde, siguiente_dia] + params_m)
+    return cursor.fetchall()
+
+
+class CierreMensual:
+    """
+    Cierres mensuales pendientes, al arrancar y luego periódicamente en un hilo
+    de fondo. generar(hasta_periodo) los genera (y lanza si falla); solo se
+    llama cuando ultimo_periodo_cerrado() cambió desde el último cierre exitoso,
+    así que el resto de las revisiones no tocan la base.
+    """
+
+    def __init__(self, generar, intervalo=None):
+        self._generar = generar
+        self.intervalo = intervalo or CIERRE_INTERVALO
+        self._lock = threading.Lock()
+        self._cerrado = None
+        self._hilo = None
+        self._detener = threading.Event()
+
+    def cerrar_pendientes(self, hoy=None):
+        """Genera los cierres hasta el último mes cerrado si aún no se hizo. Retorna los periodos generados."""
+        objetivo = ultimo_periodo_cerrado(hoy)
+        with self._lock:
+            if self._cerrado == objetivo:
+                return []
+            generados = self._generar(objetivo)
+            self._cerrado = objetivo
+        if generados:
+            print(f"Cierres mensuales generados: {', '.join(generados)}")
+        return generados
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.cerrar_pendientes()
+            except Exception as e:
+                print(f"⚠️ Error en cierre mensual: {e}")
+
+    def iniciar(self):
+        """Arranca la revisión en segundo plano (idempotente)"""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="cierre-mensual", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
@@ -0,0 +1,117 @@
+"""
+Conversión USD -> PEN por fecha de documento.
+La vista compras_cabecera_pen agrega a cada compra su factor a PEN: 1 si es en
+soles; si es en dólares, el T.C. del propio documento o, si no lo tiene, el
+último T.C. registrado en tipo_cambio hasta su fecha de emisión (arrastra el
+de fines de semana y feriados). Las consultas de montos usan la vista con
+sentencias fijas y parametrizadas, sin interpolar el T.C. del día.
+
+Con ese mismo T.C. se estampan al registrar los montos normalizados
+(total_pen/total_usd en compras_cabecera, subtotal_pen/subtotal_usd en
+compras_detalle), para que los reportes sumen columnas sin convertir.
+"""
+
+from src.motor_fifo import TC_DEFECTO
+
+DDL_TIPO_CAMBIO = [
+    "CREATE TABLE IF NOT EXISTS tipo_cambio (fecha TEXT PRIMARY KEY, venta REAL, compra REAL, origen TEXT)",
+    "DROP VIEW IF EXISTS compras_cabecera_pen",
+    # tc_aplicado: T.C. del documento (en PEN el 1.0 por defecto de la columna no es un T.C.),
+    # o el último registrado hasta la fecha de emisión
+    f"""CREATE VIEW compras_cabecera_pen AS
+        SELECT x.*, CASE WHEN x.moneda = 'USD' THEN x.tc_aplicado ELSE 1.0 END AS factor_pen
+        FROM (
+            SELECT cc.*,
+                   COALESCE(
+                       CASE WHEN cc.tipo_cambio > 0 AND (cc.moneda = 'USD' OR cc.tipo_cambio > 1)
+                            THEN cc.tipo_cambio END,
+                       (SELECT t.venta FROM tipo_cambio t
+                        WHERE t.fecha <= substr(cc.fecha_emision, 1, 10) AND t.venta > 0
+                        ORDER BY t.fecha DESC LIMIT 1),
+                       {TC_DEFECTO}) AS tc_aplicado
+            FROM compras_cabecera cc
+        ) x""",
+]
+
+# Montos normalizados, estampados al registrar (ver normalizar_compras)
+COLUMNAS_MONTOS = [
+    ("compras_cabecera", "total_pen"),
+    ("compras_cabecera", "total_usd"),
+    ("compras_detalle", "subtotal_pen"),
+    ("compras_detalle", "subtotal_usd"),
+]
+
+# Índices cubrientes: las sumas del dashboard se resuelven sin leer la tabla
+INDICES_MONTOS = [
+    "CREATE INDEX IF NOT EXISTS idx_compras_cab_fecha_pen ON compras_cabecera(fecha_emision, proveedor_id, total_pen)",
+    "CREATE INDEX IF NOT EXISTS idx_compras_det_compra_pen ON compras_detalle(compra_id, producto_id, subtotal_pen)",
+]
+
+
+def crear_objetos(cursor):
+    for ddl in DDL_TIPO_CAMBIO:
+        cursor.execute(ddl)
+
+
+def guardar_historico(cursor, tasas, origen='API_SUNAT'):
+    """
+    Inserta en bloque tasas históricas [(fecha, venta, compra)] sin pisar las existentes.
+    Retorna el número de fechas nuevas.
+    """
+    antes = cursor.connection.total_changes
+    cursor.executemany(
+        "INSERT OR IGNORE INTO tipo_cambio (fecha, venta, compra, origen) VALUES (?, ?, ?, ?)",
+        [(str(fecha)[:10], venta, compra, origen) for fecha, venta, compra in tasas if venta]
+    )
+    return cursor.connection.total_changes - antes
+
+
+def fechas_sin_tasa(cursor, desde, hasta):
+    """Fechas con compras en USD sin T.C. propio ni tasa registrada ese día (candidatas a completar)"""
+    cursor.execute("""
+        SELECT DISTINCT substr(cc.fecha_emision, 1, 10)
+        FROM compras_cabecera cc
+        LEFT JOIN tipo_cambio t ON t.fecha = substr(cc.fecha_emision, 1, 10)
+        WHERE cc.moneda = 'USD' AND COALESCE(cc.tipo_cambio, 0) = 0
+          AND cc.fecha_emision BETWEEN ? AND ?
+          AND t.fecha IS NULL
+        ORDER BY 1
+    """, (str(desde), str(hasta)))
+    return [f[0] for f in cursor.fetchall()]
+
+
+def crear_columnas_montos(cursor):
+    """Columnas total_pen/total_usd y subtotal_pen/subtotal_usd (si faltan) e índices"""
+    for tabla, columna in COLUMNAS_MONTOS:
+        cursor.execute(f"PRAGMA table_info({tabla})")
+        if columna not in [c[1] for c in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} REAL DEFAULT 0")
+    for ddl in INDICES_MONTOS:
+        cursor.execute(ddl)
+
+
+def normalizar_compras(cursor, compra_id=None):
+    """
+    Estampa los montos en PEN y USD de una compra (o de todas) en cabecera y detalle,
+    con el T.C. de compras_cabecera_pen. Retorna el número de compras actualizadas.
+    """
+    filtro = "AND compras_cabecera.id = ?" if compra_id is not None else ""
+    params = (compra_id,) if compra_id is not None else ()
+    cursor.execute(f"""
+        UPDATE compras_cabecera SET
+            total_pen = compras_cabecera.total_compra * v.factor_pen,
+            total_usd = CASE WHEN compras_cabecera.moneda = 'USD' THEN compras_cabecera.total_compra
+                             ELSE compras_cabecera.total_compra / v.tc_aplicado END
+        FROM compras_cabecera_pen v
+        WHERE v.id = compras_cabecera.id {filtro}
+    """, params)
+    n = cursor.rowcount
+    cursor.execute(f"""
+        UPDATE compras_detalle SET
+            subtotal_pen = compras_detalle.subtotal * v.factor_pen,
+            subtotal_usd = CASE WHEN v.moneda = 'USD' THEN compras_detalle.subtotal
+                                ELSE compras_detalle.subtotal / v.tc_aplicado END
+        FROM compras_cabecera_pen v
+        WHERE v.id = compras_detalle.compra_id {filtro.replace('compras_cabecera.id', 'compras_detalle.compra_id')}
+    """, params)
+    return n
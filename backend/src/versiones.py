@@ -0,0 +1,55 @@
+"""
+Versiones por tabla maestra (tabla versiones_tabla) para ETags de la API.
+Las funciones de backend.py que crean, eliminan o importan registros llaman
+a incrementar() dentro de su transacción; los endpoints de maestros arman un
+ETag fuerte con las versiones de las tablas que muestran y responden 304 si
+el cliente ya tiene esa versión, sin consultar el listado.
+
+STOCK no es una tabla: cubre stock_almacen y el stock/costo promedio de
+productos, que cambian con cada compra, salida, traslado o carga de stock.
+"""
+
+PRODUCTOS = 'productos'
+CATEGORIAS = 'categorias'
+PROVEEDORES = 'proveedores'
+ALMACENES = 'almacenes'
+STOCK = 'stock'
+TABLAS = (PRODUCTOS, CATEGORIAS, PROVEEDORES, ALMACENES, STOCK)
+
+DDL_VERSIONES = """CREATE TABLE IF NOT EXISTS versiones_tabla (
+    tabla TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID"""
+
+
+# Versión inicial: segundos Unix al crearse, para que una base recreada (scripts
+# de carga, otra instalación) no repita los ETags que los clientes tienen en caché
+VERSION_INICIAL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+
+def crear_tabla(cursor):
+    cursor.execute(DDL_VERSIONES)
+    cursor.executemany(f"INSERT OR IGNORE INTO versiones_tabla (tabla, version) VALUES (?, {VERSION_INICIAL})",
+                       [(t,) for t in TABLAS])
+
+
+def incrementar(cursor, *tablas):
+    """Sube la versión de las tablas indicadas (dentro de la transacción de la escritura)"""
+    cursor.executemany(f"""
+        INSERT INTO versiones_tabla (tabla, version) VALUES (?, {VERSION_INICIAL})
+        ON CONFLICT (tabla) DO UPDATE SET version = version + 1
+    """, [(t,) for t in tablas])
+
+
+def leer(conn, tablas):
+    """Versiones actuales de `tablas`, en el mismo orden (0 si nunca se registró)"""
+    marcas = ", ".join("?" * len(tablas))
+    versiones = dict(conn.execute(
+        f"SELECT tabla, version FROM versiones_tabla WHERE tabla IN ({marcas})", tuple(tablas)
+    ).fetchall())
+    return [versiones.get(t, 0) for t in tablas]
+
+
+def etag(tablas, versiones):
+    """ETag fuerte: '"productos.4-categorias.2"'"""
+    return '"' + "-".join(f"{t}.{v}" for t, v in zip(tablas, versiones)) + '"'
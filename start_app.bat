@@ -31,7 +31,7 @@ echo.
 
 REM 2. Iniciar Backend (FastAPI) usando el VENV
 echo Lanzando Backend...
-start "ERP Backend API" /min cmd /k "cd /d %~dp0backend && title ERP Backend && call venv\Scripts\activate && uvicorn main:app --reload --host 0.0.0.0 --port 8000"
+start "ERP Backend API" /min cmd /k "cd /d %~dp0backend && title ERP Backend && call venv\Scripts\activate && uvicorn main:app --reload --host 0.0.0.0 --port 8000 --timeout-graceful-shutdown 5"
 echo [OK] Backend API iniciado en segundo plano (puerto 8000).
 echo.
 